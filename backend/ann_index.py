@@ -0,0 +1,291 @@
+import json
+import math
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rows assigned to centroids per matmul, to bound temporary memory
+_ASSIGN_BATCH = 65536
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def spherical_kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    k-means on the unit sphere (cosine similarity); returns normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=clusters)
+        # Re-seed empty clusters with random points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-vector int8 quantization: vector ~= codes * scale
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over the rows of an MmapVectorIndex.
+
+    Rows are assigned to the nearest of `nlist` spherical k-means centroids. A
+    query scans only the rows of its `nprobe` closest lists: with int8
+    quantization it scores them on in-memory int8 codes (4x smaller than the
+    float32 rows) and re-scores the best `rerank` * k exactly from the
+    memory-mapped float32 matrix; without quantization it scores the
+    candidates on the float32 rows directly.
+
+    New rows are assigned and encoded as they are appended (add), and the
+    files under `directory` are appended to and committed by ann.json the same
+    way the vector index commits its manifest. train() rebuilds everything.
+    """
+
+    def __init__(self, directory: str, nprobe: int = 16, quantization: str = "int8", rerank: int = 4):
+        if quantization not in ("int8", "none"):
+            raise ValueError(f"Unknown quantization '{quantization}'. Must be 'int8' or 'none'")
+        self.directory = directory
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rerank = rerank
+        self.centroids: Optional[np.ndarray] = None
+        self.rows = 0
+        self.trained_rows = 0
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self._list_rows: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def load(self) -> None:
+        if not os.path.exists(self._path("ann.json")):
+            return
+        with open(self._path("ann.json")) as f:
+            state = json.load(f)
+        if state["quantization"] != self.quantization:
+            # Stored codes don't match the configured mode; retrain on next use
+            return
+        self.rows = state["rows"]
+        self.trained_rows = state["trained_rows"]
+        self.centroids = np.load(self._path("centroids.npy"))
+        dimension = self.centroids.shape[1]
+        self.assignments = self._read_committed("assignments.i32", np.int32, self.rows)
+        if self.quantization == "int8":
+            self.codes = self._read_committed("codes.i8", np.int8, self.rows * dimension).reshape(self.rows, dimension)
+            self.scales = self._read_committed("scales.f32", np.float32, self.rows)
+        self._list_rows = None
+
+    def _read_committed(self, name: str, dtype, count: int) -> np.ndarray:
+        # Ignore (and drop) anything appended after the last ann.json commit
+        path = self._path(name)
+        size = count * np.dtype(dtype).itemsize
+        if os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        return np.fromfile(path, dtype=dtype, count=count)
+
+    def _commit(self) -> None:
+        tmp_path = self._path("ann.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "rows": self.rows,
+                "trained_rows": self.trained_rows,
+                "nlist": len(self.centroids),
+                "quantization": self.quantization,
+            }, f)
+        os.replace(tmp_path, self._path("ann.json"))
+
+    def _assign(
+        self, matrix: np.ndarray, start: int, end: int, centroids: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        centroids = self.centroids if centroids is None else centroids
+        assignments, codes, scales = [], [], []
+        for batch_start in range(start, end, _ASSIGN_BATCH):
+            batch = np.asarray(matrix[batch_start:min(batch_start + _ASSIGN_BATCH, end)], dtype=np.float32)
+            assignments.append(np.argmax(batch @ centroids.T, axis=1).astype(np.int32))
+            if self.quantization == "int8":
+                batch_codes, batch_scales = quantize_int8(batch)
+                codes.append(batch_codes)
+                scales.append(batch_scales)
+        if self.quantization != "int8":
+            return np.concatenate(assignments), None, None
+        return np.concatenate(assignments), np.concatenate(codes), np.concatenate(scales)
+
+    def train(self, matrix: np.ndarray, nlist: Optional[int] = None, sample: Optional[int] = None, seed: int = 0) -> None:
+        """
+        Fit the centroids on a sample of `matrix` and (re)assign every row.
+        nlist defaults to sqrt(rows), a common IVF starting point. The new
+        lists are built aside and swapped in at the end, so searches keep
+        using the previous ones meanwhile.
+        """
+        rows = len(matrix)
+        nlist = nlist or max(1, int(math.sqrt(rows)))
+        sample = min(rows, sample or nlist * 64)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(rows, size=sample, replace=False))
+        print(f"---TRAINING IVF INDEX: {nlist} LISTS ON {sample} OF {rows} ROWS---")
+        centroids = spherical_kmeans(np.asarray(matrix[sample_rows], dtype=np.float32), nlist, seed=seed)
+        assignments, codes, scales = self._assign(matrix, 0, rows, centroids)
+
+        with self._lock:
+            self.centroids = centroids
+            self.assignments, self.codes, self.scales = assignments, codes, scales
+            self.rows = self.trained_rows = rows
+            self._list_rows = None
+            os.makedirs(self.directory, exist_ok=True)
+            # Uncommit first: a crash while rewriting leaves no index to load, not a mixed one
+            if os.path.exists(self._path("ann.json")):
+                os.remove(self._path("ann.json"))
+            np.save(self._path("centroids.npy"), centroids)
+            assignments.tofile(self._path("assignments.i32"))
+            if self.quantization == "int8":
+                codes.tofile(self._path("codes.i8"))
+                scales.tofile(self._path("scales.f32"))
+            self._commit()
+
+    def clear(self) -> None:
+        """
+        Forget the trained index and delete its files
+        """
+        with self._lock:
+            self.centroids = None
+            self.rows = self.trained_rows = 0
+            self.assignments = np.zeros(0, dtype=np.int32)
+            self.codes = self.scales = None
+            self._list_rows = self._list_offsets = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add(self, matrix: np.ndarray, end: int) -> None:
+        """
+        Assign (and encode) rows self.rows..end of `matrix` to the existing lists
+        """
+        with self._lock:
+            if not self.trained or end <= self.rows:
+                return
+            assignments, codes, scales = self._assign(matrix, self.rows, end)
+            with open(self._path("assignments.i32"), "ab") as f:
+                f.write(assignments.tobytes())
+            self.assignments = np.concatenate([self.assignments, assignments])
+            if self.quantization == "int8":
+                with open(self._path("codes.i8"), "ab") as f:
+                    f.write(codes.tobytes())
+                with open(self._path("scales.f32"), "ab") as f:
+                    f.write(scales.tobytes())
+                self.codes = np.concatenate([self.codes, codes])
+                self.scales = np.concatenate([self.scales, scales])
+            self.rows = end
+            self._list_rows = None
+            self._commit()
+
+    def _snapshot(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Consistent (centroids, list rows, list offsets, codes, scales); the
+        rows grouped by list (CSR layout) are rebuilt lazily after add/train
+        """
+        with self._lock:
+            if self._list_rows is None:
+                order = np.argsort(self.assignments, kind="stable").astype(np.int64)
+                self._list_offsets = np.searchsorted(
+                    self.assignments[order], np.arange(len(self.centroids) + 1)
+                )
+                self._list_rows = order
+            return self.centroids, self._list_rows, self._list_offsets, self.codes, self.scales
+
+    @staticmethod
+    def _in_ranges(rows: np.ndarray, ranges: Sequence[Tuple[int, int]]) -> np.ndarray:
+        starts = np.array([start for start, _ in ranges], dtype=np.int64)
+        ends = np.array([end for _, end in ranges], dtype=np.int64)
+        order = np.argsort(starts)
+        starts, ends = starts[order], ends[order]
+        position = np.searchsorted(starts, rows, side="right") - 1
+        return (position >= 0) & (rows < ends[np.maximum(position, 0)])
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        ranges: Optional[Sequence[Tuple[int, int]]] = None,
+        nprobe: Optional[int] = None,
+    ) -> Optional[List[Tuple[int, float]]]:
+        """
+        Approximate top-k (row, cosine similarity) among rows inside `ranges`
+        (every indexed row when None). Returns None when the probed lists hold
+        fewer than k matching rows, so the caller can fall back to exact search.
+        """
+        centroids, list_rows, offsets, codes, scales = self._snapshot()
+        nprobe = min(nprobe or self.nprobe, len(centroids))
+        centroid_scores = centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([list_rows[offsets[i]:offsets[i + 1]] for i in probe])
+        # Rows appended after the caller mapped `matrix` aren't visible to it yet
+        candidates = candidates[candidates < len(matrix)]
+        if ranges is not None:
+            candidates = candidates[self._in_ranges(candidates, ranges)]
+        if len(candidates) < k:
+            return None
+
+        if self.quantization == "int8":
+            approximate = (codes[candidates].astype(np.float32) @ query) * scales[candidates]
+            keep = min(len(candidates), max(k, k * self.rerank))
+            candidates = candidates[np.argpartition(-approximate, keep - 1)[:keep]]
+        candidates = np.sort(candidates)
+        scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """
+        Resident bytes of the ANN structures (the float32 rows stay memory-mapped)
+        """
+        sizes = {
+            "centroids": self.centroids.nbytes if self.centroids is not None else 0,
+            "assignments": self.assignments.nbytes,
+            "lists": self.assignments.size * 8,
+            "codes": self.codes.nbytes if self.codes is not None else 0,
+            "scales": self.scales.nbytes if self.scales is not None else 0,
+        }
+        sizes["total"] = sum(sizes.values())
+        return sizes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "trained": self.trained,
+            "nlist": len(self.centroids) if self.trained else 0,
+            "nprobe": self.nprobe,
+            "quantization": self.quantization,
+            "rows": self.rows,
+            "trained_rows": self.trained_rows,
+            "memory_bytes": self.memory_bytes()["total"],
+        }
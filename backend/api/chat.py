@@ -1,11 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional, AsyncIterator, Union
+import asyncio
+import json
+import time
 import uuid
 from datetime import datetime
 
-from api.models import ChatRequest, ChatResponse, ChatSession, ErrorResponse
-from graph.utils.conversational_detector import detect_conversational_query
+from api.models import ChatBatchRequest, ChatRequest, ChatResponse, ChatSession, ErrorResponse
+from graph.utils.conversational_detector import adetect_conversational_query, classification_memo
+from graph.utils.subject_router import subject_centroids
 from graph.utils.conversational_responses import generate_conversational_response
+from graph.utils.conversation_memory import aupdate_summary, contextualize_question, conversation_memory
+from graph.utils.batch_grading import ashare_retrieval_grades
+from graph.utils.semantic_cache import semantic_cache
+from graph.utils.web_search_cache import web_search_cache
+from graph.consts import GENERATE, GRADE_DOCUMENTS, GRADE_GENERATION, WEBSEARCH
+from graph.graph import decide_after_generation_grade
+from graph.utils.budget import init_budget
+from graph.nodes.grade_documents import grading_stats
+from context_packer import packing_stats
+from diversity import diversity_stats
+from lexical_index import lexical_index
+from metrics import record_route
+from retrieval import asimilarity_search_with_scores, embedding, retrieval_cache, retriever_pool
+from config import BATCH_MAX_CONCURRENCY, BATCH_MAX_QUESTIONS, MMR_FETCH_K, QUALITY_TIERS, RETRIEVAL_K
 from graph.state import GraphState
 from graph.utils.source_extractor import format_sources_for_display
 
@@ -14,36 +33,110 @@ router = APIRouter()
 # In-memory session storage (use Redis or database in production)
 chat_sessions: Dict[str, ChatSession] = {}
 
+VALID_SUBJECTS = ["DataMining", "Network", "Distributed", "Energy"]
+
 def get_rag_app():
     from main import rag_app
     return rag_app
 
+def validate_chat_request(request: Union[ChatRequest, ChatBatchRequest]) -> None:
+    """
+    Reject unknown subjects and quality tiers with a 400
+    """
+    if request.subject and request.subject not in VALID_SUBJECTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid subject. Must be one of: {VALID_SUBJECTS}"
+        )
+    if request.tier and request.tier not in QUALITY_TIERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid tier. Must be one of: {list(QUALITY_TIERS)}"
+        )
+
+def build_rag_input(
+    request: ChatRequest,
+    memory: Optional[Dict[str, Any]] = None,
+    requires_context: bool = False
+) -> Dict[str, Any]:
+    """
+    Prepare input for RAG system with enhanced state.
+    `memory` holds the session's conversation_summary/conversation_history;
+    follow-ups that depend on it are anchored to the previous question.
+    """
+    memory = memory or {}
+    history = memory.get("conversation_history") or []
+    question = request.question
+    if requires_context and history:
+        question = contextualize_question(question, history)
+
+    input_data = {
+        "question": question,
+        "loop_count": 0,
+        "is_conversational": False,
+        "conversation_history": history,
+        "conversation_summary": memory.get("conversation_summary"),
+    }
+    
+    if request.subject:
+        input_data["subject"] = request.subject
+    
+    # Per-request deadline and retry limits
+    input_data.update(init_budget(request.tier, request.time_budget_seconds))
+    
+    return input_data
+
 @router.post("/message", response_model=ChatResponse)
 async def send_message(request: ChatRequest, rag_app=Depends(get_rag_app)):
     """
     Enhanced conversational message endpoint with better engagement
     """
+    return await answer_message(request, rag_app)
+
+async def answer_message(
+    request: ChatRequest,
+    rag_app,
+    memory: Optional[Dict[str, Any]] = None
+) -> ChatResponse:
+    """
+    Answer one chat message, optionally with a session's conversation memory
+    """
     try:
-        # Validate subject if provided
-        valid_subjects = ["DataMining", "Network", "Distributed", "Energy"]
-        if request.subject and request.subject not in valid_subjects:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid subject. Must be one of: {valid_subjects}"
-            )
+        # Validate subject and tier if provided
+        validate_chat_request(request)
+
+        # Serve reworded repeats of earlier questions from the semantic cache.
+        # Answers that build on a conversation aren't shareable, so sessions
+        # with history bypass it.
+        has_history = bool(memory and (memory.get("conversation_history") or memory.get("conversation_summary")))
+        question_vector = None
+        if semantic_cache.enabled and not has_history:
+            question_vector = await semantic_cache.aembed_question(request.question)
+            cached = semantic_cache.lookup(request.subject, question_vector)
+            if cached:
+                print(f"Semantic cache hit ({cached['similarity']:.3f}): {cached['cached_question'][:50]}")
+                return ChatResponse(
+                    generation=cached["generation"],
+                    sources=cached["sources"],
+                    is_conversational=False,
+                    subject=request.subject,
+                    cached=True
+                )
 
         # Enhanced query detection with intent analysis
-        detection = detect_conversational_query(
+        detection = await adetect_conversational_query(
             request.question,
-            request.subject or "general topics"
+            request.subject,
+            question_vector
         )
         
-        print(f"Query Intent: {detection.get('query_intent')}")
+        print(f"Classified by: {detection.get('classified_by')}")
         print(f"Is Conversational: {detection.get('is_conversational')}")
         print(f"Requires Context: {detection.get('requires_context')}")
         
         # Handle purely conversational queries (greetings, thanks, etc.)
         if detection["is_conversational"] and not detection["is_question"]:
+            record_route("conversational", detection.get("classified_by"))
             state = GraphState(
                 question=request.question,
                 subject=request.subject
@@ -57,34 +150,40 @@ async def send_message(request: ChatRequest, rag_app=Depends(get_rag_app)):
                 subject=request.subject
             )
         
-        # Prepare input for RAG system with enhanced state
-        input_data = {
-            "question": request.question,
-            "loop_count": 0,
-            "is_conversational": False,
-            "conversation_history": [],  # Can be populated from session
-        }
-        
-        if request.subject:
-            input_data["subject"] = request.subject
+        input_data = build_rag_input(request, memory, detection.get("requires_context", False))
         
         # Invoke RAG system
         print(f"Invoking RAG system for: {request.question[:50]}...")
-        result = rag_app.invoke(input=input_data)
+        result = await rag_app.ainvoke(input=input_data)
         
         # Extract response data
         generation = result.get("generation", "I couldn't generate an answer. Could you rephrase your question?")
         sources = result.get("sources", [])
         is_conversational = result.get("is_conversational", False)
         answer_quality = result.get("answer_quality_score", "good")
+        degradations = result.get("degradations", [])
         
         print(f"Answer quality: {answer_quality}")
+        if degradations:
+            print(f"Degradations ({result.get('tier')}): {degradations}")
+        
+        if question_vector is not None and _cacheable(result):
+            semantic_cache.store(
+                request.subject,
+                request.question,
+                question_vector,
+                generation,
+                sources
+            )
         
         return ChatResponse(
             generation=generation,
             sources=sources,
             is_conversational=is_conversational,
-            subject=request.subject
+            subject=result.get("subject") or request.subject,
+            tier=result.get("tier"),
+            degradations=degradations,
+            grading_latency=result.get("grading_latency")
         )
         
     except Exception as e:
@@ -94,6 +193,298 @@ async def send_message(request: ChatRequest, rag_app=Depends(get_rag_app)):
             detail=f"Error processing message: {str(e)}"
         )
 
+def _cacheable(result: Dict[str, Any]) -> bool:
+    """
+    Whether a graph result may go into the semantic cache. Entries are keyed
+    by (subject, question) only and served to every tier, so only answers
+    graded "useful" without degradations are stored; ungraded (fast tier),
+    ungrounded or budget-fallback answers are not.
+    """
+    return (
+        "generation" in result
+        and not result.get("is_conversational", False)
+        and result.get("generation_grade") == "useful"
+        and not result.get("degradations")
+    )
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _stream_chat_events(request: ChatRequest, rag_app) -> AsyncIterator[str]:
+    """
+    Run the chat pipeline and yield server-sent events as results become available
+    """
+    try:
+        question_vector = None
+        if semantic_cache.enabled:
+            question_vector = await semantic_cache.aembed_question(request.question)
+            cached = semantic_cache.lookup(request.subject, question_vector)
+            if cached:
+                yield _sse_event("sources", {"sources": cached["sources"]})
+                yield _sse_event("token", {"content": cached["generation"]})
+                yield _sse_event("done", {
+                    "generation": cached["generation"],
+                    "sources": cached["sources"],
+                    "is_conversational": False,
+                    "subject": request.subject,
+                    "cached": True,
+                    "verdict": None
+                })
+                return
+        
+        detection = await adetect_conversational_query(
+            request.question,
+            request.subject,
+            question_vector
+        )
+        
+        if detection["is_conversational"] and not detection["is_question"]:
+            record_route("conversational", detection.get("classified_by"))
+            result = generate_conversational_response(
+                GraphState(question=request.question, subject=request.subject)
+            )
+            yield _sse_event("token", {"content": result["generation"]})
+            yield _sse_event("done", {
+                "generation": result["generation"],
+                "sources": None,
+                "is_conversational": True,
+                "subject": request.subject,
+                "cached": False,
+                "verdict": None
+            })
+            return
+        
+        input_data = build_rag_input(request)
+        final_state: Dict[str, Any] = dict(input_data)
+        
+        print(f"Streaming RAG system for: {request.question[:50]}...")
+        async for mode, chunk in rag_app.astream(input_data, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                # LLM tokens; only the answer-writing node is forwarded to the client
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == GENERATE and message.content:
+                    yield _sse_event("token", {"content": message.content})
+                continue
+            
+            for node, update in chunk.items():
+                if not update:
+                    continue
+                final_state.update(update)
+                if node in (GRADE_DOCUMENTS, WEBSEARCH):
+                    yield _sse_event("sources", {"sources": update.get("sources", [])})
+                elif node == GRADE_GENERATION:
+                    # Unless the graph finishes here it loops back into GENERATE
+                    # (possibly via web search), so the client should discard
+                    # the tokens streamed so far
+                    yield _sse_event("grade", {
+                        "verdict": update.get("generation_grade"),
+                        "regenerating": decide_after_generation_grade(final_state) != "useful"
+                    })
+        
+        generation = final_state.get("generation", "I couldn't generate an answer. Could you rephrase your question?")
+        sources = final_state.get("sources", [])
+        
+        if question_vector is not None and _cacheable(final_state):
+            semantic_cache.store(
+                request.subject,
+                request.question,
+                question_vector,
+                generation,
+                sources
+            )
+        
+        yield _sse_event("done", {
+            "generation": generation,
+            "sources": sources,
+            "is_conversational": False,
+            "subject": final_state.get("subject") or request.subject,
+            "cached": False,
+            "verdict": final_state.get("generation_grade"),
+            "tier": final_state.get("tier"),
+            "degradations": final_state.get("degradations", []),
+            "grading_latency": final_state.get("grading_latency")
+        })
+        
+    except Exception as e:
+        print(f"Error in stream_message: {str(e)}")
+        yield _sse_event("error", {"detail": f"Error processing message: {str(e)}"})
+
+@router.post("/message/stream")
+async def stream_message(request: ChatRequest, rag_app=Depends(get_rag_app)):
+    """
+    Streaming variant of /message using server-sent events.
+    
+    Events, in order:
+    - sources: graded sources, sent as soon as grade_documents (or web search) finishes
+    - token: answer tokens from the generate node as they arrive
+    - grade: grounding/answer verdict; "regenerating" means a new answer follows
+    - done: final answer, sources and verdict (same fields as ChatResponse)
+    - error: pipeline failure
+    """
+    validate_chat_request(request)
+    
+    return StreamingResponse(
+        _stream_chat_events(request, rag_app),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _answer_batch_question(
+    index: int,
+    request: ChatRequest,
+    rag_app,
+    shared_verdicts: Dict[str, str],
+    question_vector,
+    semaphore: asyncio.Semaphore
+) -> Dict[str, Any]:
+    """
+    Run one question of a batch through the RAG graph, reusing the batch's shared grades
+    """
+    async with semaphore:
+        try:
+            input_data = build_rag_input(request)
+            input_data["shared_verdicts"] = shared_verdicts
+            result = await rag_app.ainvoke(input=input_data)
+        except Exception as e:
+            print(f"Error in batch question {index}: {str(e)}")
+            return {"index": index, "question": request.question, "error": f"Error processing message: {str(e)}"}
+    
+    generation = result.get("generation", "I couldn't generate an answer. Could you rephrase your question?")
+    sources = result.get("sources", [])
+    if question_vector is not None and _cacheable(result):
+        semantic_cache.store(request.subject, request.question, question_vector, generation, sources)
+    
+    return {
+        "index": index,
+        "question": request.question,
+        "generation": generation,
+        "sources": sources,
+        "subject": result.get("subject") or request.subject,
+        "cached": False,
+        "verdict": result.get("generation_grade"),
+        "tier": result.get("tier"),
+        "degradations": result.get("degradations", []),
+        "grading_latency": result.get("grading_latency")
+    }
+
+async def _stream_batch_events(request: ChatBatchRequest, rag_app) -> AsyncIterator[str]:
+    """
+    Answer a batch of questions and yield one server-sent event per question as it completes
+    """
+    start = time.perf_counter()
+    questions = request.questions
+    cached_count = 0
+    failed = 0
+    
+    try:
+        # One embedding call for the whole batch; the semantic cache, router
+        # and retriever then find every question vector in the embedding cache
+        await embedding.aembed_documents(questions)
+        
+        pending = []
+        question_vectors = {}
+        for index, question in enumerate(questions):
+            if semantic_cache.enabled:
+                question_vectors[index] = await semantic_cache.aembed_question(question)
+                cached = semantic_cache.lookup(request.subject, question_vectors[index])
+                if cached:
+                    cached_count += 1
+                    yield _sse_event("answer", {
+                        "index": index,
+                        "question": question,
+                        "generation": cached["generation"],
+                        "sources": cached["sources"],
+                        "subject": request.subject,
+                        "cached": True,
+                        "verdict": None
+                    })
+                    continue
+            pending.append(index)
+        
+        # Retrieve for every question at once; results land in retrieval_cache
+        # so the graph's retrieve node doesn't search again
+        documents = await asyncio.gather(*(
+            asimilarity_search_with_scores(questions[index], subject=request.subject, k=RETRIEVAL_K, fetch_k=MMR_FETCH_K)
+            for index in pending
+        ))
+        shared_verdicts = await ashare_retrieval_grades(
+            [questions[index] for index in pending],
+            documents,
+            request.subject
+        )
+    except Exception as e:
+        print(f"Error in batch preparation: {str(e)}")
+        yield _sse_event("error", {"detail": f"Error processing batch: {str(e)}"})
+        return
+    
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_answer_batch_question(
+            index,
+            ChatRequest(
+                question=questions[index],
+                subject=request.subject,
+                tier=request.tier,
+                time_budget_seconds=request.time_budget_seconds
+            ),
+            rag_app,
+            verdicts,
+            question_vectors.get(index),
+            semaphore
+        ))
+        for index, verdicts in zip(pending, shared_verdicts)
+    ]
+    try:
+        for next_answer in asyncio.as_completed(tasks):
+            answer = await next_answer
+            if "error" in answer:
+                failed += 1
+                yield _sse_event("error", answer)
+            else:
+                yield _sse_event("answer", answer)
+    finally:
+        # Stop outstanding questions if the client went away
+        for task in tasks:
+            task.cancel()
+    
+    yield _sse_event("done", {
+        "questions": len(questions),
+        "answered": len(questions) - failed,
+        "cached": cached_count,
+        "failed": failed,
+        "shared_grades": sum(len(verdicts) for verdicts in shared_verdicts),
+        "elapsed_seconds": round(time.perf_counter() - start, 3)
+    })
+
+@router.post("/batch")
+async def batch_message(request: ChatBatchRequest, rag_app=Depends(get_rag_app)):
+    """
+    Answer many questions for one subject, streamed as server-sent events.
+    
+    The questions are embedded in one call and retrieved concurrently, and
+    chunks retrieved for several questions are graded once for all of them.
+    Answers arrive in completion order, not request order.
+    
+    Events:
+    - answer: one per question, with its "index" in the request (same fields as the stream's done event)
+    - error: a question that failed ("index" set) or the whole batch failing
+    - done: totals for the batch
+    """
+    validate_chat_request(request)
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions. At most {BATCH_MAX_QUESTIONS} per batch"
+        )
+    if any(not question.strip() for question in request.questions):
+        raise HTTPException(status_code=400, detail="Questions must not be empty")
+    
+    return StreamingResponse(
+        _stream_batch_events(request, rag_app),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/session", response_model=Dict[str, str])
 async def create_chat_session():
     """
@@ -125,16 +516,22 @@ async def get_chat_session(session_id: str):
 async def send_session_message(
     session_id: str,
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
     rag_app=Depends(get_rag_app)
 ):
     """
-    Send a message within a specific chat session with context tracking
+    Send a message within a specific chat session with context tracking.
+    Recent turns are passed to generation verbatim, older ones as a running
+    summary that is updated after the response is sent.
     """
     if session_id not in chat_sessions:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
     session = chat_sessions[session_id]
     
+    # Memory as of the previous turn, before this question is appended
+    memory = conversation_memory(session)
+    
     # Add user message to session
     session.messages.append({
         "role": "user",
@@ -144,7 +541,7 @@ async def send_session_message(
     })
     
     # Get response from RAG system
-    response = await send_message(request, rag_app)
+    response = await answer_message(request, rag_app, memory)
     
     # Add assistant message to session
     session.messages.append({
@@ -154,6 +551,10 @@ async def send_session_message(
         "sources": response.sources,
         "is_conversational": response.is_conversational
     })
+    session.last_updated = datetime.now().isoformat()
+    
+    # Fold turns that left the verbatim window into the summary off the request path
+    background_tasks.add_task(aupdate_summary, session)
     
     return response
 
@@ -186,13 +587,40 @@ async def list_chat_sessions():
         "total_sessions": len(chat_sessions)
     }
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Hit/miss counters and size of the semantic answer cache
+    """
+    return semantic_cache.stats()
+
+@router.get("/stats")
+async def get_chat_stats():
+    """
+    Counters from the caches, conversational detection, subject routing,
+    diversity selection, retrieval grading and context packing
+    """
+    return {
+        "semantic_cache": semantic_cache.stats(),
+        "conversational_detection": classification_memo.stats(),
+        "subject_centroids": subject_centroids.stats(),
+        "retrieval_grading": grading_stats.snapshot(),
+        "retrievers": retriever_pool.stats(),
+        "embeddings": embedding.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "lexical_index": lexical_index.stats(),
+        "diversity": diversity_stats.snapshot(),
+        "web_search_cache": web_search_cache.stats(),
+        "context_packing": packing_stats.snapshot()
+    }
+
 @router.get("/subjects")
 async def get_available_subjects():
     """
     Get list of available subjects for filtering
     """
     return {
-        "subjects": ["DataMining", "Network", "Distributed", "Energy"],
+        "subjects": VALID_SUBJECTS,
         "description": "Available subject filters for RAG queries"
     }
 
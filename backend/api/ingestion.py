@@ -1,6 +1,7 @@
 # api/ingestion.py
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
+import asyncio
 import os
 import tempfile
 from pathlib import Path
@@ -8,11 +9,15 @@ import logging
 from dotenv import load_dotenv
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 
+from graph.utils.semantic_cache import semantic_cache
+from graph.utils.subject_router import subject_centroids
+from ingestion import upsert_documents
+from lexical_index import lexical_index
+from namespaces import DEFAULT_NAMESPACE, list_namespaces, subject_namespace
+from retrieval import embedding, index, retrieval_cache, retriever_pool
+
 load_dotenv()
 
 # Initialize logging
@@ -22,17 +27,19 @@ logger = logging.getLogger(__name__)
 # Initialize router
 router = APIRouter()
 
-# Initialize embeddings and Pinecone
-embedding = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.environ["INDEX_NAME"])
-
 # Initialize text splitter
 splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
     chunk_size=700, 
     chunk_overlap=0
 )
 
+def _invalidate_caches(subject: str):
+    """Cached searches and answers for this subject may be outdated by the new content"""
+    version = retrieval_cache.bump_version(subject)
+    logger.info(f"Retrieval cache version for subject {subject}: {version}")
+    invalidated = semantic_cache.invalidate(subject)
+    logger.info(f"Invalidated {invalidated} semantic cache entries for subject: {subject}")
+
 def ingest_documents(documents, subject: str, batch_size: int = 50):
     """Helper function to ingest documents into Pinecone"""
     try:
@@ -43,6 +50,7 @@ def ingest_documents(documents, subject: str, batch_size: int = 50):
         
         # Split documents
         split_documents = splitter.split_documents(documents)
+        namespace = subject_namespace(subject)
         
         logger.info(f"Total chunks to process: {len(split_documents)}")
         
@@ -51,18 +59,32 @@ def ingest_documents(documents, subject: str, batch_size: int = 50):
         for i in range(0, len(split_documents), batch_size):
             batch = split_documents[i:i + batch_size]
             try:
-                PineconeVectorStore.from_documents(
-                    documents=batch,
-                    embedding=embedding,
-                    index_name=os.environ["INDEX_NAME"]
-                )
+                # Embed once: the same vectors go to Pinecone and the subject centroid.
+                # Bypass the embedding cache: chunks are embedded a single time, and
+                # caching them would evict query vectors and copy the corpus to disk
+                vectors = embedding.embeddings.embed_documents([doc.page_content for doc in batch])
+                upsert_documents(batch, vectors, namespace=namespace)
+                if namespace:
+                    retriever_pool.add_namespace(namespace)
+                subject_centroids.add(subject, vectors)
+                lexical_index.add(subject, batch)
                 total_ingested += len(batch)
                 logger.info(f"✅ Batch {i//batch_size + 1}: Ingested {len(batch)} chunks ({total_ingested}/{len(split_documents)})")
             except Exception as batch_error:
                 logger.error(f"❌ Error in batch {i//batch_size + 1}: {str(batch_error)}")
+                # Keep the centroid and BM25 updates for the batches that did land
+                subject_centroids.save()
+                lexical_index.schedule_save(subject)
+                if total_ingested:
+                    _invalidate_caches(subject)
                 raise
         
         logger.info(f"✅ Successfully ingested {total_ingested} chunks with subject: {subject}")
+        subject_centroids.save()
+        lexical_index.schedule_save(subject)
+        
+        _invalidate_caches(subject)
+        
         return {
             "status": "success",
             "chunks_ingested": total_ingested,
@@ -72,6 +94,53 @@ def ingest_documents(documents, subject: str, batch_size: int = 50):
         logger.error(f"❌ Error ingesting documents: {str(e)}")
         raise
 
+@router.get("/namespaces")
+async def get_namespaces():
+    """
+    Vector count per namespace (one per subject, plus the default namespace
+    while it still holds vectors from before per-subject namespaces)
+    """
+    return {"namespaces": list_namespaces(index)}
+
+@router.delete("/subject/{subject}")
+async def delete_subject(subject: str):
+    """
+    Delete every chunk of a subject: its namespace, BM25 index and centroid.
+    Other subjects are not touched. A subject without a namespace of its own
+    (not migrated yet, so its chunks are still in the default namespace) is
+    left alone with a 409.
+    """
+    namespace = subject_namespace(subject)
+    if not namespace:
+        raise HTTPException(
+            status_code=400,
+            detail="Deleting a subject requires per-subject namespaces (SUBJECT_NAMESPACES_ENABLED)"
+        )
+    try:
+        namespaces = await asyncio.to_thread(list_namespaces, index)
+        if not namespaces.get(namespace):
+            if namespaces.get(DEFAULT_NAMESPACE):
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Subject {subject} has no namespace of its own yet; migrate with python -m namespaces first"
+                )
+            raise HTTPException(status_code=404, detail=f"Subject {subject} not found")
+        await asyncio.to_thread(index.delete, delete_all=True, namespace=namespace)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting namespace {namespace}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error deleting subject: {str(e)}")
+    retriever_pool.remove_namespace(namespace)
+    lexical_index.remove(subject)
+    subject_centroids.remove(subject)
+    subject_centroids.save()
+
+    version = retrieval_cache.bump_version(subject)
+    invalidated = semantic_cache.invalidate(subject)
+    logger.info(f"Deleted subject {subject}; retrieval cache version {version}, {invalidated} cached answers dropped")
+    return {"message": f"Subject {subject} deleted successfully", "subject": subject}
+
 @router.post("/upload-document")
 async def upload_document(
     file: UploadFile = File(...),
@@ -0,0 +1,41 @@
+# api/metrics.py
+from fastapi import APIRouter, Response
+
+from graph.utils.conversational_detector import classification_memo
+from graph.utils.semantic_cache import semantic_cache
+from graph.utils.web_search_cache import web_search_cache
+from metrics import CONTENT_TYPE_LATEST, generate_latest, record_cache
+from retrieval import embedding, retrieval_cache, retriever_pool
+
+router = APIRouter()
+
+
+def _update_cache_metrics():
+    stats = semantic_cache.stats()
+    record_cache("semantic_answer", stats["hits"], stats["misses"])
+
+    stats = embedding.stats()
+    record_cache("embedding", stats["memory_hits"] + stats["disk_hits"], stats["misses"])
+
+    stats = retrieval_cache.stats()
+    record_cache("retrieval", stats["hits"], stats["misses"])
+
+    stats = web_search_cache.stats()
+    record_cache("web_search", stats["hits"] + stats["stale_hits"], stats["misses"])
+
+    stats = retriever_pool.stats()
+    record_cache("retriever_pool", stats["hits"], stats["misses"])
+
+    tiers = classification_memo.stats()["classified_by"]
+    memo_hits = tiers.get("memo", 0)
+    record_cache("conversational_memo", memo_hits, sum(tiers.values()) - memo_hits)
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-node latency for the chat, quiz, flashcard and exam
+    graphs, LLM calls and tokens per chain, cache hit rates and routing decisions
+    """
+    _update_cache_metrics()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
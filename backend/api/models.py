@@ -1,12 +1,15 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Optional, Dict, Any
 from enum import Enum
+import asyncio
 
 # Chat/RAG Models
 class ChatRequest(BaseModel):
     question: str = Field(..., description="User question")
     subject: Optional[str] = Field(None, description="Subject filter (DataMining, Network, Distributed, Energy)")
     session_id: Optional[str] = Field(None, description="Session ID for conversation tracking")
+    tier: Optional[str] = Field(None, description="Quality tier: fast, balanced, strict (default from DEFAULT_QUALITY_TIER)")
+    time_budget_seconds: Optional[float] = Field(None, gt=0, description="Overrides the tier's latency budget")
 
 class ChatResponse(BaseModel):
     generation: str = Field(..., description="Generated answer")
@@ -14,6 +17,16 @@ class ChatResponse(BaseModel):
     is_conversational: bool = Field(False, description="Whether response is conversational")
     subject: Optional[str] = Field(None, description="Applied subject filter")
     answer_quality: Optional[str] = Field(None, description="Quality indicator: excellent, good, needs_improvement")
+    cached: bool = Field(False, description="Whether the answer was served from the semantic cache")
+    tier: Optional[str] = Field(None, description="Quality tier the answer was produced with")
+    degradations: Optional[List[str]] = Field(None, description="Shortcuts taken because the latency budget or retry limits ran out")
+    grading_latency: Optional[Dict[str, float]] = Field(None, description="Seconds spent per generation check in the last grading pass")
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, description="Questions to answer, all for the same subject")
+    subject: str = Field(..., description="Subject filter (DataMining, Network, Distributed, Energy)")
+    tier: Optional[str] = Field(None, description="Quality tier applied to every question")
+    time_budget_seconds: Optional[float] = Field(None, gt=0, description="Overrides the tier's latency budget per question")
 
 class ChatSession(BaseModel):
     session_id: str
@@ -21,6 +34,11 @@ class ChatSession(BaseModel):
     created_at: Optional[str] = None
     last_updated: Optional[str] = None
     subject_focus: Optional[str] = None
+    summary: Optional[str] = None  # Running summary of messages older than the verbatim window
+    summarized_messages: int = 0  # How many leading messages the summary covers
+    # Serializes summary updates so overlapping requests don't fold the same
+    # messages twice; lives (and is freed) with the session
+    _summary_lock: asyncio.Lock = PrivateAttr(default_factory=asyncio.Lock)
 
 # Quiz Models
 class DifficultyLevel(str, Enum):
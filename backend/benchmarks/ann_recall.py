@@ -0,0 +1,167 @@
+"""
+Recall, latency and memory of the local vector store's IVF index against
+exact search.
+
+Builds a MmapVectorIndex in a temp dir from synthetic clustered vectors
+(embedding-like: normalized points around many topic centres), split across
+subjects in interleaved batches. The IVF index is trained (in the background)
+halfway through and the remaining batches are added incrementally, as
+ingestion would. Queries
+are perturbed copies of stored vectors. For every nprobe, with int8 codes and
+without quantization, reports recall@k against exact top-k, query latency
+percentiles (unfiltered and subject-filtered) and resident memory per million
+chunks, and writes everything as JSON.
+
+Usage (from backend/):
+    python -m benchmarks.ann_recall --rows 200000 --dimension 1536 --output ann_recall.json
+"""
+import argparse
+import json
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ann_index import IVFIndex
+from benchmarks.offline_graph import percentiles
+from local_vectorstore import MmapVectorIndex
+
+SUBJECTS = ["DataMining", "Network", "Distributed", "Energy"]
+
+
+def synthetic_vectors(rows: int, dimension: int, rows_per_topic: int, spread: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(max(1, rows // rows_per_topic), dimension)).astype(np.float32)
+    labels = rng.integers(0, len(topics), size=rows)
+    vectors = topics[labels] + spread * rng.normal(size=(rows, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(directory: str, vectors: np.ndarray, batch_size: int, nprobe: int) -> Dict[str, Any]:
+    ann = IVFIndex(f"{directory}/ann", nprobe=nprobe, quantization="int8")
+    index = MmapVectorIndex(directory, ann=ann, ann_min_rows=len(vectors) // 2, ann_retrain_growth=1e9)
+    start = time.perf_counter()
+    for batch, offset in enumerate(range(0, len(vectors), batch_size)):
+        subject = SUBJECTS[batch % len(SUBJECTS)]
+        index.upsert([
+            {"id": str(offset + i), "values": vector, "metadata": {"subject": subject}}
+            for i, vector in enumerate(vectors[offset:offset + batch_size])
+        ])
+    upsert_seconds = time.perf_counter() - start
+    index.wait_for_ann()
+    return {"index": index, "seconds": upsert_seconds, "ann_ready_seconds": time.perf_counter() - start}
+
+
+def recall(approximate: List[List[int]], exact: List[List[int]]) -> float:
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+    return round(hits / sum(len(e) for e in exact), 4)
+
+
+def timed_search(search, queries: np.ndarray) -> Dict[str, Any]:
+    rows, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = search(query)
+        times.append((time.perf_counter() - start) * 1000)
+        rows.append([row for row, _ in results])
+    return {"rows": rows, "latency_ms": percentiles(times)}
+
+
+def run(args) -> Dict[str, Any]:
+    vectors = synthetic_vectors(args.rows, args.dimension, args.rows_per_topic, args.topic_spread, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.choice(args.rows, size=args.queries, replace=False)
+    noise = rng.normal(size=(args.queries, args.dimension)).astype(np.float32) / np.sqrt(args.dimension)
+    queries = vectors[picks] + args.query_noise * noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    directory = args.data_dir or tempfile.mkdtemp(prefix="ann_recall_")
+    built = build_index(directory, vectors, args.batch_size, args.nprobe[0])
+    index: MmapVectorIndex = built["index"]
+    del vectors
+
+    unquantized = IVFIndex(f"{directory}/ann_none", quantization="none")
+    start = time.perf_counter()
+    unquantized.train(index._matrix)
+    unquantized_train_seconds = time.perf_counter() - start
+
+    report: Dict[str, Any] = {
+        "build": {
+            "rows": index.rows,
+            "upsert_seconds": round(built["seconds"], 3),
+            "ann_ready_seconds": round(built["ann_ready_seconds"], 3),
+            "nlist": len(index.ann.centroids),
+            "trained_rows": index.ann.trained_rows,
+            "incrementally_added_rows": index.rows - index.ann.trained_rows,
+            "unquantized_train_seconds": round(unquantized_train_seconds, 3),
+        },
+        "exact": {},
+        "ivf": [],
+    }
+
+    for subject in (None, SUBJECTS[0]):
+        label = subject or "all"
+        _, ranges = index._snapshot(subject)
+        exact = timed_search(lambda q: index.search(q, args.k, subject, exact=True), queries)
+        report["exact"][label] = {"latency_ms": exact["latency_ms"]}
+        for nprobe in args.nprobe:
+            for name, ann in (("int8", index.ann), ("none", unquantized)):
+                result = timed_search(
+                    lambda q: ann.search(index._matrix, q, args.k, ranges if subject else None, nprobe=nprobe)
+                    or index.search(q, args.k, subject, exact=True),
+                    queries,
+                )
+                report["ivf"].append({
+                    "filter": label,
+                    "quantization": name,
+                    "nprobe": nprobe,
+                    f"recall@{args.k}": recall(result["rows"], exact["rows"]),
+                    "latency_ms": result["latency_ms"],
+                    "speedup_p50": round(exact["latency_ms"]["p50"] / result["latency_ms"]["p50"], 2),
+                })
+
+    million = 1_000_000 / index.rows
+    report["memory_per_million_chunks_mb"] = {
+        "float32_rows_mmap": round(index.rows * args.dimension * 4 * million / 2**20, 1),
+        "ivf_int8_resident": round(index.ann.memory_bytes()["total"] * million / 2**20, 1),
+        "ivf_none_resident": round(unquantized.memory_bytes()["total"] * million / 2**20, 1),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="ann_recall.json", help="Where to write the JSON results")
+    parser.add_argument("--rows", type=int, default=100000, help="Chunks in the index")
+    parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--rows-per-topic", type=int, default=200, help="Average chunks per synthetic topic cluster")
+    parser.add_argument("--topic-spread", type=float, default=1.5, help="Noise around each topic centre, relative to the centre's scale")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per upsert (one subject per batch)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time")
+    parser.add_argument("--query-noise", type=float, default=0.5, help="Norm of the noise added to stored vectors to make queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32], help="IVF lists probed per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="Where to build the index (default: a fresh temp dir)")
+    args = parser.parse_args()
+
+    report = {"config": vars(args), **run(args)}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    build = report["build"]
+    print(f"{build['rows']} rows, {build['nlist']} lists, trained on {build['trained_rows']}, "
+          f"{build['incrementally_added_rows']} added incrementally")
+    for label, exact in report["exact"].items():
+        print(f"exact ({label}) p50 {exact['latency_ms']['p50']} ms  p95 {exact['latency_ms']['p95']} ms")
+    for entry in report["ivf"]:
+        print(f"  {entry['filter']:<10} {entry['quantization']:<5} nprobe {entry['nprobe']:>3}  "
+              f"recall@{args.k} {entry[f'recall@{args.k}']:.4f}  p50 {entry['latency_ms']['p50']} ms  "
+              f"p95 {entry['latency_ms']['p95']} ms  x{entry['speedup_p50']}")
+    print(f"memory per million chunks (MB): {report['memory_per_million_chunks_mb']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
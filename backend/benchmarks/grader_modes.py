@@ -0,0 +1,139 @@
+"""
+Compare the pointwise and listwise retrieval graders on a fixed question set.
+
+For every question the same retrieved documents are graded once per mode, and
+tokens (via the OpenAI callback), wall-clock latency and per-document verdict
+agreement are recorded. Runs against the live OpenAI/Pinecone setup.
+
+Usage (from backend/):
+    python -m benchmarks.grader_modes --output grader_modes.json
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from langchain_community.callbacks import get_openai_callback
+
+from config import GRADER_MAX_CONCURRENCY
+from graph.chains.listwise_retrieval_grader import (
+    format_documents_for_listwise_grading,
+    listwise_retrieval_grader,
+    listwise_to_pointwise,
+)
+from graph.chains.retrieval_grader import retrieval_grader
+from retrieval import get_retriever
+
+QUESTIONS = [
+    ("DataMining", "What is the Apriori algorithm?"),
+    ("DataMining", "Explain the difference between classification and clustering"),
+    ("DataMining", "How does k-means choose its initial centroids?"),
+    ("DataMining", "What is support and confidence in association rules?"),
+    ("DataMining", "How do you make a pizza?"),
+    ("Network", "What is CSMA/CD?"),
+    ("Network", "Explain the three-way TCP handshake"),
+    ("Network", "How does a symmetric key cipher differ from public key cryptography?"),
+    ("Network", "What does the network layer do in the OSI model?"),
+    ("Network", "Who won the football world cup in 2018?"),
+]
+
+
+def grade_pointwise(question: str, documents) -> List[str]:
+    scores = retrieval_grader.batch(
+        [{"question": question, "document": d.page_content} for d in documents],
+        config={"max_concurrency": GRADER_MAX_CONCURRENCY},
+    )
+    return [score.binary_score.lower() for score in scores]
+
+
+def grade_listwise(question: str, documents) -> List[str]:
+    result = listwise_retrieval_grader.invoke({
+        "question": question,
+        "documents": format_documents_for_listwise_grading(documents),
+    })
+    return [score.binary_score.lower() for score in listwise_to_pointwise(result, len(documents))]
+
+
+def run_mode(grader, question: str, documents) -> Dict[str, Any]:
+    with get_openai_callback() as cb:
+        start = time.perf_counter()
+        verdicts = grader(question, documents)
+        latency = time.perf_counter() - start
+    return {
+        "verdicts": verdicts,
+        "latency_s": round(latency, 3),
+        "llm_calls": cb.successful_requests,
+        "prompt_tokens": cb.prompt_tokens,
+        "completion_tokens": cb.completion_tokens,
+        "total_tokens": cb.total_tokens,
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [run["latency_s"] for run in runs]
+    return {
+        "mean_latency_s": round(statistics.mean(latencies), 3),
+        "p50_latency_s": round(statistics.median(latencies), 3),
+        "max_latency_s": round(max(latencies), 3),
+        "llm_calls": sum(run["llm_calls"] for run in runs),
+        "prompt_tokens": sum(run["prompt_tokens"] for run in runs),
+        "completion_tokens": sum(run["completion_tokens"] for run in runs),
+        "total_tokens": sum(run["total_tokens"] for run in runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="grader_modes.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    results = []
+    for subject, question in QUESTIONS:
+        documents = get_retriever(subject=subject).invoke(question)
+        pointwise = run_mode(grade_pointwise, question, documents)
+        listwise = run_mode(grade_listwise, question, documents)
+
+        agreeing = sum(p == l for p, l in zip(pointwise["verdicts"], listwise["verdicts"]))
+        results.append({
+            "subject": subject,
+            "question": question,
+            "num_documents": len(documents),
+            "pointwise": pointwise,
+            "listwise": listwise,
+            "documents_agreeing": agreeing,
+            # Whether both modes would make the same web-search decision
+            "web_search_agrees": ("no" in pointwise["verdicts"]) == ("no" in listwise["verdicts"]),
+        })
+        print(f"{question[:50]:<50} pointwise {pointwise['latency_s']:>6.2f}s {pointwise['total_tokens']:>6} tok | "
+              f"listwise {listwise['latency_s']:>6.2f}s {listwise['total_tokens']:>6} tok | "
+              f"agree {agreeing}/{len(documents)}")
+
+    total_documents = sum(r["num_documents"] for r in results)
+    report = {
+        "questions": results,
+        "summary": {
+            "pointwise": summarize([r["pointwise"] for r in results]),
+            "listwise": summarize([r["listwise"] for r in results]),
+            "document_agreement": round(
+                sum(r["documents_agreeing"] for r in results) / total_documents, 4
+            ) if total_documents else None,
+            "web_search_decision_agreement": round(
+                sum(r["web_search_agrees"] for r in results) / len(results), 4
+            ),
+        },
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report["summary"], indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
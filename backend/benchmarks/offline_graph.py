@@ -0,0 +1,518 @@
+"""
+Offline benchmark of the chat RAG graph (graph.graph.app).
+
+Runs a fixed question set through the compiled graph with local stand-ins for
+every external service, so results are repeatable and cost nothing:
+- ChatOpenAI answers deterministically after a configurable delay; structured
+  outputs are filled in from the requested schema and token usage is counted
+  with tiktoken
+- the Pinecone vector store is an in-memory store over a small built-in corpus
+  with hashed bag-of-words embeddings
+- Tavily returns canned results after a configurable delay
+
+Reports p50/p95/p99 latency per node and per request, LLM calls and tokens per
+request (in total and by chain) and throughput at the given concurrency, and
+writes everything as JSON so runs before and after a change can be compared.
+
+Usage (from backend/):
+    python -m benchmarks.offline_graph --concurrency 8 --repeat 5 --output offline_graph.json
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import math
+import os
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+QUESTIONS = [
+    ("DataMining", "What is the Apriori algorithm?"),
+    ("DataMining", "Explain the difference between classification and clustering"),
+    ("DataMining", "How does k-means choose its initial centroids?"),
+    ("DataMining", "What is support and confidence in association rules?"),
+    ("DataMining", "How do you make a pizza?"),
+    ("Network", "What is CSMA/CD?"),
+    ("Network", "Explain the three-way TCP handshake"),
+    ("Network", "How does a symmetric key cipher differ from public key cryptography?"),
+    ("Network", "Who won the football world cup in 2018?"),
+    ("Distributed", "What is the CAP theorem?"),
+    ("Distributed", "How do Lamport clocks order events?"),
+    ("Distributed", "Explain two-phase commit"),
+]
+
+CORPUS = [
+    ("DataMining", "The Apriori algorithm finds frequent itemsets level by level. Candidate k-itemsets are generated from frequent (k-1)-itemsets and pruned using the downward closure property: every subset of a frequent itemset must also be frequent."),
+    ("DataMining", "Support of an itemset is the fraction of transactions that contain it. Confidence of a rule X => Y is support(X and Y) divided by support(X). Association rules are kept when both exceed minimum thresholds."),
+    ("DataMining", "Classification is supervised learning: a model is trained on labelled examples to predict a class for new records. Clustering is unsupervised and groups records by similarity without predefined labels."),
+    ("DataMining", "k-means picks k initial centroids, often at random or with k-means++, assigns each point to its nearest centroid, recomputes centroids as cluster means and repeats until assignments stop changing."),
+    ("DataMining", "Decision tree induction splits records on the attribute with the highest information gain or gain ratio, recursing until leaves are pure or a stopping criterion is met."),
+    ("DataMining", "Data preprocessing covers cleaning, integration, reduction and transformation. Missing values can be filled with a global constant, the attribute mean or the most probable value."),
+    ("DataMining", "FP-growth mines frequent itemsets without candidate generation by compressing the database into an FP-tree and recursively mining conditional pattern bases."),
+    ("DataMining", "Outlier detection methods include statistical tests, distance-based approaches and density-based approaches such as the local outlier factor."),
+    ("Network", "CSMA/CD is the Ethernet medium access method: a station senses the carrier before sending, detects collisions while transmitting, sends a jam signal and retries after a random binary exponential backoff."),
+    ("Network", "TCP opens a connection with a three-way handshake: the client sends SYN, the server replies SYN-ACK and the client answers ACK, after which both sides have agreed on initial sequence numbers."),
+    ("Network", "Symmetric key ciphers such as AES use one shared secret key for encryption and decryption. Public key cryptography uses a key pair, so the public key can be distributed openly."),
+    ("Network", "The OSI network layer handles logical addressing and routing of packets between networks. IP is the main network layer protocol."),
+    ("Network", "Firewalls filter traffic by rules on addresses, ports and protocols. Stateful firewalls track connections and allow return traffic for established sessions."),
+    ("Network", "The sliding window protocol lets a sender transmit several frames before needing an acknowledgement, improving link utilisation over go-back-N and selective repeat."),
+    ("Network", "Digital signatures hash a message and encrypt the digest with the sender's private key so anyone with the public key can verify origin and integrity."),
+    ("Network", "DNS resolves domain names to IP addresses through a hierarchy of root, top-level domain and authoritative name servers, with caching at resolvers."),
+    ("Distributed", "The CAP theorem states that a distributed data store cannot simultaneously guarantee consistency, availability and partition tolerance; under a network partition it must give up consistency or availability."),
+    ("Distributed", "Lamport logical clocks assign each event a counter: a process increments its clock before each event and on receiving a message sets its clock to the maximum of its own and the message timestamp plus one."),
+    ("Distributed", "Two-phase commit coordinates an atomic transaction: in the prepare phase every participant votes, and in the commit phase the coordinator tells all participants to commit only if every vote was yes."),
+    ("Distributed", "Vector clocks extend Lamport clocks with one counter per process, allowing concurrent events to be detected rather than only ordered."),
+    ("Distributed", "Leader election algorithms such as the bully algorithm and ring algorithm choose a coordinator when the current one fails."),
+    ("Distributed", "Remote procedure call hides message passing behind a local-looking call; stubs marshal arguments and the runtime handles transport and failures."),
+    ("Distributed", "Replication improves availability and read throughput; consistency models range from strict and sequential consistency to eventual consistency."),
+    ("Distributed", "The Byzantine generals problem shows that agreement with f traitorous nodes requires at least 3f + 1 nodes in total."),
+]
+
+
+def offline_environment(data_dir: str, caches: bool) -> None:
+    """
+    Environment for importing the app without reaching any external service.
+    Must run before config/retrieval/graph are imported.
+    """
+    os.environ["RAG_DATA_DIR"] = data_dir
+    for var in ("OPENAI_API_KEY", "PINECONE_API_KEY", "TAVILY_API_KEY", "INDEX_NAME"):
+        os.environ.setdefault(var, "offline-benchmark")
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    os.environ["LANGSMITH_TRACING"] = "false"
+    if not caches:
+        os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["EMBEDDING_CACHE_DISK"] = "false"
+        os.environ["RETRIEVAL_CACHE_ENABLED"] = "false"
+        os.environ["WEB_SEARCH_CACHE_ENABLED"] = "false"
+
+    # retrieval.py resolves the Pinecone index at import; the benchmark never queries it
+    import pinecone
+    pinecone.Pinecone.Index = lambda self, *args, **kwargs: None
+
+
+def _fraction(text: str) -> float:
+    """
+    Deterministic value in [0, 1) for `text`
+    """
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"runs": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+    if len(values) == 1:
+        cuts = [values[0]] * 99
+    else:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "runs": len(values),
+        "mean": round(statistics.mean(values), 4),
+        "p50": round(cuts[49], 4),
+        "p95": round(cuts[94], 4),
+        "p99": round(cuts[98], 4),
+    }
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for ChatOpenAI, installed by patching its
+    _generate/_agenerate so the repo's real prompts, structured-output parsers
+    and callbacks all still run.
+    """
+
+    def __init__(self, args):
+        self.latency = args.llm_latency
+        self.per_token_latency = args.llm_per_token_latency
+        self.answer_tokens = args.answer_tokens
+        self.relevance_rate = args.relevance_rate
+        self.grounded_rate = args.grounded_rate
+        self.useful_rate = args.useful_rate
+        self.websearch_rate = args.websearch_rate
+
+    def _yes(self, text: str, rate: float) -> bool:
+        return _fraction(text) < rate
+
+    def _structured(self, name: str, schema: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+        if name == "GradeDocuments":
+            return {"binary_score": "yes" if self._yes(prompt, self.relevance_rate) else "no"}
+        if name == "GradeDocumentsListwise":
+            indices = [int(i) for i in re.findall(r"^\s*\[(\d+)\]", prompt, re.M)]
+            return {"grades": [
+                {"index": i, "binary_score": "yes" if self._yes(f"{prompt}#{i}", self.relevance_rate) else "no"}
+                for i in indices
+            ]}
+        if name == "GradeHallucinations":
+            return {"binary_score": self._yes(prompt, self.grounded_rate)}
+        if name == "GradeAnswer":
+            return {"binary_score": self._yes(prompt, self.useful_rate)}
+        if name == "GradeGeneration":
+            return {
+                "grounded": self._yes(prompt, self.grounded_rate),
+                "addresses_question": self._yes(prompt + "#answer", self.useful_rate),
+            }
+        if name == "RouteQuery":
+            return {"datasource": "websearch" if self._yes(prompt, self.websearch_rate) else "vectorstore"}
+
+        # Anything else: a valid instance built from the JSON schema
+        values = {}
+        for field, spec in schema.get("properties", {}).items():
+            kind = spec.get("type")
+            if "enum" in spec:
+                values[field] = spec["enum"][0]
+            elif kind == "boolean":
+                values[field] = True
+            elif kind in ("integer", "number"):
+                values[field] = 0
+            elif kind == "array":
+                values[field] = []
+            else:
+                values[field] = "yes"
+        return values
+
+    def _answer(self, prompt: str) -> str:
+        words = re.findall(r"[A-Za-z][A-Za-z-]+", prompt)[-200:] or ["answer"]
+        return " ".join(words[i % len(words)] for i in range(self.answer_tokens))
+
+    def respond(self, messages, kwargs) -> Tuple[Any, float]:
+        from langchain_core.messages import AIMessage
+        from langchain_core.outputs import ChatGeneration, ChatResult
+
+        from context_packer import count_tokens
+
+        prompt = "\n".join(str(message.content) for message in messages)
+        response_format = kwargs.get("response_format")
+        parsed = None
+        if isinstance(response_format, dict) and "json_schema" in response_format:
+            spec = response_format["json_schema"]
+            parsed = self._structured(spec["name"], spec.get("schema", {}), prompt)
+            content = json.dumps(parsed)
+        elif isinstance(response_format, type):
+            parsed = self._structured(response_format.__name__, response_format.model_json_schema(), prompt)
+            content = json.dumps(parsed)
+        else:
+            content = self._answer(prompt)
+
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(content)
+        message = AIMessage(
+            content=content,
+            additional_kwargs={"parsed": parsed} if parsed is not None else {},
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        result = ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }},
+        )
+        return result, self.latency + self.per_token_latency * completion_tokens
+
+    def install(self) -> None:
+        from langchain_openai import ChatOpenAI
+
+        fake = self
+
+        def _generate(llm, messages, stop=None, run_manager=None, **kwargs):
+            result, delay = fake.respond(messages, kwargs)
+            time.sleep(delay)
+            return result
+
+        async def _agenerate(llm, messages, stop=None, run_manager=None, **kwargs):
+            result, delay = fake.respond(messages, kwargs)
+            await asyncio.sleep(delay)
+            return result
+
+        ChatOpenAI._generate = _generate
+        ChatOpenAI._agenerate = _agenerate
+
+
+class HashEmbeddings:
+    """
+    Hashed bag-of-words embeddings with a configurable delay per call
+    """
+
+    def __init__(self, latency: float, dimension: int = 256):
+        self.latency = latency
+        self.dimension = dimension
+        self.model = "offline-hash"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimension] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class LocalVectorStore:
+    """
+    In-memory stand-in for PineconeVectorStore (and for the raw index queries
+    of diversity-aware retrieval) over CORPUS. Cosine similarities of hashed
+    bag-of-words vectors are low, so scores are mapped onto the band
+    OpenAI-embedding scores from Pinecone usually fall in.
+    """
+
+    def __init__(self, embeddings, latency: float):
+        from langchain_core.documents import Document
+
+        self.embeddings = embeddings
+        self.latency = latency
+        self.documents = [
+            Document(page_content=text, metadata={"subject": subject, "source": f"{subject}.pdf", "page": i})
+            for i, (subject, text) in enumerate(CORPUS)
+        ]
+        self.vectors = [embeddings._vector(doc.page_content) for doc in self.documents]
+
+    def _ranked(self, vector, k, filter, namespace):
+        # Subjects are scoped by namespace, or by filter without namespaces
+        subject = namespace or (filter or {}).get("subject")
+        scored = [
+            (i, 0.7 + 0.3 * sum(a * b for a, b in zip(vector, doc_vector)))
+            for i, (doc, doc_vector) in enumerate(zip(self.documents, self.vectors))
+            if subject is None or doc.metadata["subject"] == subject
+        ]
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:k]
+
+    def _search(self, vector, k, filter, namespace):
+        return [(self.documents[i].model_copy(deep=True), score) for i, score in self._ranked(vector, k, filter, namespace)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, namespace=None):
+        vector = self.embeddings.embed_query(query)
+        time.sleep(self.latency)
+        return self._search(vector, k, filter, namespace)
+
+    async def asimilarity_search_with_score(self, query, k=4, filter=None, namespace=None):
+        vector = await self.embeddings.aembed_query(query)
+        await asyncio.sleep(self.latency)
+        return self._search(vector, k, filter, namespace)
+
+    def query(self, vector, top_k=10, filter=None, namespace=None, **kwargs):
+        # Index-style query with values, as diversity-aware retrieval issues it
+        time.sleep(self.latency)
+        return {"matches": [
+            {
+                "id": str(i),
+                "score": score,
+                "values": self.vectors[i],
+                "metadata": {**self.documents[i].metadata, "text": self.documents[i].page_content},
+            }
+            for i, score in self._ranked(vector, top_k, filter, namespace)
+        ]}
+
+
+def fake_tavily(latency: float):
+    from langchain_core.runnables import RunnableLambda
+
+    def results(payload):
+        query = payload["query"]
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+        return {"results": [
+            {
+                "url": f"https://example.com/{digest}/{i}",
+                "title": f"Web result {i} for {query}",
+                "content": f"Result {i} about {query}. " * 20,
+            }
+            for i in range(3)
+        ]}
+
+    def search(payload):
+        time.sleep(latency)
+        return results(payload)
+
+    async def asearch(payload):
+        await asyncio.sleep(latency)
+        return results(payload)
+
+    return RunnableLambda(search, afunc=asearch)
+
+
+def request_usage_handler():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    from metrics import LLMMetricsHandler
+
+    class RequestUsage(BaseCallbackHandler):
+        """
+        LLM calls and tokens of one graph run, by chain
+        """
+
+        run_inline = True
+
+        def __init__(self):
+            self.by_chain = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            self._chains = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+            chain = LLMMetricsHandler._chain(tags, metadata)
+            self._chains[run_id] = chain
+            self.by_chain[chain]["calls"] += 1
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            chain = self._chains.pop(run_id, "other")
+            prompt_tokens, completion_tokens = LLMMetricsHandler._usage(response)
+            self.by_chain[chain]["prompt_tokens"] += prompt_tokens
+            self.by_chain[chain]["completion_tokens"] += completion_tokens
+
+        def totals(self) -> Dict[str, int]:
+            return {
+                key: sum(usage[key] for usage in self.by_chain.values())
+                for key in ("calls", "prompt_tokens", "completion_tokens")
+            }
+
+    return RequestUsage()
+
+
+async def run_benchmark(app, args, node_times) -> Dict[str, Any]:
+    from graph.utils.budget import init_budget
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(subject: str, question: str) -> Dict[str, Any]:
+        async with semaphore:
+            usage = request_usage_handler()
+            start = time.perf_counter()
+            state, error = {}, None
+            try:
+                state = await app.ainvoke(
+                    {"question": question, "subject": subject, **init_budget(args.tier)},
+                    config={"callbacks": [usage]},
+                )
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            return {
+                "latency": time.perf_counter() - start,
+                "usage": usage,
+                "grade": state.get("generation_grade"),
+                "degradations": state.get("degradations") or [],
+                "error": error,
+            }
+
+    workload = [pair for _ in range(args.repeat) for pair in QUESTIONS]
+    start = time.perf_counter()
+    runs = await asyncio.gather(*(one(subject, question) for subject, question in workload))
+    wall = time.perf_counter() - start
+
+    by_chain = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    for run in runs:
+        for chain, usage in run["usage"].by_chain.items():
+            for key, value in usage.items():
+                by_chain[chain][key] += value
+    totals = [run["usage"].totals() for run in runs]
+
+    return {
+        "requests": {
+            "count": len(runs),
+            "errors": [run["error"] for run in runs if run["error"]],
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(runs) / wall, 3) if wall else None,
+            "latency_seconds": percentiles([run["latency"] for run in runs]),
+        },
+        "nodes": {node: percentiles(times) for node, times in sorted(node_times.items())},
+        "llm": {
+            "calls_per_request": percentiles([t["calls"] for t in totals]),
+            "prompt_tokens_per_request": percentiles([t["prompt_tokens"] for t in totals]),
+            "completion_tokens_per_request": percentiles([t["completion_tokens"] for t in totals]),
+            "total_calls": sum(t["calls"] for t in totals),
+            "total_prompt_tokens": sum(t["prompt_tokens"] for t in totals),
+            "total_completion_tokens": sum(t["completion_tokens"] for t in totals),
+            "by_chain": {chain: dict(usage) for chain, usage in sorted(by_chain.items())},
+        },
+        "grades": dict(Counter(run["grade"] for run in runs)),
+        "degradations": dict(Counter(d for run in runs for d in run["degradations"])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="offline_graph.json", help="Where to write the JSON results")
+    parser.add_argument("--concurrency", type=int, default=4, help="Graph runs in flight at once")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the question set")
+    parser.add_argument("--tier", default=None, help="Quality tier (default: DEFAULT_QUALITY_TIER)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per LLM call")
+    parser.add_argument("--llm-per-token-latency", type=float, default=0.002, help="Extra seconds per completion token")
+    parser.add_argument("--answer-tokens", type=int, default=150, help="Words in each generated answer")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per embedding call")
+    parser.add_argument("--vectorstore-latency", type=float, default=0.05, help="Seconds per vector search")
+    parser.add_argument("--tavily-latency", type=float, default=0.8, help="Seconds per web search")
+    parser.add_argument("--relevance-rate", type=float, default=0.75, help="Share of graded chunks judged relevant")
+    parser.add_argument("--grounded-rate", type=float, default=0.9, help="Share of generations judged grounded")
+    parser.add_argument("--useful-rate", type=float, default=0.9, help="Share of generations judged useful")
+    parser.add_argument("--websearch-rate", type=float, default=0.1, help="Share of LLM routing decisions sent to web search")
+    parser.add_argument("--no-caches", action="store_true", help="Disable the embedding, retrieval and web search caches")
+    parser.add_argument("--data-dir", default=None, help="RAG_DATA_DIR for the run (default: a fresh temp dir)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="offline_graph_")
+    offline_environment(data_dir, caches=not args.no_caches)
+
+    import retrieval
+    from graph.graph import app
+    from lexical_index import lexical_index
+    from metrics import add_node_observer
+
+    # graph.nodes re-exports the node functions under the module names
+    web_search_module = importlib.import_module("graph.nodes.web_search")
+
+    FakeLLM(args).install()
+    embeddings = HashEmbeddings(args.embedding_latency)
+    retrieval.embedding.embeddings = embeddings
+    vectorstore = LocalVectorStore(embeddings, args.vectorstore_latency)
+    retrieval.retriever_pool._vectorstore = vectorstore
+    retrieval.retriever_pool.index = vectorstore
+    retrieval.retriever_pool._namespaces = {subject for subject, _ in CORPUS}
+    # Same chunks in the BM25 side of hybrid retrieval, as ingestion would do
+    for document in vectorstore.documents:
+        lexical_index.add(document.metadata["subject"], [document])
+    web_search_module.web_search_tool = fake_tavily(args.tavily_latency)
+
+    node_times: Dict[str, List[float]] = defaultdict(list)
+    add_node_observer(lambda graph, node, seconds: graph == "chat" and node_times[node].append(seconds))
+
+    results = asyncio.run(run_benchmark(app, args, node_times))
+    report = {"config": {**vars(args), "data_dir": data_dir}, **results}
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    requests = report["requests"]
+    print(f"{requests['count']} requests, {len(requests['errors'])} errors, "
+          f"{requests['throughput_rps']} req/s at concurrency {args.concurrency}")
+    print(f"request latency p50 {requests['latency_seconds']['p50']}s "
+          f"p95 {requests['latency_seconds']['p95']}s p99 {requests['latency_seconds']['p99']}s")
+    for node, stats in report["nodes"].items():
+        print(f"  {node:<18} runs {stats['runs']:>4}  p50 {stats['p50']:>7}s  p95 {stats['p95']:>7}s  p99 {stats['p99']:>7}s")
+    print(f"LLM calls/request p50 {report['llm']['calls_per_request']['p50']}, "
+          f"prompt tokens/request p50 {report['llm']['prompt_tokens_per_request']['p50']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local state (centroids, caches, indexes) is persisted under this directory
+DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# Vector store backend
+# "pinecone": the hosted Pinecone index (INDEX_NAME)
+# "local": append-only memory-mapped float32 index under LOCAL_VECTOR_STORE_PATH,
+#          searched exactly in-process; no network round-trip
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", os.path.join(DATA_DIR, "vectors"))
+# IVF approximate search for the local backend, trained once the index holds
+# LOCAL_ANN_MIN_ROWS rows and retrained when it has grown
+# LOCAL_ANN_RETRAIN_GROWTH-fold since. A query scans the LOCAL_ANN_NPROBE
+# closest lists; with "int8" quantization candidates are scored on int8 codes
+# held in memory and the best LOCAL_ANN_RERANK * k re-scored exactly ("none"
+# scores every candidate on the float32 rows)
+LOCAL_ANN_ENABLED = os.getenv("LOCAL_ANN_ENABLED", "true").lower() == "true"
+LOCAL_ANN_MIN_ROWS = int(os.getenv("LOCAL_ANN_MIN_ROWS", "50000"))
+LOCAL_ANN_RETRAIN_GROWTH = float(os.getenv("LOCAL_ANN_RETRAIN_GROWTH", "4.0"))
+LOCAL_ANN_NPROBE = int(os.getenv("LOCAL_ANN_NPROBE", "16"))
+LOCAL_ANN_QUANTIZATION = os.getenv("LOCAL_ANN_QUANTIZATION", "int8").lower()
+LOCAL_ANN_RERANK = int(os.getenv("LOCAL_ANN_RERANK", "4"))
+# Per-subject namespaces: each subject is ingested into its own Pinecone
+# namespace (or local-backend partition) named after it, and subject-scoped
+# searches query only that namespace instead of filtering the whole index by
+# metadata. Off by default: existing deployments keep every subject in the
+# default namespace behind a {"subject": ...} filter. Move that data with
+#   python -m namespaces
+# and then set this to "true". Subjects without a (non-empty) namespace of
+# their own are still searched in the default namespace by filter.
+SUBJECT_NAMESPACES_ENABLED = os.getenv("SUBJECT_NAMESPACES_ENABLED", "false").lower() == "true"
+
+# Retrieval
+# Number of chunks the chat graph retrieves per question
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# Hybrid retrieval: fuse the dense (Pinecone) ranking with a local BM25
+# ranking by reciprocal-rank fusion; "false" keeps dense search only
+HYBRID_RETRIEVAL_ENABLED = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+# RRF constant: a document scores sum(1 / (RRF_K + rank)) over both rankings
+RRF_K = int(os.getenv("RRF_K", "60"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Ingestion marks a subject's BM25 file dirty and a background timer rewrites
+# it this many seconds later, so back-to-back uploads write each file once and
+# requests never wait on it. Pending writes are flushed on shutdown; after a
+# crash, `python -m lexical_index` rebuilds from the vector store.
+LEXICAL_INDEX_SAVE_DELAY_SECONDS = float(os.getenv("LEXICAL_INDEX_SAVE_DELAY_SECONDS", "5"))
+# Diversity-aware retrieval: fetch MMR_FETCH_K candidates with their vectors
+# and keep up to k chosen by maximal marginal relevance, MMR_LAMBDA weighing
+# relevance against similarity to the chunks already chosen. Adaptive k: a
+# candidate scoring more than MMR_SCORE_DROP below the best one, as a fraction
+# of the best score (0.1: under 90% of it), is not taken, so the cutoff scales
+# with the embedding model's score range rather than being a fixed cosine gap;
+# nor is one at least MMR_DUPLICATE_THRESHOLD similar to a chosen chunk
+# (consecutive pages, repeated passages). At least MMR_MIN_K are kept.
+# "false" returns the top k by similarity
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_SCORE_DROP = float(os.getenv("MMR_SCORE_DROP", "0.1"))
+MMR_DUPLICATE_THRESHOLD = float(os.getenv("MMR_DUPLICATE_THRESHOLD", "0.97"))
+MMR_MIN_K = int(os.getenv("MMR_MIN_K", "2"))
+
+# Embedding cache (shared by every embedding call site)
+# Vectors kept in the in-process LRU
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+# SQLite tier that survives restarts; set to "false" to keep the cache in memory only
+EMBEDDING_CACHE_DISK = os.getenv("EMBEDDING_CACHE_DISK", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embeddings.sqlite3"))
+
+# Retrieval result cache, keyed by (subject, normalized query, k, filter).
+# Entries for a subject are dropped when ingestion bumps its version.
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2000"))
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+
+# Context packing for the generation chains (chat, quiz, flashcard, exam)
+# tiktoken encoding used to count context tokens (gpt-4o / gpt-4o-mini)
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "o200k_base")
+# Token budget for the packed context per chain; "default" covers any other chain
+CONTEXT_TOKEN_BUDGETS = json.loads(os.getenv(
+    "CONTEXT_TOKEN_BUDGETS",
+    json.dumps({
+        "default": 4000,
+        "chat": 4000,
+        "quiz": 6000,
+        "flashcard": 6000,
+        "exam": 12000,
+    }),
+))
+# Share of a chunk's word 3-grams found in another kept chunk above which it
+# counts as a near-duplicate (or overlapping chunk) and is dropped
+CONTEXT_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Retrieval grading
+# Maximum number of retrieval_grader calls in flight for a single grade_documents run
+GRADER_MAX_CONCURRENCY = int(os.getenv("GRADER_MAX_CONCURRENCY", "8"))
+# "pointwise": one retrieval_grader call per document
+# "listwise": one listwise_retrieval_grader call for all documents
+RETRIEVAL_GRADER_MODE = os.getenv("RETRIEVAL_GRADER_MODE", "pointwise")
+# Similarity-score bands that bypass the LLM grader: chunks scoring at least
+# "accept" are kept and chunks below "reject" are dropped without a grader
+# call; only the band in between is graded. Per-subject entries override
+# "default"; the whole mapping can be replaced with a JSON env var.
+RELEVANCE_SCORE_THRESHOLDS = json.loads(os.getenv(
+    "RELEVANCE_SCORE_THRESHOLDS",
+    json.dumps({
+        "default": {"accept": 0.88, "reject": 0.72},
+    }),
+))
+
+# Generation grading
+# "sequential": hallucination_grader, then answer_grader if grounded (no
+#               answer check is paid for ungrounded generations)
+# "concurrent": both graders at once; lower latency, always two calls
+# "combined": one generation_grader call returning both verdicts
+GENERATION_GRADER_MODE = os.getenv("GENERATION_GRADER_MODE", "sequential")
+
+# Upper bound on documents carried in the graph state across web search loops
+GRAPH_MAX_DOCUMENTS = int(os.getenv("GRAPH_MAX_DOCUMENTS", "12"))
+
+# Web search (Tavily) result cache, persisted under DATA_DIR
+WEB_SEARCH_CACHE_ENABLED = os.getenv("WEB_SEARCH_CACHE_ENABLED", "true").lower() == "true"
+WEB_SEARCH_CACHE_TTL_SECONDS = int(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "86400"))
+# Seconds past the TTL during which stale results are still served while a
+# background search refreshes them; 0 disables stale-while-revalidate
+WEB_SEARCH_CACHE_STALE_SECONDS = int(os.getenv("WEB_SEARCH_CACHE_STALE_SECONDS", "0"))
+
+# Semantic answer cache (in front of the RAG graph)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between question embeddings to count as a hit
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "21600"))
+
+# Quality tiers for the chat RAG graph. Each request gets a deadline
+# (time_budget_seconds) and bounded retry loops; when a limit is hit the
+# graph returns the best answer so far instead of looping.
+QUALITY_TIERS = {
+    "fast": {
+        "time_budget_seconds": 10.0,
+        "grade_generation": False,  # skip hallucination/answer grading
+        "max_generations": 1,
+        "max_web_searches": 1,
+    },
+    "balanced": {
+        "time_budget_seconds": 25.0,
+        "grade_generation": True,
+        "max_generations": 2,
+        "max_web_searches": 1,
+    },
+    "strict": {
+        "time_budget_seconds": 60.0,
+        "grade_generation": True,
+        "max_generations": 3,
+        "max_web_searches": 2,
+    },
+}
+DEFAULT_QUALITY_TIER = os.getenv("DEFAULT_QUALITY_TIER", "balanced")
+
+# Conversational query detection
+# Nearest-centroid tier: the best label must reach this cosine similarity and
+# beat the runner-up by the margin, otherwise the LLM classifier decides
+CONVERSATIONAL_MIN_SIMILARITY = float(os.getenv("CONVERSATIONAL_MIN_SIMILARITY", "0.82"))
+CONVERSATIONAL_MARGIN = float(os.getenv("CONVERSATIONAL_MARGIN", "0.04"))
+CONVERSATIONAL_MEMO_SIZE = int(os.getenv("CONVERSATIONAL_MEMO_SIZE", "4096"))
+
+# Subject routing
+# A question is in-distribution for a subject when its similarity to the
+# subject centroid is at least (mean - SUBJECT_ROUTER_Z * std) of the
+# similarities of that subject's own chunks; otherwise the LLM router decides
+SUBJECT_ROUTER_Z = float(os.getenv("SUBJECT_ROUTER_Z", "2.0"))
+# Subjects with fewer ingested chunks than this are left to the LLM router
+SUBJECT_ROUTER_MIN_CHUNKS = int(os.getenv("SUBJECT_ROUTER_MIN_CHUNKS", "20"))
+
+# Conversation memory for chat sessions
+# The last MEMORY_RECENT_MESSAGES messages are sent verbatim (each cut to
+# MEMORY_MESSAGE_MAX_TOKENS); older ones are folded into a running summary of
+# at most MEMORY_SUMMARY_MAX_TOKENS, so the history part of the prompt stays
+# bounded however long the session runs
+MEMORY_RECENT_MESSAGES = int(os.getenv("MEMORY_RECENT_MESSAGES", "6"))
+MEMORY_MESSAGE_MAX_TOKENS = int(os.getenv("MEMORY_MESSAGE_MAX_TOKENS", "400"))
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+
+# Batch chat (/api/chat/batch)
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+# Questions answered at once; the rest wait for a free slot
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
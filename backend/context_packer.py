@@ -0,0 +1,211 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import tiktoken
+
+from config import CONTEXT_ENCODING, CONTEXT_NEAR_DUPLICATE_THRESHOLD, CONTEXT_TOKEN_BUDGETS
+
+_encoding = None
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(CONTEXT_ENCODING)
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text))
+
+
+@dataclass
+class PackedContext:
+    """
+    Context string for a generation chain plus an account of what was left out
+    """
+
+    chain: str
+    text: str
+    documents: List[Any]
+    tokens: int
+    input_tokens: int
+    budget: int
+    duplicates_dropped: int = 0
+    over_budget_dropped: int = 0
+    truncated: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.input_tokens - self.tokens
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "chain": self.chain,
+            "tokens": self.tokens,
+            "input_tokens": self.input_tokens,
+            "tokens_saved": self.tokens_saved,
+            "budget": self.budget,
+            "chunks": len(self.documents),
+            "duplicates_dropped": self.duplicates_dropped,
+            "over_budget_dropped": self.over_budget_dropped,
+            "truncated": self.truncated,
+        }
+
+
+@dataclass
+class _Chunk:
+    doc: Any
+    text: str
+    tokens: int
+    position: int
+    shingles: set = field(default_factory=set)
+
+
+def _content(doc) -> str:
+    return doc.page_content if hasattr(doc, "page_content") else str(doc)
+
+
+def _score(doc) -> Optional[float]:
+    metadata = getattr(doc, "metadata", None) or {}
+    score = metadata.get("relevance_score")
+    return float(score) if score is not None else None
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlaps(a: _Chunk, b: _Chunk, threshold: float) -> bool:
+    """
+    Near-identical or overlapping: most of the smaller chunk's word 3-grams
+    also appear in the other one
+    """
+    smaller = min(len(a.shingles), len(b.shingles))
+    if not smaller:
+        return False
+    return len(a.shingles & b.shingles) / smaller >= threshold
+
+
+class PackingStats:
+    """
+    Running token totals per chain, for the stats endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chains: Dict[str, Dict[str, int]] = {}
+
+    def record(self, packed: PackedContext) -> None:
+        with self._lock:
+            totals = self._chains.setdefault(packed.chain, {
+                "requests": 0,
+                "input_tokens": 0,
+                "tokens": 0,
+                "tokens_saved": 0,
+                "duplicates_dropped": 0,
+                "over_budget_dropped": 0,
+            })
+            totals["requests"] += 1
+            totals["input_tokens"] += packed.input_tokens
+            totals["tokens"] += packed.tokens
+            totals["tokens_saved"] += packed.tokens_saved
+            totals["duplicates_dropped"] += packed.duplicates_dropped
+            totals["over_budget_dropped"] += packed.over_budget_dropped
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {chain: dict(totals) for chain, totals in self._chains.items()}
+
+
+packing_stats = PackingStats()
+
+
+def pack_context(
+    documents: Sequence[Any],
+    chain: str,
+    max_tokens: Optional[int] = None,
+    near_duplicate_threshold: float = CONTEXT_NEAR_DUPLICATE_THRESHOLD,
+    separator: str = "\n\n",
+) -> PackedContext:
+    """
+    Build the context string for `chain` from retrieved documents.
+
+    Exact and near-duplicate chunks are dropped (the higher scored copy is
+    kept), chunks are ordered by metadata["relevance_score"] (unscored ones,
+    e.g. web results, follow in their original order) and added until the
+    chain's token budget from CONTEXT_TOKEN_BUDGETS is used up. If even the
+    best chunk doesn't fit it is truncated, so the context is never empty
+    when documents were given.
+    """
+    budget = max_tokens or CONTEXT_TOKEN_BUDGETS.get(chain, CONTEXT_TOKEN_BUDGETS["default"])
+    encoding = get_encoding()
+    separator_tokens = len(encoding.encode(separator))
+
+    chunks = [
+        _Chunk(doc=doc, text=_content(doc), tokens=0, position=i)
+        for i, doc in enumerate(documents)
+    ]
+    for chunk in chunks:
+        chunk.tokens = len(encoding.encode(chunk.text))
+    input_tokens = sum(chunk.tokens for chunk in chunks) + separator_tokens * max(len(chunks) - 1, 0)
+
+    chunks.sort(key=lambda c: (_score(c.doc) is None, -(_score(c.doc) or 0.0), c.position))
+
+    kept: List[_Chunk] = []
+    seen_hashes = set()
+    duplicates_dropped = 0
+    for chunk in chunks:
+        digest = hashlib.sha1(" ".join(chunk.text.lower().split()).encode("utf-8")).hexdigest()
+        if digest in seen_hashes:
+            duplicates_dropped += 1
+            continue
+        chunk.shingles = _shingles(chunk.text)
+        if any(_overlaps(chunk, other, near_duplicate_threshold) for other in kept):
+            duplicates_dropped += 1
+            continue
+        seen_hashes.add(digest)
+        kept.append(chunk)
+
+    selected: List[_Chunk] = []
+    texts: List[str] = []
+    tokens = 0
+    over_budget_dropped = 0
+    truncated = False
+    for chunk in kept:
+        cost = chunk.tokens + (separator_tokens if selected else 0)
+        if tokens + cost <= budget:
+            selected.append(chunk)
+            texts.append(chunk.text)
+            tokens += cost
+        elif not selected:
+            texts.append(encoding.decode(encoding.encode(chunk.text)[:budget]))
+            selected.append(chunk)
+            tokens = budget
+            truncated = True
+        else:
+            over_budget_dropped += 1
+
+    packed = PackedContext(
+        chain=chain,
+        text=separator.join(texts),
+        documents=[chunk.doc for chunk in selected],
+        tokens=tokens,
+        input_tokens=input_tokens,
+        budget=budget,
+        duplicates_dropped=duplicates_dropped,
+        over_budget_dropped=over_budget_dropped,
+        truncated=truncated,
+    )
+    packing_stats.record(packed)
+    print(
+        f"---CONTEXT ({chain}): {packed.tokens}/{packed.input_tokens} TOKENS, "
+        f"SAVED {packed.tokens_saved} ({duplicates_dropped} DUPLICATES, "
+        f"{over_budget_dropped} OVER BUDGET)---"
+    )
+    return packed
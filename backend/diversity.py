@@ -0,0 +1,107 @@
+import threading
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def maximal_marginal_relevance(
+    query_vector,
+    vectors: Sequence,
+    scores: Sequence[float],
+    k: int,
+    lambda_mult: float = 0.7,
+    score_drop: float = 0.1,
+    duplicate_threshold: float = 0.97,
+    min_k: int = 1,
+) -> Dict[str, Any]:
+    """
+    Pick up to k of the candidates (vectors with the vector store's similarity
+    scores), most relevant first, each next one maximizing
+    lambda_mult * score - (1 - lambda_mult) * max cosine similarity to the
+    chunks already picked.
+
+    The number picked adapts to the candidates: those scoring more than
+    `score_drop` (a fraction of the best candidate's score) below the best
+    candidate are not picked, nor are
+    near-duplicates (similarity >= duplicate_threshold to a picked chunk),
+    unless that would leave fewer than `min_k`.
+
+    Returns {"indices": picked candidate positions in pick order,
+    "below_score": candidates cut by the score drop-off,
+    "duplicates": candidates skipped as near-duplicates}.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if not len(scores) or k <= 0:
+        return {"indices": [], "below_score": 0, "duplicates": 0}
+    k = min(k, len(scores))
+    min_k = min(min_k, k)
+
+    by_score = np.argsort(-scores, kind="stable")
+    best_score = scores[by_score[0]]
+    eligible = by_score[scores[by_score] >= best_score - score_drop * abs(best_score)]
+    if len(eligible) < min_k:
+        eligible = by_score[:min_k]
+
+    vectors = _normalize(vectors)[eligible]
+    relevance = scores[eligible]
+    similarity = vectors @ vectors.T
+
+    selected = [0]
+    available = np.ones(len(eligible), dtype=bool)
+    available[0] = False
+    duplicates = 0
+    while len(selected) < k and available.any():
+        redundancy = similarity[:, selected].max(axis=1)
+        duplicate = available & (redundancy >= duplicate_threshold)
+        if len(selected) >= min_k and duplicate.any():
+            duplicates += int(duplicate.sum())
+            available &= ~duplicate
+            if not available.any():
+                break
+        marginal = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        available[best] = False
+
+    return {
+        "indices": [int(eligible[i]) for i in selected],
+        "below_score": len(scores) - len(eligible),
+        "duplicates": duplicates,
+    }
+
+
+class DiversityStats:
+    """
+    Running totals of how many fetched candidates MMR selection kept, for the
+    stats endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {"searches": 0, "candidates": 0, "selected": 0, "below_score": 0, "duplicates": 0}
+
+    def record(self, candidates: int, selection: Dict[str, Any]) -> None:
+        with self._lock:
+            self._totals["searches"] += 1
+            self._totals["candidates"] += candidates
+            self._totals["selected"] += len(selection["indices"])
+            self._totals["below_score"] += selection["below_score"]
+            self._totals["duplicates"] += selection["duplicates"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = dict(self._totals)
+        totals["selected_per_search"] = (
+            round(totals["selected"] / totals["searches"], 2) if totals["searches"] else 0.0
+        )
+        return totals
+
+
+diversity_stats = DiversityStats()
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches vectors by (model, text hash).
+
+    Lookups go to an in-process LRU first, then to an optional SQLite file, and
+    only texts missing from both are sent to the wrapped embeddings (as one
+    batch for embed_documents). Query and document embeddings share the cache
+    since the same model produces the same vector for a given text.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_entries: int = 10000,
+        db_path: Optional[str] = None,
+        model: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = self._open_db(db_path) if db_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _open_db(db_path: str) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        db.commit()
+        return db
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.memory_hits += 1
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if self._db is not None and missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", missing
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    found[key] = vector
+                    self.disk_hits += 1
+
+            self.misses += len([key for key in missing if key not in found])
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self._db is not None and vectors:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [
+                        (key, np.asarray(vector, dtype=np.float32).tobytes())
+                        for key, vector in vectors.items()
+                    ],
+                )
+                self._db.commit()
+
+    async def _alookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        # SQLite reads block; keep them off the event loop
+        if self._db is None:
+            return self._lookup(keys)
+        return await asyncio.to_thread(self._lookup, keys)
+
+    async def _astore(self, vectors: Dict[str, List[float]]) -> None:
+        if self._db is None:
+            self._store(vectors)
+        else:
+            await asyncio.to_thread(self._store, vectors)
+
+    def _pending(self, texts: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        # Unique texts that still need an embedding call, by cache key
+        pending: Dict[str, str] = {}
+        for text in texts:
+            key = self._key(text)
+            if key not in found:
+                pending.setdefault(key, text)
+        return pending
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+        pending = self._pending(texts, found)
+        if pending:
+            vectors = self.embeddings.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = await self._alookup(keys)
+        pending = self._pending(texts, found)
+        if pending:
+            vectors = await self.embeddings.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            await self._astore(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key not in found:
+            found[key] = self.embeddings.embed_query(text)
+            self._store({key: found[key]})
+        return found[key]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = await self._alookup([key])
+        if key not in found:
+            found[key] = await self.embeddings.aembed_query(text)
+            await self._astore({key: found[key]})
+        return found[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "model": self.model,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk": self.db_path,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
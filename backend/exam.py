@@ -6,12 +6,14 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
 # Langchain imports
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableSequence
 from pydantic import BaseModel, Field
-from pinecone import Pinecone
+
+from context_packer import pack_context
+from metrics import chain_tag, traced_node
+from retrieval import similarity_search_with_scores
 
 load_dotenv()
 
@@ -19,6 +21,8 @@ load_dotenv()
 AVAILABLE_SUBJECTS = ["DataMining", "Network", "Distributed", "Energy"]
 RETRIEVE = "retrieve"
 GENERATE_EXAM = "generate_exam"
+EXAM_RETRIEVAL_K = 12  # At most this many diverse chunks for exam generation
+EXAM_FETCH_K = 40  # Candidates the diverse chunks are chosen from
 
 # State Definition
 class ExamState(TypedDict):
@@ -29,27 +33,6 @@ class ExamState(TypedDict):
     exam_config: Optional[dict]
     generation: str
 
-# Initialize components
-embedding = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.environ["INDEX_NAME"])
-
-# Retriever function
-def get_retriever(subject=None):
-    vectorstore = PineconeVectorStore(index=index, embedding=embedding)
-    
-    if subject:
-        retriever = vectorstore.as_retriever(
-            search_kwargs={
-                "filter": {"subject": subject},
-                "k": 20  # Get more documents for exam generation
-            }
-        )
-    else:
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 20})
-    
-    return retriever
-
 # Exam models
 class ExamQuestion(BaseModel):
     question: str = Field(description="The exam question (open-ended or descriptive)")
@@ -66,7 +49,7 @@ class ExamData(BaseModel):
     total_marks: int = Field(description="Total marks for the exam")
 
 # LLMs and chains
-llm = ChatOpenAI(temperature=0.3, model="gpt-4o-mini")
+llm = ChatOpenAI(temperature=0.3, model="gpt-4o-mini", tags=[chain_tag("exam_generator")])
 structured_llm_exam = llm.with_structured_output(ExamData)
 
 exam_system_prompt = """You are an expert educational content creator specializing in generating comprehensive exam questions.
@@ -131,7 +114,7 @@ class AnswerEvaluation(BaseModel):
     key_points_covered: List[str] = Field(description="Key points that were covered")
     key_points_missed: List[str] = Field(description="Key points that were missed")
 
-evaluation_llm = ChatOpenAI(temperature=0.2, model="gpt-4o-mini")
+evaluation_llm = ChatOpenAI(temperature=0.2, model="gpt-4o-mini", tags=[chain_tag("exam_evaluation")])
 structured_llm_evaluator = evaluation_llm.with_structured_output(AnswerEvaluation)
 
 evaluation_system_prompt = """You are an expert educational evaluator assessing student exam answers.
@@ -189,12 +172,12 @@ def retrieve(state: ExamState) -> Dict[str, Any]:
     if subject:
         search_query = f"{subject} {search_query}"
         print(f"---FILTERING BY SUBJECT: {subject}---")
-        retriever = get_retriever(subject=subject)
     else:
         print("---NO SUBJECT FILTER---")
-        retriever = get_retriever()
     
-    documents = retriever.invoke(search_query)
+    documents = similarity_search_with_scores(
+        search_query, subject=subject, k=EXAM_RETRIEVAL_K, fetch_k=EXAM_FETCH_K
+    )
     print(f"---RETRIEVED {len(documents)} DOCUMENTS FOR EXAM GENERATION---")
     
     return {
@@ -225,8 +208,8 @@ def generate_exam(state: ExamState) -> Dict[str, Any]:
             "subject": subject
         }
     
-    # Combine document content
-    doc_content = "\n\n".join([doc.page_content for doc in documents[:15]])
+    # Combine deduplicated document content within the exam token budget
+    doc_content = pack_context(documents, "exam").text
     
     # Retry logic: Try up to 3 times to get the correct number of questions
     max_retries = 3
@@ -327,8 +310,8 @@ def generate_exam(state: ExamState) -> Dict[str, Any]:
 workflow = StateGraph(ExamState)
 
 # Add nodes
-workflow.add_node(RETRIEVE, retrieve)
-workflow.add_node(GENERATE_EXAM, generate_exam)
+workflow.add_node(RETRIEVE, traced_node("exam", RETRIEVE, retrieve))
+workflow.add_node(GENERATE_EXAM, traced_node("exam", GENERATE_EXAM, generate_exam))
 
 # Build flow: retrieve -> generate exam
 workflow.set_entry_point(RETRIEVE)
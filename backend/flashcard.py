@@ -5,12 +5,14 @@ import os
 import random
 
 # Langchain imports
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableSequence
 from pydantic import BaseModel, Field
-from pinecone import Pinecone
+
+from context_packer import pack_context
+from metrics import chain_tag, traced_node
+from retrieval import get_retriever
 
 load_dotenv()
 
@@ -28,24 +30,6 @@ class FlashcardState(TypedDict):
     flashcard_config: Optional[dict]
     generation: str
 
-# Initialize components
-embedding = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.environ["INDEX_NAME"])
-
-# Retriever function
-def get_retriever(subject=None):
-    vectorstore = PineconeVectorStore(index=index, embedding=embedding)
-    
-    if subject:
-        retriever = vectorstore.as_retriever(
-            search_kwargs={"filter": {"subject": subject}}
-        )
-    else:
-        retriever = vectorstore.as_retriever()
-    
-    return retriever
-
 # Flashcard models
 class Flashcard(BaseModel):
     front: str = Field(description="Question or prompt on the front of the card")
@@ -61,7 +45,7 @@ class FlashcardSet(BaseModel):
     subject: str = Field(description="Academic subject area")
 
 # LLMs and chains
-llm = ChatOpenAI(temperature=0.3, model="gpt-4o-mini")
+llm = ChatOpenAI(temperature=0.3, model="gpt-4o-mini", tags=[chain_tag("flashcard_generator")])
 structured_llm_flashcard = llm.with_structured_output(FlashcardSet)
 
 flashcard_system_prompt = """You are an expert educational content creator specializing in generating effective flashcards for active recall and spaced repetition learning.
@@ -155,8 +139,8 @@ def generate_flashcards(state: FlashcardState) -> Dict[str, Any]:
         }
     
     try:
-        # Combine document content
-        doc_content = "\n\n".join([doc.page_content for doc in documents])
+        # Combine deduplicated document content within the flashcard token budget
+        doc_content = pack_context(documents, "flashcard").text
         
         # Generate flashcards
         flashcard_result = flashcard_generator_chain.invoke({
@@ -204,8 +188,8 @@ def generate_flashcards(state: FlashcardState) -> Dict[str, Any]:
 workflow = StateGraph(FlashcardState)
 
 # Add nodes
-workflow.add_node(RETRIEVE, retrieve)
-workflow.add_node(GENERATE_FLASHCARDS, generate_flashcards)
+workflow.add_node(RETRIEVE, traced_node("flashcard", RETRIEVE, retrieve))
+workflow.add_node(GENERATE_FLASHCARDS, traced_node("flashcard", GENERATE_FLASHCARDS, generate_flashcards))
 
 # Build simple flow: retrieve -> generate flashcards
 workflow.set_entry_point(RETRIEVE)
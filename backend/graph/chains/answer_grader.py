@@ -3,6 +3,8 @@ from langchain_core.runnables import RunnableSequence
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from metrics import chain_tag
+
 class GradeAnswer(BaseModel):
 
     binary_score: bool = Field(
@@ -10,7 +12,7 @@ class GradeAnswer(BaseModel):
     )
 
 
-llm = ChatOpenAI(temperature=0, model = "gpt-4o-mini")
+llm = ChatOpenAI(temperature=0, model = "gpt-4o-mini", tags=[chain_tag("answer_grader")])
 structured_llm_grader = llm.with_structured_output(GradeAnswer)
 
 system = """You are a grader assessing whether an answer addresses / resolves a question \n 
@@ -0,0 +1,26 @@
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from config import MEMORY_SUMMARY_MAX_TOKENS
+from metrics import chain_tag
+
+llm = ChatOpenAI(
+    temperature=0,
+    model="gpt-4o-mini",
+    max_tokens=MEMORY_SUMMARY_MAX_TOKENS,
+    tags=[chain_tag("conversation_summarizer")],
+)
+
+system = f"""You maintain a running summary of a tutoring conversation between a student and an AI tutor. \n
+     Update the existing summary with the new messages. Keep the topics covered, what the student asked about, \n
+     key facts and definitions the tutor gave and anything the student said they did not understand. \n
+     Drop greetings and small talk. Write plain prose, at most {MEMORY_SUMMARY_MAX_TOKENS * 3 // 4} words."""
+summarizer_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Existing summary: \n\n {summary} \n\n New messages: \n\n {messages}"),
+    ]
+)
+
+conversation_summarizer = summarizer_prompt | llm | StrOutputParser()
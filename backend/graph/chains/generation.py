@@ -2,7 +2,9 @@ from langchain import hub
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
 
-llm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
+from metrics import chain_tag
+
+llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", tags=[chain_tag("generation")])
 prompt = hub.pull("rlm/rag-prompt")
 
 generation_chain = prompt | llm | StrOutputParser()
\ No newline at end of file
@@ -0,0 +1,34 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableSequence
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from metrics import chain_tag
+
+llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", tags=[chain_tag("generation_grader")])
+
+
+class GradeGeneration(BaseModel):
+    """Grounding and answer-relevance verdicts for an LLM generation."""
+
+    grounded: bool = Field(
+        description="Answer is grounded in / supported by the facts, 'yes' or 'no'"
+    )
+    addresses_question: bool = Field(
+        description="Answer addresses / resolves the question, 'yes' or 'no'"
+    )
+
+
+structured_llm_grader = llm.with_structured_output(GradeGeneration)
+
+system = """You are a grader assessing an LLM generation against a set of retrieved facts and a user question. \n 
+     Give two binary scores. 'grounded' is 'yes' if the answer is grounded in / supported by the set of facts. \n
+     'addresses_question' is 'yes' if the answer resolves the question."""
+generation_grade_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Set of facts: \n\n {documents} \n\n User question: {question} \n\n LLM generation: {generation}"),
+    ]
+)
+
+generation_grader: RunnableSequence = generation_grade_prompt | structured_llm_grader
@@ -3,7 +3,9 @@ from langchain_core.runnables import RunnableSequence
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
-llm = ChatOpenAI(temperature=0, model = "gpt-4o-mini")
+from metrics import chain_tag
+
+llm = ChatOpenAI(temperature=0, model = "gpt-4o-mini", tags=[chain_tag("hallucination_grader")])
 
 
 class GradeHallucinations(BaseModel):
@@ -0,0 +1,62 @@
+from typing import List
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableSequence
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from graph.chains.retrieval_grader import GradeDocuments
+from metrics import chain_tag
+
+llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", tags=[chain_tag("listwise_retrieval_grader")])
+
+
+class DocumentRelevance(BaseModel):
+    """Relevance verdict for one numbered document."""
+
+    index: int = Field(description="Number of the document as given in the prompt")
+    binary_score: str = Field(
+        description="Document is relevant to the question, 'yes' or 'no'"
+    )
+
+
+class GradeDocumentsListwise(BaseModel):
+    """Relevance verdicts for all retrieved documents, one per document."""
+
+    grades: List[DocumentRelevance] = Field(
+        description="One verdict for every numbered document"
+    )
+
+
+structured_llm_grader = llm.with_structured_output(GradeDocumentsListwise)
+
+system = """You are a grader assessing relevance of retrieved documents to a user question. \n 
+    You are given several numbered documents. Grade each one independently. \n
+    If a document contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
+    Return exactly one binary score 'yes' or 'no' for every document number."""
+listwise_grade_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Retrieved documents: \n\n {documents} \n\n User question: {question}"),
+    ]
+)
+
+listwise_retrieval_grader: RunnableSequence = listwise_grade_prompt | structured_llm_grader
+
+
+def format_documents_for_listwise_grading(documents) -> str:
+    return "\n\n".join(
+        f"[{i}] {doc.page_content}" for i, doc in enumerate(documents, start=1)
+    )
+
+
+def listwise_to_pointwise(result: GradeDocumentsListwise, num_documents: int) -> List[GradeDocuments]:
+    """
+    Expand a listwise result into one GradeDocuments per document, in order.
+    Documents the model skipped are treated as not relevant.
+    """
+    scores = {grade.index: grade.binary_score for grade in result.grades}
+    return [
+        GradeDocuments(binary_score=scores.get(i, "no"))
+        for i in range(1, num_documents + 1)
+    ]
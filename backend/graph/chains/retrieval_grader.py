@@ -2,7 +2,9 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
-llm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
+from metrics import chain_tag
+
+llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", tags=[chain_tag("retrieval_grader")])
 
 
 class GradeDocuments(BaseModel):
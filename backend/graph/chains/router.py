@@ -4,6 +4,8 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from metrics import chain_tag
+
 
 class RouteQuery(BaseModel):
     """Route a user query to the most relevant datasource."""
@@ -14,7 +16,7 @@ class RouteQuery(BaseModel):
     )
 
 
-llm = ChatOpenAI(temperature=0, model = "gpt-4o-mini")
+llm = ChatOpenAI(temperature=0, model = "gpt-4o-mini", tags=[chain_tag("question_router")])
 structured_llm_router = llm.with_structured_output(RouteQuery)
 
 system = """You are an expert at routing a user question to either a vectorstore or a web search.
@@ -0,0 +1,38 @@
+from typing import List
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableSequence
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from metrics import chain_tag
+
+llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", tags=[chain_tag("shared_retrieval_grader")])
+
+
+class GradeSharedDocument(BaseModel):
+    """Which of several numbered questions a retrieved document is relevant to."""
+
+    relevant_questions: List[int] = Field(
+        description="Numbers of the questions the document is relevant to; empty if none"
+    )
+
+
+structured_llm_grader = llm.with_structured_output(GradeSharedDocument)
+
+system = """You are a grader assessing relevance of one retrieved document to several user questions. \n 
+    You are given the document and numbered questions. Judge each question independently. \n
+    If the document contains keyword(s) or semantic meaning related to a question, it is relevant to that question. \n
+    Return the numbers of all questions the document is relevant to."""
+shared_grade_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Retrieved document: \n\n {document} \n\n User questions: \n\n {questions}"),
+    ]
+)
+
+shared_retrieval_grader: RunnableSequence = shared_grade_prompt | structured_llm_grader
+
+
+def format_questions_for_shared_grading(questions: List[str]) -> str:
+    return "\n".join(f"[{i}] {question}" for i, question in enumerate(questions, start=1))
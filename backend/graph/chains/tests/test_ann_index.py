@@ -0,0 +1,73 @@
+import threading
+
+import numpy as np
+
+from ann_index import IVFIndex
+from benchmarks.ann_recall import build_index, recall, synthetic_vectors
+from local_vectorstore import MmapVectorIndex
+
+
+def _records(vectors, start=0):
+    return [
+        {"id": str(start + i), "values": vector, "metadata": {"subject": "Network"}}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def test_ivf_recall_against_exact_search(tmp_path) -> None:
+    vectors = synthetic_vectors(8000, 64, rows_per_topic=100, spread=1.5, seed=0)
+    queries = vectors[::200] + 0.05 * np.random.default_rng(1).normal(size=(40, 64)).astype(np.float32)
+    index = build_index(str(tmp_path), vectors, batch_size=1000, nprobe=16)["index"]
+
+    exact = [[row for row, _ in index.search(q, 10, exact=True)] for q in queries]
+    approximate = [[row for row, _ in index.search(q, 10)] for q in queries]
+
+    assert index.ann.trained and index.ann.rows == index.rows
+    assert recall(approximate, exact) >= 0.9
+
+
+def test_search_stays_exact_until_training_finishes(tmp_path, monkeypatch) -> None:
+    release = threading.Event()
+    train = IVFIndex.train
+
+    def slow_train(self, matrix, *args, **kwargs):
+        release.wait(timeout=10)
+        train(self, matrix, *args, **kwargs)
+
+    monkeypatch.setattr(IVFIndex, "train", slow_train)
+    vectors = synthetic_vectors(400, 16, rows_per_topic=20, spread=1.0, seed=0)
+    index = MmapVectorIndex(str(tmp_path), ann=IVFIndex(str(tmp_path / "ann")), ann_min_rows=200)
+    index.upsert(_records(vectors[:300]))
+    # Upserts don't wait for training, and rows keep arriving meanwhile
+    index.upsert(_records(vectors[300:], start=300))
+
+    assert not index.ann.trained
+    assert index.stats()["ann_training"]
+    assert index.search(vectors[350], 1) == index.search(vectors[350], 1, exact=True)
+
+    release.set()
+    index.wait_for_ann()
+
+    assert index.ann.trained and index.ann.rows == 400
+    assert index.search(vectors[350], 1)[0][0] == 350
+
+
+def test_clear_drops_a_training_run_in_flight(tmp_path, monkeypatch) -> None:
+    release = threading.Event()
+    train = IVFIndex.train
+
+    def slow_train(self, matrix, *args, **kwargs):
+        release.wait(timeout=10)
+        train(self, matrix, *args, **kwargs)
+
+    monkeypatch.setattr(IVFIndex, "train", slow_train)
+    vectors = synthetic_vectors(300, 16, rows_per_topic=20, spread=1.0, seed=0)
+    index = MmapVectorIndex(str(tmp_path), ann=IVFIndex(str(tmp_path / "ann")), ann_min_rows=200)
+    index.upsert(_records(vectors))
+    index.clear()
+
+    release.set()
+    index.wait_for_ann()
+
+    assert not index.ann.trained
+    assert not (tmp_path / "ann").exists()
@@ -0,0 +1,186 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+from langchain_core.documents import Document
+
+from api.models import ChatBatchRequest
+from graph.chains.shared_retrieval_grader import GradeSharedDocument
+from graph.utils.source_extractor import document_key
+
+batch_grading = importlib.import_module("graph.utils.batch_grading")
+chat_api = importlib.import_module("api.chat")
+
+TCP = Document(page_content="tcp retransmits lost segments", metadata={"relevance_score": 0.8})
+UDP = Document(page_content="udp sends datagrams", metadata={"relevance_score": 0.8})
+ROUTING = Document(page_content="routers forward packets", metadata={"relevance_score": 0.8})
+CLEAR = Document(page_content="tcp uses a three way handshake", metadata={"relevance_score": 0.95})
+
+
+class FakeSharedGrader:
+    """
+    Stands in for shared_retrieval_grader: a chunk is relevant to the
+    numbered questions that share a word with it; "udp" chunks fail
+    """
+
+    def __init__(self):
+        self.inputs = []
+
+    async def abatch(self, inputs, config=None, return_exceptions=False):
+        self.inputs.extend(inputs)
+        results = []
+        for item in inputs:
+            if "udp" in item["document"]:
+                results.append(RuntimeError("grader timed out"))
+                continue
+            words = set(item["document"].split())
+            relevant = []
+            for line in item["questions"].splitlines():
+                number, question = line[1:].split("] ", 1)
+                if words & set(question.lower().rstrip("?").split()):
+                    relevant.append(int(number))
+            results.append(GradeSharedDocument(relevant_questions=relevant))
+        return results
+
+
+@pytest.fixture
+def shared_grader(monkeypatch) -> FakeSharedGrader:
+    fake = FakeSharedGrader()
+    monkeypatch.setattr(batch_grading, "shared_retrieval_grader", fake)
+    return fake
+
+
+def test_only_chunks_shared_by_several_questions_are_graded(shared_grader) -> None:
+    questions = ["Why does tcp retransmit?", "How do routers work?", "What is udp?"]
+    documents = [[TCP, UDP, CLEAR], [TCP, ROUTING, UDP], [UDP]]
+
+    verdicts = asyncio.run(batch_grading.ashare_retrieval_grades(questions, documents, "Network"))
+
+    # ROUTING has a single holder and CLEAR is decided by score; UDP's grade failed
+    assert [item["document"] for item in shared_grader.inputs] == [TCP.page_content, UDP.page_content]
+    assert verdicts == [{document_key(TCP): "yes"}, {document_key(TCP): "no"}, {}]
+
+
+def test_no_shared_chunks_means_no_grader_calls(shared_grader) -> None:
+    verdicts = asyncio.run(batch_grading.ashare_retrieval_grades(["a", "b"], [[TCP], [ROUTING]], "Network"))
+
+    assert verdicts == [{}, {}]
+    assert shared_grader.inputs == []
+
+
+class FakeEmbedding:
+    def __init__(self):
+        self.batches = []
+
+    async def aembed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class FakeSemanticCache:
+    enabled = True
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.stored = []
+
+    async def aembed_question(self, question):
+        return question
+
+    def lookup(self, subject, question_vector):
+        if question_vector in self.answers:
+            return {"generation": self.answers[question_vector], "sources": []}
+        return None
+
+    def store(self, subject, question, question_vector, generation, sources):
+        self.stored.append(question)
+
+
+class FakeRagApp:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.inputs = []
+
+    async def ainvoke(self, input):
+        self.inputs.append(input)
+        if input["question"] == self.fail_on:
+            raise RuntimeError("model unavailable")
+        return {
+            "generation": f"answer to {input['question']}",
+            "sources": [],
+            "subject": input.get("subject"),
+            "generation_grade": "useful",
+            "tier": "balanced",
+        }
+
+
+@pytest.fixture
+def batch_env(monkeypatch, shared_grader):
+    fake_embedding = FakeEmbedding()
+    cache = FakeSemanticCache({"What is tcp?": "cached tcp answer"})
+    retrieved = {
+        "What is tcp?": [TCP],
+        "Why does tcp retransmit?": [TCP, ROUTING],
+        "How do tcp routers work?": [TCP, ROUTING],
+        "What is udp?": [UDP],
+    }
+
+    async def search(question, **kwargs):
+        return retrieved[question]
+
+    monkeypatch.setattr(chat_api, "embedding", fake_embedding)
+    monkeypatch.setattr(chat_api, "semantic_cache", cache)
+    monkeypatch.setattr(chat_api, "asimilarity_search_with_scores", search)
+    monkeypatch.setattr(chat_api, "BATCH_MAX_CONCURRENCY", 2)
+    return fake_embedding, cache
+
+
+def _collect(request, rag_app):
+    async def run():
+        return [event async for event in chat_api._stream_batch_events(request, rag_app)]
+
+    events = []
+    for raw in asyncio.run(run()):
+        name, data = raw.strip().split("\n", 1)
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_batch_stream_answers_every_question(batch_env) -> None:
+    fake_embedding, cache = batch_env
+    questions = ["What is tcp?", "Why does tcp retransmit?", "How do tcp routers work?", "What is udp?"]
+    rag_app = FakeRagApp(fail_on="What is udp?")
+
+    events = _collect(ChatBatchRequest(questions=questions, subject="Network"), rag_app)
+
+    # One embedding call for the whole batch
+    assert fake_embedding.batches == [questions]
+
+    answers = {data["index"]: data for name, data in events if name == "answer"}
+    assert answers[0]["cached"] is True and answers[0]["generation"] == "cached tcp answer"
+    assert answers[1]["generation"] == "answer to Why does tcp retransmit?"
+    assert [data["index"] for name, data in events if name == "error"] == [3]
+    # The cached question never reaches the graph; the others get their shared grades
+    shared = {item["question"]: item["shared_verdicts"] for item in rag_app.inputs}
+    assert set(shared) == set(questions[1:])
+    assert shared["Why does tcp retransmit?"] == {document_key(TCP): "yes", document_key(ROUTING): "no"}
+    assert shared["What is udp?"] == {}
+    assert sorted(cache.stored) == ["How do tcp routers work?", "Why does tcp retransmit?"]
+
+    name, done = events[-1]
+    assert name == "done"
+    assert {key: done[key] for key in ("questions", "answered", "cached", "failed", "shared_grades")} == {
+        "questions": 4, "answered": 3, "cached": 1, "failed": 1, "shared_grades": 4,
+    }
+
+
+def test_batch_preparation_failure_is_one_error_event(batch_env, monkeypatch) -> None:
+    async def failing_search(question, **kwargs):
+        raise RuntimeError("index unreachable")
+
+    monkeypatch.setattr(chat_api, "asimilarity_search_with_scores", failing_search)
+
+    events = _collect(ChatBatchRequest(questions=["Why does tcp retransmit?"], subject="Network"), FakeRagApp())
+
+    assert events == [("error", {"detail": "Error processing batch: index unreachable"})]
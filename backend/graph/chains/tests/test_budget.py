@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from api.chat import _cacheable
+from graph.graph import decide_after_generation_grade
+from graph.nodes.grade_generation import _finalize_grade, _skip_grading
+from graph.utils.budget import can_regenerate, can_web_search, deadline_passed, init_budget
+
+
+def _state(tier="balanced", **fields):
+    return {**init_budget(tier), "generation": "answer", **fields}
+
+
+def test_init_budget_uses_the_tier_time_budget() -> None:
+    before = time.time()
+    budget = init_budget("fast")
+
+    assert budget["tier"] == "fast"
+    assert budget["generation_count"] == 0 and budget["degradations"] == []
+    assert before + 10 <= budget["deadline"] <= time.time() + 10
+    assert init_budget("fast", time_budget_seconds=2)["deadline"] <= time.time() + 2
+    with pytest.raises(ValueError):
+        init_budget("thorough")
+
+
+@pytest.mark.parametrize("tier, generations, allowed", [
+    ("fast", 0, True), ("fast", 1, False),
+    ("balanced", 1, True), ("balanced", 2, False),
+    ("strict", 2, True), ("strict", 3, False),
+])
+def test_regenerations_are_bounded_by_the_tier(tier, generations, allowed) -> None:
+    assert can_regenerate(_state(tier, generation_count=generations)) is allowed
+
+
+@pytest.mark.parametrize("tier, loops, allowed", [
+    ("balanced", 0, True), ("balanced", 1, False),
+    ("strict", 1, True), ("strict", 2, False),
+])
+def test_web_searches_are_bounded_by_the_tier(tier, loops, allowed) -> None:
+    assert can_web_search(_state(tier, loop_count=loops)) is allowed
+
+
+def test_nothing_is_retried_after_the_deadline() -> None:
+    state = _state("strict", deadline=time.time() - 1)
+
+    assert deadline_passed(state)
+    assert not can_regenerate(state)
+    assert not can_web_search(state)
+    assert decide_after_generation_grade({**state, "generation_grade": "not supported"}) == "useful"
+
+
+def test_grading_is_skipped_by_tier_and_deadline() -> None:
+    assert _skip_grading(_state("fast"))["generation_grade"] == "ungraded"
+    assert _skip_grading(_state("fast"))["degradations"] == []
+    assert _skip_grading(_state()) is None
+
+    late = _skip_grading(_state(deadline=time.time() - 1))
+
+    assert late["degradations"] == ["generation_grading_skipped"]
+
+
+def test_out_of_budget_falls_back_to_the_best_earlier_answer() -> None:
+    state = _state(
+        generation="second try",
+        generation_count=2,
+        best_generation="first try",
+        best_generation_grade="not useful",
+    )
+
+    result = _finalize_grade(state, "not supported")
+
+    assert result["generation"] == "first try"
+    assert result["degradations"] == ["ungrounded_answer", "returned_earlier_answer"]
+    assert decide_after_generation_grade({**state, **result}) == "useful"
+
+
+def test_only_useful_answers_without_degradations_are_cached() -> None:
+    answer = {"generation": "TCP is reliable", "generation_grade": "useful", "degradations": []}
+
+    assert _cacheable(answer)
+    assert not _cacheable({**answer, "generation_grade": "ungraded"})
+    assert not _cacheable({**answer, "generation_grade": "not supported"})
+    assert not _cacheable({**answer, "degradations": ["generation_grading_skipped"]})
+    assert not _cacheable({**answer, "degradations": ["web_search_skipped"]})
+    assert not _cacheable({**answer, "is_conversational": True})
+    assert not _cacheable({"generation_grade": "useful"})
@@ -0,0 +1,61 @@
+from langchain_core.documents import Document
+
+from context_packer import count_tokens, pack_context, packing_stats
+
+
+def test_pack_context_drops_duplicates() -> None:
+    text = "the transport layer provides end to end delivery between processes"
+    documents = [
+        Document(page_content=text, metadata={"relevance_score": 0.8}),
+        Document(page_content=text.upper(), metadata={"relevance_score": 0.9}),
+        Document(page_content="routing picks paths across networks", metadata={"relevance_score": 0.7}),
+    ]
+
+    packed = pack_context(documents, "chat", max_tokens=1000)
+
+    assert packed.duplicates_dropped == 1
+    assert packed.documents == [documents[1], documents[2]]
+
+
+def test_pack_context_respects_budget() -> None:
+    documents = [
+        Document(page_content=f"chunk {i} " + "word " * 20, metadata={"relevance_score": 1 - i / 10})
+        for i in range(5)
+    ]
+    budget = count_tokens(documents[0].page_content) * 2 + count_tokens("\n\n")
+
+    packed = pack_context(documents, "chat", max_tokens=budget)
+
+    assert packed.documents == documents[:2]
+    assert packed.over_budget_dropped == 3
+    assert packed.tokens <= budget
+
+
+def test_pack_context_truncates_oversized_best_chunk() -> None:
+    documents = [Document(page_content="word " * 50)]
+
+    packed = pack_context(documents, "chat", max_tokens=10)
+
+    assert packed.truncated
+    assert packed.documents == documents
+    assert count_tokens(packed.text) <= 10
+
+
+def test_unscored_chunks_follow_scored_ones() -> None:
+    documents = [
+        Document(page_content="web result about tcp handshakes"),
+        Document(page_content="routing tables map prefixes", metadata={"relevance_score": 0.6}),
+        Document(page_content="congestion windows grow slowly", metadata={"relevance_score": 0.9}),
+    ]
+
+    packed = pack_context(documents, "chat", max_tokens=1000)
+
+    assert packed.documents == [documents[2], documents[1], documents[0]]
+
+
+def test_packing_is_recorded_per_chain() -> None:
+    before = packing_stats.snapshot().get("quiz", {}).get("requests", 0)
+
+    pack_context([Document(page_content="a chunk")], "quiz", max_tokens=100)
+
+    assert packing_stats.snapshot()["quiz"]["requests"] == before + 1
@@ -0,0 +1,101 @@
+import asyncio
+
+import graph.utils.conversation_memory as memory
+from api.models import ChatSession
+from graph.utils.conversation_memory import (
+    aupdate_summary,
+    contextualize_question,
+    conversation_memory,
+    format_conversation,
+)
+
+
+class FakeSummarizer:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def ainvoke(self, inputs):
+        self.calls.append(inputs)
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("summarizer down")
+        return f"summary of {inputs['messages'].count(chr(10)) + 1} messages"
+
+
+def _session(count: int) -> ChatSession:
+    return ChatSession(
+        session_id="s1",
+        messages=[
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+            for i in range(count)
+        ],
+    )
+
+
+def test_memory_keeps_recent_messages_verbatim(monkeypatch) -> None:
+    monkeypatch.setattr(memory, "MEMORY_RECENT_MESSAGES", 4)
+    session = _session(10)
+    session.summary = "earlier turns"
+
+    fields = conversation_memory(session)
+
+    assert fields["conversation_summary"] == "earlier turns"
+    assert [m["content"] for m in fields["conversation_history"]] == [f"message {i}" for i in range(6, 10)]
+    assert format_conversation(None, None) == ""
+    assert format_conversation("earlier turns", fields["conversation_history"][:1]).endswith("Student: message 6")
+
+
+def test_follow_up_is_anchored_to_previous_question() -> None:
+    history = [{"role": "user", "content": "What is TCP?"}, {"role": "assistant", "content": "A protocol."}]
+
+    assert contextualize_question("tell me more", history) == "tell me more (follow-up to: What is TCP?)"
+    assert contextualize_question("What is TCP?", []) == "What is TCP?"
+
+
+def test_summary_folds_only_new_messages(monkeypatch) -> None:
+    summarizer = FakeSummarizer()
+    monkeypatch.setattr(memory, "conversation_summarizer", summarizer)
+    monkeypatch.setattr(memory, "MEMORY_RECENT_MESSAGES", 4)
+    session = _session(8)
+
+    assert asyncio.run(aupdate_summary(session))
+    assert session.summarized_messages == 4
+    assert not asyncio.run(aupdate_summary(session))
+
+    session.messages.extend({"role": "user", "content": f"message {i}"} for i in range(8, 10))
+    assert asyncio.run(aupdate_summary(session))
+
+    assert session.summarized_messages == 6
+    assert len(summarizer.calls) == 2
+    assert summarizer.calls[1]["summary"] == "summary of 4 messages"
+    assert "message 4" in summarizer.calls[1]["messages"] and "message 3" not in summarizer.calls[1]["messages"]
+
+
+def test_overlapping_updates_summarize_once(monkeypatch) -> None:
+    summarizer = FakeSummarizer()
+    monkeypatch.setattr(memory, "conversation_summarizer", summarizer)
+    monkeypatch.setattr(memory, "MEMORY_RECENT_MESSAGES", 4)
+    session = _session(8)
+
+    async def run():
+        return await asyncio.gather(aupdate_summary(session), aupdate_summary(session))
+
+    assert sorted(asyncio.run(run())) == [False, True]
+    assert len(summarizer.calls) == 1
+
+
+def test_failed_summary_is_retried_next_turn(monkeypatch) -> None:
+    monkeypatch.setattr(memory, "conversation_summarizer", FakeSummarizer(fail=True))
+    monkeypatch.setattr(memory, "MEMORY_RECENT_MESSAGES", 4)
+    session = _session(8)
+
+    assert not asyncio.run(aupdate_summary(session))
+    assert session.summary is None and session.summarized_messages == 0
+
+
+def test_summary_lock_lives_with_the_session() -> None:
+    first, second = _session(2), _session(2)
+
+    assert first._summary_lock is not second._summary_lock
+    assert "_summary_lock" not in first.model_dump()
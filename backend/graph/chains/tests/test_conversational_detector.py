@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import graph.utils.conversational_detector as detector
+from graph.utils.conversational_detector import (
+    CentroidClassifier,
+    QueryType,
+    _ClassificationMemo,
+    adetect_conversational_query,
+    classify_by_rules,
+    detect_conversational_query,
+    normalize_query,
+)
+
+
+class AxisEmbeddings(Embeddings):
+    """Greetings point one way, questions another"""
+
+    def __init__(self):
+        self.queries = 0
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] if "hello" in text else [0.0, 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self.embed_documents([text])[0]
+
+
+class FakeLLMClassifier:
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, inputs):
+        self.calls.append(inputs)
+        return QueryType(is_conversational=True, is_question=False, requires_context=False)
+
+    async def ainvoke(self, inputs):
+        return self.invoke(inputs)
+
+
+class FakeCentroids:
+    def __init__(self, subjects):
+        self.subjects = subjects
+
+    def route(self, vector, subject=None):
+        return ("vectorstore", subject, 0.9) if subject in self.subjects else None
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    embeddings = AxisEmbeddings()
+    classifier = CentroidClassifier(
+        embeddings,
+        {"conversational": ["hello there"], "question": ["what is tcp"]},
+        min_similarity=0.8,
+        margin=0.1,
+    )
+    llm = FakeLLMClassifier()
+    monkeypatch.setattr(detector, "centroid_classifier", classifier)
+    monkeypatch.setattr(detector, "embedding", embeddings)
+    monkeypatch.setattr(detector, "query_classifier", llm)
+    monkeypatch.setattr(detector, "subject_centroids", FakeCentroids({"Network"}))
+    monkeypatch.setattr(detector, "classification_memo", _ClassificationMemo(100))
+    return embeddings, llm
+
+
+@pytest.mark.parametrize("query", ["Hi!", "thanks a lot", "Good morning", "how are you doing?", ""])
+def test_rules_catch_greetings_and_thanks(query) -> None:
+    assert classify_by_rules(normalize_query(query))["is_conversational"]
+
+
+@pytest.mark.parametrize("query", ["What is TCP?", "tell me more", "thanks, but what is a router?"])
+def test_rules_leave_questions_to_later_tiers(query) -> None:
+    assert classify_by_rules(normalize_query(query)) is None
+
+
+def test_embedding_tier_reuses_the_question_vector(tiers) -> None:
+    embeddings, llm = tiers
+
+    result = detect_conversational_query("Explain TCP congestion", "Network", query_vector=[0.0, 2.0])
+
+    assert result["classified_by"] == "embedding" and result["is_question"]
+    assert embeddings.queries == 0
+    assert not llm.calls
+
+
+def test_embedding_tier_embeds_the_raw_question_once(tiers) -> None:
+    embeddings, _ = tiers
+
+    result = asyncio.run(adetect_conversational_query("Explain TCP congestion", "Network"))
+
+    assert result["classified_by"] == "embedding"
+    assert embeddings.queries == 1
+
+
+def test_question_outside_the_subject_goes_to_the_llm(tiers) -> None:
+    _, llm = tiers
+
+    result = detect_conversational_query("Explain TCP congestion", "Energy", query_vector=[0.0, 1.0])
+
+    assert result["classified_by"] == "llm"
+    assert llm.calls[0]["subject"] == "Energy"
+
+
+def test_results_are_memoized_per_subject(tiers) -> None:
+    embeddings, _ = tiers
+
+    detect_conversational_query("Explain TCP congestion", "Network")
+    detect_conversational_query("explain tcp congestion?", "Network")
+
+    assert embeddings.queries == 1
+    assert detector.classification_memo.stats()["classified_by"]["memo"] == 1
@@ -0,0 +1,56 @@
+import numpy as np
+
+from diversity import DiversityStats, maximal_marginal_relevance
+from retrieval import _select_diverse
+
+
+def test_mmr_skips_near_duplicates() -> None:
+    vectors = [[1.0, 0.0, 0.0], [1.0, 0.01, 0.0], [0.0, 1.0, 0.0]]
+    selection = maximal_marginal_relevance([1.0, 0.0, 0.0], vectors, [0.9, 0.89, 0.85], k=3)
+
+    assert selection["indices"] == [0, 2]
+    assert selection["duplicates"] == 1
+
+
+def test_mmr_score_drop_is_relative_to_best_score() -> None:
+    vectors = np.eye(4)
+    high = maximal_marginal_relevance(vectors[0], vectors, [0.9, 0.85, 0.8, 0.5], k=4)
+    low = maximal_marginal_relevance(vectors[0], vectors, [0.45, 0.425, 0.4, 0.25], k=4)
+
+    assert high["indices"] == low["indices"] == [0, 1]
+    assert high["below_score"] == low["below_score"] == 2
+
+
+def test_mmr_keeps_min_k() -> None:
+    vectors = np.eye(3)
+    selection = maximal_marginal_relevance(vectors[0], vectors, [0.9, 0.2, 0.1], k=3, min_k=2)
+
+    assert selection["indices"] == [0, 1]
+
+
+def test_empty_candidates_select_nothing() -> None:
+    assert maximal_marginal_relevance([1.0, 0.0], [], [], k=4)["indices"] == []
+
+
+def test_selected_matches_become_documents() -> None:
+    matches = [
+        {"id": "1", "score": 0.9, "values": [1.0, 0.0], "metadata": {"text": "tcp", "subject": "Network"}},
+        {"id": "2", "score": 0.89, "values": [1.0, 0.001], "metadata": {"text": "tcp again", "subject": "Network"}},
+        {"id": "3", "score": 0.85, "values": [0.0, 1.0], "metadata": {"text": "routing", "subject": "Network"}},
+    ]
+
+    results = _select_diverse([1.0, 0.0], matches, 3)
+
+    assert [(doc.page_content, score) for doc, score in results] == [("tcp", 0.9), ("routing", 0.85)]
+    assert results[0][0].metadata == {"subject": "Network"}
+
+
+def test_stats_average_selected_chunks_per_search() -> None:
+    stats = DiversityStats()
+    stats.record(10, {"indices": [0, 1, 2], "below_score": 5, "duplicates": 2})
+    stats.record(10, {"indices": [0], "below_score": 9, "duplicates": 0})
+
+    snapshot = stats.snapshot()
+
+    assert snapshot["selected_per_search"] == 2.0
+    assert snapshot["below_score"] == 14 and snapshot["duplicates"] == 2
@@ -0,0 +1,74 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_only_missing_texts_are_embedded_once_per_batch() -> None:
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner)
+
+    assert cache.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert cache.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+
+    assert inner.texts == ["a", "bb", "ccc"]
+    assert cache.embed_query("a") == [1.0, 1.0]
+    assert inner.calls == 2
+
+
+def test_evicted_vectors_are_read_back_from_disk(tmp_path) -> None:
+    inner = CountingEmbeddings()
+    db_path = str(tmp_path / "embeddings.db")
+    cache = CachedEmbeddings(inner, max_entries=2, db_path=db_path)
+    cache.embed_documents(["a", "bb", "ccc"])
+
+    assert cache.stats()["entries"] == 2
+    assert cache.embed_query("a") == [1.0, 1.0]
+    assert cache.disk_hits == 1
+
+    reopened = CachedEmbeddings(inner, max_entries=2, db_path=db_path)
+    assert reopened.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert inner.calls == 1
+
+
+def test_async_paths_share_the_memory_and_disk_tiers(tmp_path) -> None:
+    inner = CountingEmbeddings()
+    db_path = str(tmp_path / "embeddings.db")
+    CachedEmbeddings(inner, db_path=db_path).embed_documents(["a"])
+    cache = CachedEmbeddings(inner, db_path=db_path)
+
+    async def run():
+        return (
+            await cache.aembed_query("a"),
+            await cache.aembed_documents(["a", "bb"]),
+            await cache.aembed_query("bb"),
+        )
+
+    assert asyncio.run(run()) == ([1.0, 1.0], [[1.0, 1.0], [2.0, 1.0]], [2.0, 1.0])
+    assert inner.texts == ["a", "bb"]
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["memory_hits"] == 2
+
+
+def test_vectors_are_keyed_by_model(tmp_path) -> None:
+    inner = CountingEmbeddings()
+    db_path = str(tmp_path / "embeddings.db")
+    CachedEmbeddings(inner, db_path=db_path, model="small").embed_query("a")
+
+    CachedEmbeddings(inner, db_path=db_path, model="large").embed_query("a")
+
+    assert inner.calls == 2
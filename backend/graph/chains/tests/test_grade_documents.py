@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.documents import Document
+
+from graph.chains.retrieval_grader import GradeDocuments
+from graph.utils.budget import init_budget
+
+grade_module = importlib.import_module("graph.nodes.grade_documents")
+
+
+class FakeGrader:
+    """
+    Stands in for retrieval_grader: a document is relevant when it mentions
+    "tcp", and each call sleeps so overlapping calls can be counted.
+    """
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.max_concurrency = None
+        self._lock = threading.Lock()
+
+    def _grade(self, inputs) -> GradeDocuments:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return GradeDocuments(binary_score="yes" if "tcp" in inputs["document"] else "no")
+
+    def batch(self, inputs, config=None):
+        self.max_concurrency = (config or {}).get("max_concurrency")
+        with ThreadPoolExecutor(max_workers=self.max_concurrency or len(inputs)) as pool:
+            return list(pool.map(self._grade, inputs))
+
+    async def abatch(self, inputs, config=None):
+        self.max_concurrency = (config or {}).get("max_concurrency")
+        semaphore = asyncio.Semaphore(self.max_concurrency or len(inputs))
+
+        async def grade(item):
+            async with semaphore:
+                return await asyncio.to_thread(self._grade, item)
+
+        return await asyncio.gather(*(grade(item) for item in inputs))
+
+
+@pytest.fixture
+def grader(monkeypatch):
+    fake = FakeGrader()
+    monkeypatch.setattr(grade_module, "retrieval_grader", fake)
+    monkeypatch.setattr(grade_module, "RETRIEVAL_GRADER_MODE", "pointwise")
+    monkeypatch.setattr(grade_module, "GRADER_MAX_CONCURRENCY", 3)
+    return fake
+
+
+def _state(documents, **extra):
+    return {
+        "question": "What does TCP guarantee?",
+        "subject": "Network",
+        "documents": documents,
+        "loop_count": 0,
+        **init_budget("balanced"),
+        **extra,
+    }
+
+
+def _documents(texts):
+    return [Document(page_content=text, metadata={"source": f"doc{i}.pdf"}) for i, text in enumerate(texts)]
+
+
+def test_grade_documents_grades_concurrently_and_keeps_order(grader) -> None:
+    documents = _documents(["tcp retransmits", "udp is connectionless", "tcp orders bytes", "ip routes", "tcp acks", "arp"])
+
+    result = grade_module.grade_documents(_state(documents))
+
+    assert grader.calls == 6
+    assert grader.max_concurrency == 3
+    assert 1 < grader.max_in_flight <= 3
+    assert result["documents"] == [documents[0], documents[2], documents[4]]
+    assert result["web_search"] is True
+
+
+def test_agrade_documents_matches_sync_results(grader) -> None:
+    documents = _documents(["tcp retransmits", "udp is connectionless", "tcp orders bytes", "ip routes"])
+
+    result = asyncio.run(grade_module.agrade_documents(_state(documents)))
+
+    assert grader.calls == 4
+    assert 1 < grader.max_in_flight <= 3
+    assert result["documents"] == [documents[0], documents[2]]
+    assert result["web_search"] is True
+
+
+def test_grade_documents_skips_grader_for_decisive_scores(grader) -> None:
+    documents = [
+        Document(page_content="udp header", metadata={"relevance_score": 0.95}),
+        Document(page_content="tcp handshake", metadata={"relevance_score": 0.5}),
+        Document(page_content="tcp window", metadata={"relevance_score": 0.8}),
+    ]
+
+    result = grade_module.grade_documents(_state(documents))
+
+    # Only the mid-band chunk reaches the grader; the scores decide the rest
+    assert grader.calls == 1
+    assert result["documents"] == [documents[0], documents[2]]
+    assert result["web_search"] is True
+
+
+def test_all_relevant_documents_need_no_web_search(grader) -> None:
+    documents = _documents(["tcp retransmits", "tcp orders bytes"])
+
+    result = grade_module.grade_documents(_state(documents))
+
+    assert result["web_search"] is False
+    assert "degradations" not in result
+
+
+def test_exhausted_web_search_budget_is_recorded(grader) -> None:
+    documents = _documents(["tcp retransmits", "udp is connectionless"])
+
+    result = grade_module.grade_documents(_state(documents, loop_count=1))
+
+    assert result["web_search"] is True
+    assert result["degradations"] == ["web_search_skipped"]
@@ -0,0 +1,98 @@
+import json
+import time
+
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from local_vectorstore import PartitionedVectorIndex
+
+CHUNKS = [
+    "CSMA/CD detects collisions on shared Ethernet links",
+    "TCP/IP congestion control halves the window on loss",
+    "Routing protocols such as OSPF flood link state",
+]
+
+
+def _documents(subject="Network"):
+    return [Document(page_content=text, metadata={"subject": subject, "page": i}) for i, text in enumerate(CHUNKS)]
+
+
+def test_tokenize_keeps_compound_terms_and_parts() -> None:
+    assert tokenize("What is CSMA/CD?") == ["csma/cd", "csma", "cd"]
+
+
+def test_search_ranks_matching_chunk_first(tmp_path) -> None:
+    index = LexicalIndex(str(tmp_path))
+    assert index.add("Network", _documents()) == 3
+    assert index.add("Network", _documents()) == 0
+
+    results = index.search("csma/cd collisions", "Network", k=2)
+
+    assert results[0].page_content == CHUNKS[0]
+    assert results[0].metadata["bm25_score"] > 0
+    assert index.search("csma", "Energy") == []
+
+
+def test_index_round_trips_through_disk(tmp_path) -> None:
+    index = LexicalIndex(str(tmp_path))
+    index.add("Network", _documents())
+    index.save()
+
+    reloaded = LexicalIndex(str(tmp_path))
+
+    assert reloaded.stats() == index.stats()
+    for query in ("csma/cd", "congestion window", "ospf link state"):
+        assert reloaded.search(query, "Network") == index.search(query, "Network")
+
+
+def test_schedule_save_writes_changed_subjects_once_in_the_background(tmp_path) -> None:
+    index = LexicalIndex(str(tmp_path), save_delay=0.05)
+    index.add("Network", _documents())
+    index.add("Energy", _documents("Energy"))
+    index.schedule_save("Network")
+    index.schedule_save("Network")
+
+    assert not (tmp_path / "Network.json").exists()
+    time.sleep(0.3)
+
+    assert json.loads((tmp_path / "Network.json").read_text())["lengths"]
+    assert not (tmp_path / "Energy.json").exists()
+
+
+def test_flush_writes_pending_saves_now(tmp_path) -> None:
+    index = LexicalIndex(str(tmp_path), save_delay=60)
+    index.add("Network", _documents())
+    index.schedule_save("Network")
+
+    index.flush()
+
+    assert LexicalIndex(str(tmp_path)).stats() == index.stats()
+
+
+def test_rebuild_from_index_matches_ingested_index(tmp_path) -> None:
+    ingested = LexicalIndex(str(tmp_path / "ingested"))
+    ingested.add("Network", _documents())
+    store = PartitionedVectorIndex(str(tmp_path / "vectors"))
+    store.upsert([
+        {"id": str(i), "values": [1.0, float(i)], "metadata": {**doc.metadata, "text": doc.page_content}}
+        for i, doc in enumerate(_documents() + _documents("Energy"))
+    ])
+
+    rebuilt = LexicalIndex(str(tmp_path / "rebuilt"))
+    rebuilt.rebuild_from_index(store, ["Network"])
+    reloaded = LexicalIndex(str(tmp_path / "rebuilt"))
+
+    assert reloaded.stats() == ingested.stats()
+    assert reloaded.search("ospf", "Network") == ingested.search("ospf", "Network")
+
+
+def test_rrf_rewards_documents_in_both_rankings() -> None:
+    dense = [Document(page_content=text, metadata={"relevance_score": 0.9}) for text in ("a", "b", "c")]
+    lexical = [Document(page_content=text, metadata={"bm25_score": 3.0}) for text in ("c", "d")]
+
+    fused = reciprocal_rank_fusion([dense, lexical], k=3)
+
+    assert [doc.page_content for doc in fused] == ["c", "a", "b"]
+    assert fused[0].metadata["relevance_score"] == 0.9
+    assert fused[0].metadata["bm25_score"] == 3.0
+    assert fused[0].metadata["rrf_score"] == round(1 / 63 + 1 / 61, 6)
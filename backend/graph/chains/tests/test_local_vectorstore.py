@@ -0,0 +1,80 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from local_vectorstore import LocalVectorStore, MmapVectorIndex, PartitionedVectorIndex
+
+
+class KeywordEmbeddings(Embeddings):
+    """One dimension per keyword, so similarity follows shared keywords"""
+
+    keywords = ("tcp", "routing", "clustering")
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(keyword in text.lower()) + 0.01 for keyword in self.keywords]
+
+
+def _record(id_, text, subject):
+    return {
+        "id": id_,
+        "values": KeywordEmbeddings().embed_query(text),
+        "metadata": {"subject": subject, "text": text},
+    }
+
+
+RECORDS = [
+    _record("n1", "TCP congestion control", "Network"),
+    _record("n2", "Routing with link state", "Network"),
+    _record("d1", "Clustering with k-means", "DataMining"),
+    _record("d2", "TCP in data pipelines", "DataMining"),
+]
+
+
+def test_query_filters_by_subject(tmp_path) -> None:
+    index = MmapVectorIndex(str(tmp_path))
+    index.upsert(RECORDS)
+
+    matches = index.query(KeywordEmbeddings().embed_query("tcp"), top_k=2, filter={"subject": "Network"})["matches"]
+
+    assert [match["id"] for match in matches] == ["n1", "n2"]
+
+
+def test_rows_persist_across_reloads(tmp_path) -> None:
+    MmapVectorIndex(str(tmp_path)).upsert(RECORDS)
+
+    index = MmapVectorIndex(str(tmp_path))
+
+    assert index.rows == 4
+    assert index.fetch(["d1"])["d1"]["metadata"]["text"] == "Clustering with k-means"
+
+
+def test_uncommitted_rows_are_dropped_on_load(tmp_path) -> None:
+    index = MmapVectorIndex(str(tmp_path))
+    index.upsert(RECORDS[:2])
+    # An append that crashed before writing the manifest
+    with open(index.vectors_path, "ab") as f:
+        f.write(b"\0" * 12)
+    with open(index.chunks_path, "a") as f:
+        f.write('{"id": "partial", "metadata": {}}\n')
+
+    reloaded = MmapVectorIndex(str(tmp_path))
+    reloaded.upsert(RECORDS[2:])
+
+    assert reloaded.ids() == ["n1", "n2", "d1", "d2"]
+    assert MmapVectorIndex(str(tmp_path)).rows == 4
+
+
+def test_async_search_matches_sync_search(tmp_path) -> None:
+    index = PartitionedVectorIndex(str(tmp_path))
+    index.upsert(RECORDS, namespace="Network")
+    store = LocalVectorStore(index=index, embedding=KeywordEmbeddings())
+
+    sync = store.similarity_search_with_score("clustering", k=2, namespace="Network")
+    result = asyncio.run(store.asimilarity_search_with_score("clustering", k=2, namespace="Network"))
+
+    assert [doc.page_content for doc, _ in result] == [doc.page_content for doc, _ in sync]
+    assert result[0][0].page_content == "Clustering with k-means"
+    assert "text" not in result[0][0].metadata
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import api.ingestion as ingestion_api
+import namespaces
+from local_vectorstore import FetchResult, PartitionedVectorIndex
+from namespaces import iter_subject_vectors, migrate_to_namespaces, subject_scope
+
+
+def _vectors(subject, count, start=0):
+    return [
+        {"id": f"{subject}-{i}", "values": [1.0, float(i)], "metadata": {"subject": subject, "text": f"chunk {i}"}}
+        for i in range(start, start + count)
+    ]
+
+
+class StaleQueryIndex:
+    """
+    Pinecone-like index whose query keeps returning deleted vectors (deletes
+    are eventually consistent) and never more than `query_cap` of them
+    """
+
+    def __init__(self, vectors, query_cap):
+        self.namespaces = {"": {vector["id"]: vector for vector in vectors}}
+        self.query_cap = query_cap
+        self.default = list(vectors)
+
+    def describe_index_stats(self):
+        return {"namespaces": {name: {"vector_count": len(v)} for name, v in self.namespaces.items() if v}}
+
+    def list(self, namespace="", limit=100):
+        ids = list(self.namespaces.get(namespace, {}))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def fetch(self, ids, namespace=""):
+        stored = self.namespaces.get(namespace, {})
+        return FetchResult(vectors={i: stored[i] for i in ids if i in stored})
+
+    def query(self, vector, top_k, filter, namespace, **kwargs):
+        matches = [v for v in self.default if v["metadata"]["subject"] == filter["subject"]]
+        return {"matches": matches[:min(top_k, self.query_cap)]}
+
+    def upsert(self, vectors, namespace):
+        self.namespaces.setdefault(namespace, {}).update({v["id"]: v for v in vectors})
+
+    def delete(self, ids, namespace):
+        for vector_id in ids:
+            self.namespaces[namespace].pop(vector_id, None)
+
+
+@pytest.fixture
+def namespaces_enabled(monkeypatch):
+    monkeypatch.setattr(namespaces, "SUBJECT_NAMESPACES_ENABLED", True)
+
+
+def test_subject_scope_falls_back_to_filter_before_migration(namespaces_enabled) -> None:
+    assert subject_scope("Network", {"Network"}) == {"namespace": "Network"}
+    assert subject_scope("Network", set()) == {"filter": {"subject": "Network"}}
+    assert subject_scope(None) == {}
+
+
+def test_iter_subject_vectors_pages_every_vector(tmp_path, namespaces_enabled) -> None:
+    index = PartitionedVectorIndex(str(tmp_path))
+    index.upsert(_vectors("Network", 250) + _vectors("Energy", 30))
+
+    unmigrated = [vector["id"] for batch in iter_subject_vectors(index, "Network", 100) for vector in batch]
+    index.split_default_namespace(["Network", "Energy"])
+    migrated = [vector["id"] for batch in iter_subject_vectors(index, "Network", 100) for vector in batch]
+
+    assert sorted(unmigrated) == sorted(migrated) == sorted(v["id"] for v in _vectors("Network", 250))
+
+
+def test_local_migration_moves_everything(tmp_path) -> None:
+    index = PartitionedVectorIndex(str(tmp_path))
+    index.upsert(_vectors("Network", 5) + _vectors("Energy", 3))
+
+    results = migrate_to_namespaces(index, ["Network", "Energy"], dimension=2)
+
+    assert results == {"Network": {"moved": 5, "shortfall": 0}, "Energy": {"moved": 3, "shortfall": 0}}
+    assert namespaces.list_namespaces(index) == {"Network": 5, "Energy": 3}
+
+
+def test_migration_reports_shortfall(monkeypatch) -> None:
+    monkeypatch.setattr(namespaces.time, "sleep", lambda seconds: None)
+    index = StaleQueryIndex(_vectors("Network", 3), query_cap=2)
+
+    results = migrate_to_namespaces(index, ["Network"], dimension=2, batch_size=2)
+
+    assert results == {"Network": {"moved": 2, "shortfall": 1}}
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(name)
+
+
+@pytest.fixture
+def local_index(tmp_path, monkeypatch, namespaces_enabled):
+    index = PartitionedVectorIndex(str(tmp_path))
+    monkeypatch.setattr(ingestion_api, "index", index)
+    for name in ("retriever_pool", "lexical_index", "subject_centroids", "retrieval_cache", "semantic_cache"):
+        monkeypatch.setattr(ingestion_api, name, Recorder())
+    return index
+
+
+def test_delete_subject_drops_its_namespace(local_index) -> None:
+    local_index.upsert(_vectors("Network", 4), namespace="Network")
+    local_index.upsert(_vectors("Energy", 2), namespace="Energy")
+
+    asyncio.run(ingestion_api.delete_subject("Network"))
+
+    assert namespaces.list_namespaces(local_index) == {"Energy": 2}
+    assert ingestion_api.lexical_index.calls == ["remove"]
+
+
+def test_delete_unmigrated_subject_conflicts(local_index) -> None:
+    local_index.upsert(_vectors("Network", 4))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ingestion_api.delete_subject("Network"))
+
+    assert error.value.status_code == 409
+    assert namespaces.list_namespaces(local_index) == {"": 4}
+    assert ingestion_api.lexical_index.calls == []
+
+
+def test_delete_unknown_subject_not_found(local_index) -> None:
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ingestion_api.delete_subject("Network"))
+
+    assert error.value.status_code == 404
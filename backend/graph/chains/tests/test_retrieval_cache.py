@@ -0,0 +1,128 @@
+import pytest
+from langchain_core.documents import Document
+
+import api.ingestion as ingestion_api
+import retrieval
+from retrieval import RetrievalCache
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_bumping_a_subject_invalidates_only_its_entries() -> None:
+    cache = RetrievalCache()
+    documents = [Document(page_content="tcp", metadata={})]
+    cache.put("What is TCP?", "Network", 4, None, documents, cache.version("Network"))
+    cache.put("clustering", "DataMining", 4, None, documents, cache.version("DataMining"))
+    cache.put("tcp", None, 4, None, documents, cache.version(None))
+
+    assert cache.get("what is  tcp?", "Network", 4) is not None
+
+    cache.bump_version("Network")
+
+    assert cache.get("What is TCP?", "Network", 4) is None
+    assert cache.get("clustering", "DataMining", 4) is not None
+    # Unfiltered searches span every subject
+    assert cache.get("tcp", None, 4) is None
+
+
+def test_results_searched_before_a_bump_are_stored_stale() -> None:
+    cache = RetrievalCache()
+    version = cache.version("Network")
+    cache.bump_version("Network")
+    cache.put("tcp", "Network", 4, None, [], version)
+
+    assert cache.get("tcp", "Network", 4) is None
+
+
+def test_hits_are_copies() -> None:
+    cache = RetrievalCache()
+    cache.put("tcp", "Network", 4, None, [Document(page_content="tcp", metadata={})], 0)
+
+    cache.get("tcp", "Network", 4)[0].metadata["grade"] = "yes"
+
+    assert cache.get("tcp", "Network", 4)[0].metadata == {}
+
+
+def test_ttl_and_lru_eviction(monkeypatch) -> None:
+    clock = Clock()
+    monkeypatch.setattr(retrieval.time, "time", clock.time)
+    cache = RetrievalCache(max_entries=2, ttl_seconds=60)
+    for query in ("a", "b"):
+        cache.put(query, "Network", 4, None, [], 0)
+    cache.get("a", "Network", 4)
+    cache.put("c", "Network", 4, None, [], 0)
+
+    assert cache.get("b", "Network", 4) is None
+    assert cache.evictions == 1
+
+    clock.now += 61
+
+    assert cache.get("a", "Network", 4) is None
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args)) or 0
+
+
+class FailingEmbeddings:
+    """Embeds the first batch, then fails"""
+
+    def __init__(self):
+        self.batches = 0
+
+    def embed_documents(self, texts):
+        self.batches += 1
+        if self.batches > 1:
+            raise RuntimeError("rate limited")
+        return [[1.0, 0.0] for _ in texts]
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    recorders = {}
+    for name in ("retriever_pool", "lexical_index", "subject_centroids", "retrieval_cache", "semantic_cache"):
+        recorders[name] = Recorder()
+        monkeypatch.setattr(ingestion_api, name, recorders[name])
+    monkeypatch.setattr(ingestion_api, "splitter", type("Splitter", (), {"split_documents": lambda self, d: d})())
+    monkeypatch.setattr(ingestion_api, "upsert_documents", lambda batch, vectors, namespace=None: len(batch))
+    monkeypatch.setattr(ingestion_api, "embedding", type("Cached", (), {"embeddings": FailingEmbeddings()})())
+    return recorders
+
+
+def _documents(count):
+    return [Document(page_content=f"chunk {i}", metadata={}) for i in range(count)]
+
+
+def test_ingestion_invalidates_both_caches(ingestion) -> None:
+    ingestion_api.ingest_documents(_documents(2), "Network", batch_size=2)
+
+    assert ingestion["retrieval_cache"].calls == [("bump_version", ("Network",))]
+    assert ingestion["semantic_cache"].calls == [("invalidate", ("Network",))]
+
+
+def test_partial_ingestion_invalidates_both_caches(ingestion) -> None:
+    with pytest.raises(RuntimeError):
+        ingestion_api.ingest_documents(_documents(4), "Network", batch_size=2)
+
+    assert ingestion["retrieval_cache"].calls == [("bump_version", ("Network",))]
+    assert ingestion["semantic_cache"].calls == [("invalidate", ("Network",))]
+
+
+def test_failed_ingestion_keeps_the_caches(ingestion) -> None:
+    ingestion_api.embedding.embeddings.batches = 1
+
+    with pytest.raises(RuntimeError):
+        ingestion_api.ingest_documents(_documents(2), "Network", batch_size=2)
+
+    assert ingestion["retrieval_cache"].calls == []
+    assert ingestion["semantic_cache"].calls == []
@@ -0,0 +1,65 @@
+import numpy as np
+
+import graph.utils.semantic_cache as semantic_cache_module
+from graph.utils.semantic_cache import SemanticCache
+
+VECTORS = dict(zip("abc", np.eye(3, dtype=np.float32)))
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(semantic_cache_module.time, "time", clock.time)
+    return SemanticCache(embeddings=None, **{"threshold": 0.95, "max_entries": 2, "ttl_seconds": 60, **kwargs}), clock
+
+
+def test_lookup_matches_close_questions_of_the_same_subject(monkeypatch) -> None:
+    cache, _ = _cache(monkeypatch)
+    cache.store("Network", "What is TCP?", VECTORS["a"], "answer a", [{"source": "book"}])
+    close = VECTORS["a"] + 0.1 * VECTORS["b"]
+    close /= np.linalg.norm(close)
+
+    hit = cache.lookup("Network", close)
+
+    assert hit["generation"] == "answer a" and hit["cached_question"] == "What is TCP?"
+    assert cache.lookup("DataMining", VECTORS["a"]) is None
+    assert cache.lookup("Network", VECTORS["b"]) is None
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch) -> None:
+    cache, _ = _cache(monkeypatch)
+    cache.store("Network", "a", VECTORS["a"], "answer a", None)
+    cache.store("Network", "b", VECTORS["b"], "answer b", None)
+    cache.lookup("Network", VECTORS["a"])
+    cache.store("Network", "c", VECTORS["c"], "answer c", None)
+
+    assert cache.lookup("Network", VECTORS["b"]) is None
+    assert cache.lookup("Network", VECTORS["a"]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch) -> None:
+    cache, clock = _cache(monkeypatch)
+    cache.store("Network", "a", VECTORS["a"], "answer a", None)
+    clock.now += 61
+
+    assert cache.lookup("Network", VECTORS["a"]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_the_subject_and_unfiltered_entries(monkeypatch) -> None:
+    cache, _ = _cache(monkeypatch, max_entries=10)
+    cache.store("Network", "a", VECTORS["a"], "answer a", None)
+    cache.store(None, "b", VECTORS["b"], "answer b", None)
+    cache.store("Energy", "c", VECTORS["c"], "answer c", None)
+
+    assert cache.invalidate("Network") == 2
+    assert cache.lookup("Energy", VECTORS["c"]) is not None
+    assert cache.invalidate() == 1
@@ -0,0 +1,139 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from graph.chains.router import RouteQuery
+from graph.utils.subject_router import SubjectCentroids
+from local_vectorstore import PartitionedVectorIndex
+
+route_module = importlib.import_module("graph.nodes.route_question")
+
+DIMENSION = 8
+
+
+def _cluster(axis: int, count: int, seed: int) -> np.ndarray:
+    """
+    `count` unit-ish vectors scattered around basis vector `axis`
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(scale=0.15, size=(count, DIMENSION))
+    vectors[:, axis] += 1.0
+    return vectors
+
+
+def _axis(axis: int) -> list:
+    vector = [0.0] * DIMENSION
+    vector[axis] = 1.0
+    return vector
+
+
+@pytest.fixture
+def centroids(tmp_path) -> SubjectCentroids:
+    centroids = SubjectCentroids(str(tmp_path / "centroids.json"), z=2.0, min_chunks=20)
+    centroids.add("Network", _cluster(0, 40, seed=1))
+    centroids.add("Energy", _cluster(1, 40, seed=2))
+    return centroids
+
+
+def test_route_detects_the_closest_subject(centroids) -> None:
+    datasource, subject, similarity = centroids.route(_axis(0))
+
+    assert (datasource, subject) == ("vectorstore", "Network")
+    assert similarity > 0.9
+
+
+def test_out_of_distribution_questions_fall_back(centroids) -> None:
+    assert centroids.route(_axis(5)) is None
+    # A requested subject is only confirmed when the question is close to it
+    assert centroids.route(_axis(0), "Energy") is None
+    assert centroids.route(_axis(0), "Unknown") is None
+
+
+def test_subjects_below_min_chunks_are_not_routed(centroids) -> None:
+    centroids.add("Distributed", _cluster(2, 5, seed=3))
+
+    assert "Distributed" not in centroids.similarities(_axis(2))
+    assert centroids.route(_axis(2)) is None
+
+
+def test_batches_accumulate_like_one_add(tmp_path) -> None:
+    vectors = _cluster(0, 60, seed=4)
+    whole = SubjectCentroids(str(tmp_path / "whole.json"))
+    whole.add("Network", vectors)
+    batched = SubjectCentroids(str(tmp_path / "batched.json"))
+    for start in range(0, 60, 20):
+        batched.add("Network", vectors[start:start + 20])
+
+    assert batched.stats()["Network"]["chunks"] == 60
+    assert batched.similarities(_axis(0))["Network"] == pytest.approx(whole.similarities(_axis(0))["Network"])
+
+
+def test_save_load_and_remove(centroids) -> None:
+    centroids.save()
+    loaded = SubjectCentroids(centroids.path, z=2.0, min_chunks=20)
+
+    assert loaded.stats() == centroids.stats()
+    assert loaded.route(_axis(1))[1] == "Energy"
+
+    assert loaded.remove("Energy")
+    assert not loaded.remove("Energy")
+    loaded.save()
+
+    assert set(SubjectCentroids(centroids.path).stats()) == {"Network"}
+
+
+def test_rebuild_from_index_matches_ingestion(tmp_path, centroids) -> None:
+    index = PartitionedVectorIndex(str(tmp_path / "vectors"))
+    records = [
+        {"id": f"{subject}-{i}", "values": vector.tolist(), "metadata": {"subject": subject}}
+        for subject, vectors in (("Network", _cluster(0, 40, seed=1)), ("Energy", _cluster(1, 40, seed=2)))
+        for i, vector in enumerate(vectors)
+    ]
+    index.upsert(records)
+
+    rebuilt = SubjectCentroids(str(tmp_path / "rebuilt.json"), z=2.0, min_chunks=20)
+    rebuilt.add("Network", _cluster(3, 40, seed=5))  # stale centroid to be replaced
+    rebuilt.rebuild_from_index(index, ["Network", "Energy"])
+
+    assert rebuilt.stats()["Network"]["chunks"] == 40
+    for axis in (0, 1):
+        expected = centroids.similarities(_axis(axis))
+        assert rebuilt.similarities(_axis(axis)) == pytest.approx(expected, abs=1e-5)
+
+
+class FakeEmbedding:
+    def embed_query(self, text):
+        return _axis(0) if "tcp" in text.lower() else _axis(5)
+
+
+class FakeRouter:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, inputs):
+        self.calls += 1
+        return RouteQuery(datasource="websearch")
+
+
+@pytest.fixture
+def router(monkeypatch, centroids) -> FakeRouter:
+    fake = FakeRouter()
+    monkeypatch.setattr(route_module, "subject_centroids", centroids)
+    monkeypatch.setattr(route_module, "embedding", FakeEmbedding())
+    monkeypatch.setattr(route_module, "question_router", fake)
+    return fake
+
+
+def test_route_question_routes_locally_when_in_distribution(router) -> None:
+    result = route_module.route_question({"question": "How does TCP retransmit?", "subject": None})
+
+    assert result == {"route": "vectorstore", "subject": "Network", "routed_by": "centroid"}
+    assert router.calls == 0
+
+
+def test_route_question_asks_the_llm_when_out_of_distribution(router) -> None:
+    result = route_module.route_question({"question": "Who won the match?", "subject": "Network"})
+
+    assert result == {"route": "websearch", "subject": "Network", "routed_by": "llm"}
+    assert router.calls == 1
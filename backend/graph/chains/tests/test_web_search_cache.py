@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import graph.utils.web_search_cache as web_search_cache_module
+from graph.utils.web_search_cache import WebSearchCache
+
+
+class SlowTool:
+    """Tavily stand-in that counts calls and holds them until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def _response(self, query):
+        self.calls += 1
+        return {"results": [{"url": f"https://example.com/{self.calls}", "content": query}]}
+
+    def invoke(self, inputs):
+        self.release.wait(timeout=10)
+        return self._response(inputs["query"])
+
+    async def ainvoke(self, inputs):
+        await asyncio.to_thread(self.release.wait, 10)
+        return self._response(inputs["query"])
+
+
+def test_sync_and_async_misses_share_one_search(tmp_path) -> None:
+    cache = WebSearchCache(str(tmp_path / "web.sqlite3"))
+    tool = SlowTool()
+
+    async def run():
+        first = asyncio.create_task(cache.asearch(tool, "What is TCP?"))
+        second = asyncio.create_task(cache.asearch(tool, "what is tcp?"))
+        while not cache._inflight:
+            await asyncio.sleep(0.01)
+        sync_result = []
+        thread = threading.Thread(target=lambda: sync_result.append(cache.search(tool, "What is TCP?")))
+        thread.start()
+        while cache.coalesced < 2:
+            await asyncio.sleep(0.01)
+        tool.release.set()
+        results = await asyncio.gather(first, second)
+        await asyncio.to_thread(thread.join)
+        return results + sync_result
+
+    results = asyncio.run(run())
+
+    assert tool.calls == 1
+    assert cache.coalesced == 2
+    assert results[0] == results[1] == results[2]
+    assert cache.search(tool, "what is TCP?") == results[0]
+    assert tool.calls == 1
+
+
+def test_stale_results_are_served_while_refreshing(tmp_path, monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(web_search_cache_module.time, "time", lambda: now[0])
+    cache = WebSearchCache(str(tmp_path / "web.sqlite3"), ttl_seconds=60, stale_seconds=600)
+    tool = SlowTool()
+    tool.release.set()
+    first = cache.search(tool, "routing")
+    now[0] += 120
+
+    async def run():
+        stale = await cache.asearch(tool, "routing")
+        assert cache._tasks
+        await asyncio.gather(*cache._tasks)
+        return stale
+
+    stale = asyncio.run(run())
+
+    assert stale == first
+    assert cache.stale_hits == 1 and cache.refreshes == 1
+    assert tool.calls == 2
+    assert not cache._tasks
+    refreshed = cache.search(tool, "routing")
+    assert refreshed != first
+    assert cache.hits == 1
+
+
+def test_expired_results_are_searched_again(tmp_path, monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(web_search_cache_module.time, "time", lambda: now[0])
+    cache = WebSearchCache(str(tmp_path / "web.sqlite3"), ttl_seconds=60, stale_seconds=0)
+    tool = SlowTool()
+    tool.release.set()
+    cache.search(tool, "routing")
+    now[0] += 61
+
+    asyncio.run(cache.asearch(tool, "routing"))
+
+    assert tool.calls == 2
+    assert cache.misses == 2
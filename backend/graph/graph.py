@@ -1,12 +1,31 @@
 from dotenv import load_dotenv
 from langgraph.graph import END, StateGraph
 
-from graph.chains.answer_grader import answer_grader
-from graph.chains.hallucination_grader import hallucination_grader
-from graph.chains.router import RouteQuery, question_router
-from graph.consts import GENERATE, GRADE_DOCUMENTS, RETRIEVE, WEBSEARCH
-from graph.nodes import generate, grade_documents, retrieve, web_search
+from graph.consts import (
+    GENERATE,
+    GRADE_DOCUMENTS,
+    GRADE_GENERATION,
+    RETRIEVE,
+    ROUTE_QUESTION,
+    WEBSEARCH,
+)
+from graph.nodes import (
+    agenerate,
+    agrade_documents,
+    agrade_generation,
+    aretrieve,
+    aroute_question,
+    aweb_search,
+    generate,
+    grade_documents,
+    grade_generation,
+    retrieve,
+    route_question,
+    web_search,
+)
 from graph.state import GraphState
+from graph.utils.budget import can_regenerate, can_web_search
+from metrics import record_route, traced_node
 
 load_dotenv()
 
@@ -14,7 +33,7 @@ load_dotenv()
 def decide_to_generate(state):
     print("---ASSESS GRADED DOCUMENTS---")
 
-    if state["web_search"]:
+    if state["web_search"] and can_web_search(state):
         print(
             "---DECISION: NOT ALL DOCUMENTS ARE RELEVANT TO QUESTION, INCLUDE WEB SEARCH---"
         )
@@ -24,58 +43,39 @@ def decide_to_generate(state):
         return GENERATE
 
 
-def grade_generation_grounded_in_documents_and_question(state: GraphState) -> str:
-    print("---CHECK HALLUCINATIONS---")
-    question = state["question"]
-    documents = state["documents"]
-    generation = state["generation"]
-
-    score = hallucination_grader.invoke(
-        {"documents": documents, "generation": generation}
-    )
-
-    if hallucination_grade := score.binary_score:
-        print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
-        print("---GRADE GENERATION vs QUESTION---")
-        score = answer_grader.invoke({"question": question, "generation": generation})
-        if answer_grade := score.binary_score:
-            print("---DECISION: GENERATION ADDRESSES QUESTION---")
-            return "useful"
-        else:
-            print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
-            return "not useful"
-    else:
-        print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+def decide_after_generation_grade(state: GraphState) -> str:
+    grade = state["generation_grade"]
+    if grade == "not supported" and can_regenerate(state):
         return "not supported"
+    if grade == "not useful" and can_web_search(state):
+        return "not useful"
+    # Useful, ungraded, or out of budget: finish with the answer we have
+    return "useful"
 
 
-def route_question(state: GraphState) -> str:
-    print("---ROUTE QUESTION---")
-    question = state["question"]
-    subject = state.get("subject", "")
-    
-    source: RouteQuery = question_router.invoke({
-        "question": question, 
-        "subject": subject
-    })
-    
-    if source.datasource == WEBSEARCH:
-        print("---ROUTE QUESTION TO WEB SEARCH---")
+def decide_route(state: GraphState) -> str:
+    record_route(state["route"], state.get("routed_by"))
+    if state["route"] == WEBSEARCH:
         return WEBSEARCH
-    elif source.datasource == "vectorstore":
-        print("---ROUTE QUESTION TO RAG---")
-        return RETRIEVE
+    return RETRIEVE
 
 
+# Every node and edge carries a sync and an async implementation so the same
+# compiled graph serves both app.invoke and app.ainvoke. traced_node records
+# each node's latency for /metrics.
 workflow = StateGraph(GraphState)
 
-workflow.add_node(RETRIEVE, retrieve)
-workflow.add_node(GRADE_DOCUMENTS, grade_documents)
-workflow.add_node(GENERATE, generate)
-workflow.add_node(WEBSEARCH, web_search)
+workflow.add_node(ROUTE_QUESTION, traced_node("chat", ROUTE_QUESTION, route_question, aroute_question))
+workflow.add_node(RETRIEVE, traced_node("chat", RETRIEVE, retrieve, aretrieve))
+workflow.add_node(GRADE_DOCUMENTS, traced_node("chat", GRADE_DOCUMENTS, grade_documents, agrade_documents))
+workflow.add_node(GENERATE, traced_node("chat", GENERATE, generate, agenerate))
+workflow.add_node(WEBSEARCH, traced_node("chat", WEBSEARCH, web_search, aweb_search))
+workflow.add_node(GRADE_GENERATION, traced_node("chat", GRADE_GENERATION, grade_generation, agrade_generation))
 
-workflow.set_conditional_entry_point(
-    route_question,
+workflow.set_entry_point(ROUTE_QUESTION)
+workflow.add_conditional_edges(
+    ROUTE_QUESTION,
+    decide_route,
     {
         WEBSEARCH: WEBSEARCH,
         RETRIEVE: RETRIEVE,
@@ -92,9 +92,10 @@ workflow.add_conditional_edges(
     },
 )
 
+workflow.add_edge(GENERATE, GRADE_GENERATION)
 workflow.add_conditional_edges(
-    GENERATE,
-    grade_generation_grounded_in_documents_and_question,
+    GRADE_GENERATION,
+    decide_after_generation_grade,
     {
         "not supported": GENERATE,
         "useful": END,
@@ -1,34 +1,39 @@
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
+from context_packer import pack_context
 from graph.chains.conversational_generation import generation_chain
 from graph.state import GraphState
+from graph.utils.conversation_memory import format_conversation
 
 
-def generate(state: GraphState) -> Dict[str, Any]:
-    """
-    Enhanced generation node that produces conversational answers
-    """
-    print("---GENERATE (CONVERSATIONAL MODE)---")
-    
-    question = state["question"]
+def _generation_inputs(state: GraphState) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     documents = state["documents"]
     subject = state.get("subject", "this topic")
-    sources = state.get("sources", [])
-    loop_count = state.get("loop_count", 0)
-    conversation_history = state.get("conversation_history", [])
     
-    # Build context from documents
-    context = "\n\n".join([doc.page_content if hasattr(doc, 'page_content') else str(doc) for doc in documents])
+    # Build a deduplicated, token-budgeted context from the documents
+    packed = pack_context(documents, "chat")
+    context = packed.text
+    
+    # Earlier turns of the session, so follow-ups can refer back to them
+    history = format_conversation(state.get("conversation_summary"), state.get("conversation_history"))
     
-    # Generate conversational answer
     print(f"   Subject: {subject}")
     print(f"   Context length: {len(context)} chars")
+    if history:
+        print(f"   History length: {len(history)} chars")
     
-    generation = generation_chain.invoke({
+    return {
+        "history": f"{history}\n\n" if history else "",
         "context": context,
-        "question": question,
+        "question": state["question"],
         "subject": subject
-    })
+    }, packed.report()
+
+
+def _generation_result(
+    state: GraphState, generation: str, context: str, context_report: Dict[str, Any]
+) -> Dict[str, Any]:
+    documents = state["documents"]
     
     print(f"   Generated answer length: {len(generation)} chars")
     
@@ -37,11 +42,34 @@ def generate(state: GraphState) -> Dict[str, Any]:
     
     return {
         "documents": documents,
-        "question": question,
-        "subject": subject,
+        "question": state["question"],
+        "subject": state.get("subject", "this topic"),
         "generation": generation,
-        "sources": sources,
-        "loop_count": loop_count,
+        "sources": state.get("sources", []),
+        "loop_count": state.get("loop_count", 0),
+        "generation_count": state.get("generation_count", 0) + 1,
         "is_conversational": False,
-        "answer_quality_score": answer_quality_score
-    }
\ No newline at end of file
+        "answer_quality_score": answer_quality_score,
+        "context_report": context_report,
+        "generation_context": context
+    }
+
+
+def generate(state: GraphState) -> Dict[str, Any]:
+    """
+    Enhanced generation node that produces conversational answers
+    """
+    print("---GENERATE (CONVERSATIONAL MODE)---")
+    inputs, context_report = _generation_inputs(state)
+    generation = generation_chain.invoke(inputs)
+    return _generation_result(state, generation, inputs["context"], context_report)
+
+
+async def agenerate(state: GraphState) -> Dict[str, Any]:
+    """
+    Async variant of generate
+    """
+    print("---GENERATE (CONVERSATIONAL MODE)---")
+    inputs, context_report = _generation_inputs(state)
+    generation = await generation_chain.ainvoke(inputs)
+    return _generation_result(state, generation, inputs["context"], context_report)
@@ -1,35 +1,149 @@
-from typing import Any, Dict
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
-from graph.chains.retrieval_grader import retrieval_grader
+from config import GRADER_MAX_CONCURRENCY, RELEVANCE_SCORE_THRESHOLDS, RETRIEVAL_GRADER_MODE
+from graph.chains.listwise_retrieval_grader import (
+    format_documents_for_listwise_grading,
+    listwise_retrieval_grader,
+    listwise_to_pointwise,
+)
+from graph.chains.retrieval_grader import GradeDocuments, retrieval_grader
 from graph.state import GraphState
-from graph.utils.source_extractor import extract_sources_from_documents
+from graph.utils.budget import can_web_search, with_degradation
+from graph.utils.source_extractor import document_key, extract_sources_from_documents
 
 
-def grade_documents(state: GraphState) -> Dict[str, Any]:
+class GradingStats:
+    """
+    Counters for how retrieved documents were graded, so we can see how many
+    LLM grader calls the score thresholds avoid.
     """
-    Determines whether the retrieved documents are relevant to the question.
-    If any document is not relevant, we will set a flag to run web search.
 
-    Args:
-        state (dict): The current graph state
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.auto_accepted = 0
+        self.auto_rejected = 0
+        self.llm_graded = 0
+        self.llm_grader_calls = 0
+        self.grader_calls_avoided = 0
+        self.shared = 0
+
+    def record(self, documents: int, auto_accepted: int, auto_rejected: int, llm_graded: int, shared: int = 0):
+        if RETRIEVAL_GRADER_MODE == "listwise":
+            llm_calls = 1 if llm_graded else 0
+            calls_without_thresholds = 1 if documents else 0
+        else:
+            llm_calls = llm_graded
+            calls_without_thresholds = documents
+
+        with self._lock:
+            self.documents += documents
+            self.auto_accepted += auto_accepted
+            self.auto_rejected += auto_rejected
+            self.llm_graded += llm_graded
+            self.llm_grader_calls += llm_calls
+            self.grader_calls_avoided += calls_without_thresholds - llm_calls
+            self.shared += shared
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": RETRIEVAL_GRADER_MODE,
+                "documents": self.documents,
+                "auto_accepted": self.auto_accepted,
+                "auto_rejected": self.auto_rejected,
+                "llm_graded": self.llm_graded,
+                "llm_grader_calls": self.llm_grader_calls,
+                "grader_calls_avoided": self.grader_calls_avoided,
+                "shared": self.shared,
+            }
+
+
+grading_stats = GradingStats()
+
+
+def score_thresholds(subject: Optional[str]) -> Dict[str, float]:
+    return {
+        **RELEVANCE_SCORE_THRESHOLDS["default"],
+        **RELEVANCE_SCORE_THRESHOLDS.get(subject or "", {}),
+    }
+
+
+def _prefilter_by_score(state: GraphState) -> Tuple[List[Optional[GradeDocuments]], List[int], List[int]]:
+    """
+    Grade clear-cut documents from their similarity score alone, and take
+    verdicts already given for this question (state["shared_verdicts"], set
+    by the batch endpoint for chunks common to several questions).
 
     Returns:
-        state (dict): Filtered out irrelevant documents and updated web_search state
+        Verdicts aligned with state["documents"] (None where undecided), the
+        indices of the documents that still need an LLM grade and the indices
+        of the documents with a shared verdict
     """
+    thresholds = score_thresholds(state.get("subject"))
+    shared_verdicts = state.get("shared_verdicts") or {}
+    verdicts: List[Optional[GradeDocuments]] = []
+    ambiguous = []
+    shared = []
 
-    print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
-    question = state["question"]
-    documents = state["documents"]
-    subject = state.get("subject")
-    loop_count = state.get("loop_count", 0)
+    for i, d in enumerate(state["documents"]):
+        score = (d.metadata or {}).get("relevance_score")
+        if score is not None and score >= thresholds["accept"]:
+            verdicts.append(GradeDocuments(binary_score="yes"))
+        elif score is not None and score < thresholds["reject"]:
+            verdicts.append(GradeDocuments(binary_score="no"))
+        elif shared_verdicts and document_key(d) in shared_verdicts:
+            verdicts.append(GradeDocuments(binary_score=shared_verdicts[document_key(d)]))
+            shared.append(i)
+        else:
+            # Web results and mid-band chunks carry no decisive score
+            verdicts.append(None)
+            ambiguous.append(i)
+
+    decided = len(verdicts) - len(ambiguous) - len(shared)
+    if decided:
+        print(f"---GRADED {decided} DOCUMENTS BY SIMILARITY SCORE, {len(ambiguous)} LEFT FOR LLM---")
+    if shared:
+        print(f"---REUSED {len(shared)} SHARED BATCH GRADES---")
+    return verdicts, ambiguous, shared
+
+
+def _merge_verdicts(verdicts, ambiguous, shared, llm_scores) -> List[GradeDocuments]:
+    for i, score in zip(ambiguous, llm_scores):
+        verdicts[i] = score
+
+    not_by_score = set(ambiguous) | set(shared)
+    by_score = [v for i, v in enumerate(verdicts) if i not in not_by_score]
+    grading_stats.record(
+        documents=len(verdicts),
+        auto_accepted=sum(1 for v in by_score if v.binary_score == "yes"),
+        auto_rejected=sum(1 for v in by_score if v.binary_score == "no"),
+        llm_graded=len(ambiguous),
+        shared=len(shared),
+    )
+    return verdicts
+
+
+def _grader_inputs(state: GraphState, documents) -> List[Dict[str, Any]]:
+    return [
+        {"question": state["question"], "document": d.page_content}
+        for d in documents
+    ]
+
+
+def _listwise_input(state: GraphState, documents) -> Dict[str, Any]:
+    return {
+        "question": state["question"],
+        "documents": format_documents_for_listwise_grading(documents),
+    }
 
+
+def _filter_graded_documents(state: GraphState, scores) -> Dict[str, Any]:
     filtered_docs = []
     web_search = False
     
-    for d in documents:
-        score = retrieval_grader.invoke(
-            {"question": question, "document": d.page_content}
-        )
+    for d, score in zip(state["documents"], scores):
         grade = score.binary_score
         if grade.lower() == "yes":
             print("---GRADE: DOCUMENT RELEVANT---")
@@ -42,11 +156,70 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
     # Update sources to match filtered documents
     filtered_sources = extract_sources_from_documents(filtered_docs)
     
-    return {
+    result = {
         "documents": filtered_docs, 
-        "question": question, 
-        "subject": subject,
+        "question": state["question"], 
+        "subject": state.get("subject"),
         "web_search": web_search,
         "sources": filtered_sources,
-        "loop_count": loop_count
+        "loop_count": state.get("loop_count", 0)
     }
+    if web_search and not can_web_search(state):
+        result["degradations"] = with_degradation(state, "web_search_skipped")
+    return result
+
+
+def grade_documents(state: GraphState) -> Dict[str, Any]:
+    """
+    Determines whether the retrieved documents are relevant to the question.
+    If any document is not relevant, we will set a flag to run web search.
+    Documents whose similarity score is above the subject's "accept" threshold
+    or below its "reject" threshold are graded without an LLM call. In
+    "pointwise" mode the remaining documents are graded concurrently (capped by
+    GRADER_MAX_CONCURRENCY); in "listwise" mode a single call grades them all.
+    Either way the results keep the retrieval order.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): Filtered out irrelevant documents and updated web_search state
+    """
+
+    print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+    verdicts, ambiguous, shared = _prefilter_by_score(state)
+    documents = [state["documents"][i] for i in ambiguous]
+
+    if not documents:
+        llm_scores = []
+    elif RETRIEVAL_GRADER_MODE == "listwise":
+        result = listwise_retrieval_grader.invoke(_listwise_input(state, documents))
+        llm_scores = listwise_to_pointwise(result, len(documents))
+    else:
+        llm_scores = retrieval_grader.batch(
+            _grader_inputs(state, documents),
+            config={"max_concurrency": GRADER_MAX_CONCURRENCY},
+        )
+    return _filter_graded_documents(state, _merge_verdicts(verdicts, ambiguous, shared, llm_scores))
+
+
+async def agrade_documents(state: GraphState) -> Dict[str, Any]:
+    """
+    Async variant of grade_documents; grader calls run concurrently on the event loop.
+    """
+
+    print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+    verdicts, ambiguous, shared = _prefilter_by_score(state)
+    documents = [state["documents"][i] for i in ambiguous]
+
+    if not documents:
+        llm_scores = []
+    elif RETRIEVAL_GRADER_MODE == "listwise":
+        result = await listwise_retrieval_grader.ainvoke(_listwise_input(state, documents))
+        llm_scores = listwise_to_pointwise(result, len(documents))
+    else:
+        llm_scores = await retrieval_grader.abatch(
+            _grader_inputs(state, documents),
+            config={"max_concurrency": GRADER_MAX_CONCURRENCY},
+        )
+    return _filter_graded_documents(state, _merge_verdicts(verdicts, ambiguous, shared, llm_scores))
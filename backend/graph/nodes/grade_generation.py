@@ -0,0 +1,211 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from config import GENERATION_GRADER_MODE
+from graph.chains.answer_grader import answer_grader
+from graph.chains.generation_grader import generation_grader
+from graph.chains.hallucination_grader import hallucination_grader
+from graph.state import GraphState
+from graph.utils.budget import (
+    GRADE_RANK,
+    can_regenerate,
+    can_web_search,
+    deadline_passed,
+    tier_settings,
+    with_degradation,
+)
+
+
+def _decide_generation_grade(hallucination_grade: bool, answer_grade=None) -> str:
+    if hallucination_grade:
+        print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
+        if answer_grade:
+            print("---DECISION: GENERATION ADDRESSES QUESTION---")
+            return "useful"
+        else:
+            print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
+            return "not useful"
+    else:
+        print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+        return "not supported"
+
+
+def _compact_context(state: GraphState) -> str:
+    """
+    The context the generator was actually given (after packing), so
+    grounding is checked only against facts the answer could rely on. Falls
+    back to a text-only rendering of the documents; passing the Document
+    objects would also send their metadata (sources, scores) to the LLM.
+    """
+    if state.get("generation_context") is not None:
+        return state["generation_context"]
+    return "\n\n".join(
+        doc.page_content if hasattr(doc, "page_content") else str(doc)
+        for doc in state["documents"]
+    )
+
+
+def _timed(grader, inputs: Dict[str, Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    score = grader.invoke(inputs)
+    return score, round(time.perf_counter() - start, 3)
+
+
+async def _atimed(grader, inputs: Dict[str, Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    score = await grader.ainvoke(inputs)
+    return score, round(time.perf_counter() - start, 3)
+
+
+def _skip_grading(state: GraphState) -> Optional[Dict[str, Any]]:
+    """
+    Returns the node result when the tier or the deadline rules out grading
+    """
+    if not tier_settings(state)["grade_generation"]:
+        print("---SKIP GENERATION GRADING (TIER)---")
+        return _finalize_grade(state, "ungraded")
+    if deadline_passed(state):
+        print("---SKIP GENERATION GRADING (DEADLINE)---")
+        return _finalize_grade(
+            state, "ungraded", with_degradation(state, "generation_grading_skipped")
+        )
+    return None
+
+
+def _finalize_grade(
+    state: GraphState, grade: str, degradations=None, grading_latency=None
+) -> Dict[str, Any]:
+    """
+    Records the verdict, tracks the best generation so far and, when the
+    budget rules out another GENERATE/WEBSEARCH pass, falls back to it.
+    """
+    degradations = degradations if degradations is not None else list(state.get("degradations") or [])
+    generation = state["generation"]
+    best_generation = state.get("best_generation")
+    best_grade = state.get("best_generation_grade")
+
+    if best_grade is None or GRADE_RANK[grade] >= GRADE_RANK[best_grade]:
+        best_generation, best_grade = generation, grade
+
+    result = {
+        "generation_grade": grade,
+        "best_generation": best_generation,
+        "best_generation_grade": best_grade,
+        "degradations": degradations,
+        "grading_latency": grading_latency or {},
+    }
+
+    out_of_budget = (
+        (grade == "not supported" and not can_regenerate(state))
+        or (grade == "not useful" and not can_web_search(state))
+    )
+    if out_of_budget:
+        degradation = "ungrounded_answer" if grade == "not supported" else "answer_may_not_address_question"
+        degradations = with_degradation({"degradations": degradations}, degradation)
+        if best_generation != generation:
+            # An earlier pass graded better than this one; return that instead
+            degradations = with_degradation({"degradations": degradations}, "returned_earlier_answer")
+            result["generation"] = best_generation
+        result["degradations"] = degradations
+
+    return result
+
+
+def grade_generation(state: GraphState) -> Dict[str, Any]:
+    """
+    Checks the generation for hallucinations and whether it answers the question.
+    The verdict ("useful", "not useful", "not supported" or "ungraded") is written to
+    `generation_grade` so routing and streaming clients can both read it, and the
+    seconds spent per check to `grading_latency`.
+    Grading is skipped for tiers that disable it and once the deadline has passed.
+
+    GENERATION_GRADER_MODE picks how the checks run: "sequential" (answer check
+    only for grounded generations), "concurrent" (both checks at once) or
+    "combined" (one generation_grader call returning both verdicts).
+    """
+    skipped = _skip_grading(state)
+    if skipped is not None:
+        return skipped
+
+    question = state["question"]
+    generation = state["generation"]
+    grounding_inputs = {"documents": _compact_context(state), "generation": generation}
+    answer_inputs = {"question": question, "generation": generation}
+
+    if GENERATION_GRADER_MODE == "combined":
+        print("---GRADE GENERATION (COMBINED)---")
+        score, seconds = _timed(generation_grader, {**grounding_inputs, **answer_inputs})
+        grade = _decide_generation_grade(score.grounded, score.addresses_question)
+        return _finalize_grade(state, grade, grading_latency={"generation_grader": seconds})
+
+    if GENERATION_GRADER_MODE == "concurrent":
+        print("---CHECK HALLUCINATIONS + GRADE GENERATION vs QUESTION (CONCURRENT)---")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            grounding = pool.submit(_timed, hallucination_grader, grounding_inputs)
+            answer = pool.submit(_timed, answer_grader, answer_inputs)
+            (grounding_score, grounding_seconds), (answer_score, answer_seconds) = (
+                grounding.result(), answer.result()
+            )
+        grade = _decide_generation_grade(grounding_score.binary_score, answer_score.binary_score)
+        return _finalize_grade(state, grade, grading_latency={
+            "hallucination_grader": grounding_seconds,
+            "answer_grader": answer_seconds,
+        })
+
+    print("---CHECK HALLUCINATIONS---")
+    score, grounding_seconds = _timed(hallucination_grader, grounding_inputs)
+    grading_latency = {"hallucination_grader": grounding_seconds}
+
+    if not score.binary_score:
+        return _finalize_grade(state, _decide_generation_grade(False), grading_latency=grading_latency)
+
+    print("---GRADE GENERATION vs QUESTION---")
+    score, grading_latency["answer_grader"] = _timed(answer_grader, answer_inputs)
+    grade = _decide_generation_grade(True, score.binary_score)
+    return _finalize_grade(state, grade, grading_latency=grading_latency)
+
+
+async def agrade_generation(state: GraphState) -> Dict[str, Any]:
+    """
+    Async variant of grade_generation
+    """
+    skipped = _skip_grading(state)
+    if skipped is not None:
+        return skipped
+
+    question = state["question"]
+    generation = state["generation"]
+    grounding_inputs = {"documents": _compact_context(state), "generation": generation}
+    answer_inputs = {"question": question, "generation": generation}
+
+    if GENERATION_GRADER_MODE == "combined":
+        print("---GRADE GENERATION (COMBINED)---")
+        score, seconds = await _atimed(generation_grader, {**grounding_inputs, **answer_inputs})
+        grade = _decide_generation_grade(score.grounded, score.addresses_question)
+        return _finalize_grade(state, grade, grading_latency={"generation_grader": seconds})
+
+    if GENERATION_GRADER_MODE == "concurrent":
+        print("---CHECK HALLUCINATIONS + GRADE GENERATION vs QUESTION (CONCURRENT)---")
+        (grounding_score, grounding_seconds), (answer_score, answer_seconds) = await asyncio.gather(
+            _atimed(hallucination_grader, grounding_inputs),
+            _atimed(answer_grader, answer_inputs),
+        )
+        grade = _decide_generation_grade(grounding_score.binary_score, answer_score.binary_score)
+        return _finalize_grade(state, grade, grading_latency={
+            "hallucination_grader": grounding_seconds,
+            "answer_grader": answer_seconds,
+        })
+
+    print("---CHECK HALLUCINATIONS---")
+    score, grounding_seconds = await _atimed(hallucination_grader, grounding_inputs)
+    grading_latency = {"hallucination_grader": grounding_seconds}
+
+    if not score.binary_score:
+        return _finalize_grade(state, _decide_generation_grade(False), grading_latency=grading_latency)
+
+    print("---GRADE GENERATION vs QUESTION---")
+    score, grading_latency["answer_grader"] = await _atimed(answer_grader, answer_inputs)
+    grade = _decide_generation_grade(True, score.binary_score)
+    return _finalize_grade(state, grade, grading_latency=grading_latency)
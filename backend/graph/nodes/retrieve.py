@@ -1,24 +1,19 @@
 from typing import Any, Dict
 
+from config import MMR_FETCH_K, RETRIEVAL_K
 from graph.state import GraphState
-from ingestion import get_retriever
+from retrieval import asimilarity_search_with_scores, similarity_search_with_scores
 from graph.utils.source_extractor import extract_sources_from_documents
 
 
-def retrieve(state: GraphState) -> Dict[str, Any]:
-    print("---RETRIEVE---")
-    question = state["question"]
-    subject = state.get("subject")
-    loop_count = state.get("loop_count", 0)
-    
+def _log_subject_filter(subject):
     if subject:
         print(f"---FILTERING BY SUBJECT: {subject}---")
-        retriever = get_retriever(subject=subject)
     else:
         print("---NO SUBJECT FILTER---")
-        retriever = get_retriever()
-    
-    documents = retriever.invoke(question)
+
+
+def _retrieve_result(state: GraphState, documents) -> Dict[str, Any]:
     print(f"---RETRIEVED {len(documents)} DOCUMENTS---")
     
     # Extract source information
@@ -26,9 +21,32 @@ def retrieve(state: GraphState) -> Dict[str, Any]:
     
     return {
         "documents": documents, 
-        "question": question, 
-        "subject": subject,
+        "question": state["question"], 
+        "subject": state.get("subject"),
         "sources": sources,
-        "loop_count": loop_count,
+        "loop_count": state.get("loop_count", 0),
         "is_conversational": False
-    }
\ No newline at end of file
+    }
+
+
+def retrieve(state: GraphState) -> Dict[str, Any]:
+    """
+    Retrieves documents with their similarity scores (doc.metadata["relevance_score"])
+    so grade_documents can skip LLM grading for clear-cut chunks. Up to
+    RETRIEVAL_K diverse chunks are kept out of MMR_FETCH_K candidates.
+    """
+    print("---RETRIEVE---")
+    subject = state.get("subject")
+    _log_subject_filter(subject)
+    documents = similarity_search_with_scores(state["question"], subject=subject, k=RETRIEVAL_K, fetch_k=MMR_FETCH_K)
+    return _retrieve_result(state, documents)
+
+
+async def aretrieve(state: GraphState) -> Dict[str, Any]:
+    print("---RETRIEVE---")
+    subject = state.get("subject")
+    _log_subject_filter(subject)
+    documents = await asimilarity_search_with_scores(
+        state["question"], subject=subject, k=RETRIEVAL_K, fetch_k=MMR_FETCH_K
+    )
+    return _retrieve_result(state, documents)
@@ -0,0 +1,65 @@
+from typing import Any, Dict, Optional
+
+from graph.chains.router import RouteQuery, question_router
+from graph.state import GraphState
+from graph.utils.subject_router import subject_centroids
+from retrieval import embedding
+
+
+def _centroid_route(state: GraphState, question_vector) -> Optional[Dict[str, Any]]:
+    decision = subject_centroids.route(question_vector, state.get("subject"))
+    if decision is None:
+        print("---OUT OF DISTRIBUTION, FALLING BACK TO LLM ROUTER---")
+        return None
+
+    datasource, subject, similarity = decision
+    if not state.get("subject"):
+        print(f"---DETECTED SUBJECT: {subject} ({similarity:.3f})---")
+    print("---ROUTE QUESTION TO RAG---")
+    return {"route": datasource, "subject": subject, "routed_by": "centroid"}
+
+
+def _llm_route(state: GraphState, source: RouteQuery) -> Dict[str, Any]:
+    if source.datasource == "websearch":
+        print("---ROUTE QUESTION TO WEB SEARCH---")
+    else:
+        print("---ROUTE QUESTION TO RAG---")
+    return {"route": source.datasource, "subject": state.get("subject"), "routed_by": "llm"}
+
+
+def route_question(state: GraphState) -> Dict[str, Any]:
+    """
+    Chooses "vectorstore" or "websearch" for the question. Questions close to an
+    ingested subject's centroid are routed locally (detecting the subject when
+    none was given); only out-of-distribution questions go to the LLM router.
+    """
+    print("---ROUTE QUESTION---")
+    question = state["question"]
+
+    result = _centroid_route(state, embedding.embed_query(question))
+    if result is not None:
+        return result
+
+    source: RouteQuery = question_router.invoke({
+        "question": question, 
+        "subject": state.get("subject", "")
+    })
+    return _llm_route(state, source)
+
+
+async def aroute_question(state: GraphState) -> Dict[str, Any]:
+    """
+    Async variant of route_question
+    """
+    print("---ROUTE QUESTION---")
+    question = state["question"]
+
+    result = _centroid_route(state, await embedding.aembed_query(question))
+    if result is not None:
+        return result
+
+    source: RouteQuery = await question_router.ainvoke({
+        "question": question, 
+        "subject": state.get("subject", "")
+    })
+    return _llm_route(state, source)
@@ -1,35 +1,81 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 from dotenv import load_dotenv
 from langchain.schema import Document
 from langchain_tavily import TavilySearch
 
+from config import GRAPH_MAX_DOCUMENTS
 from graph.state import GraphState
-from graph.utils.source_extractor import extract_sources_from_documents
+from graph.utils.source_extractor import document_key, extract_sources_from_documents
+from graph.utils.web_search_cache import web_search_cache
 
 load_dotenv()
 web_search_tool = TavilySearch(max_results=3)
 
 
-def web_search(state: GraphState) -> Dict[str, Any]:
-    print("---WEB SEARCH---")
+def _search_query(state: GraphState) -> str:
     question = state["question"]
     subject = state.get("subject")
-    documents = state.get("documents", [])
-    sources = state.get("sources", [])
-    loop_count = state.get("loop_count", 0)
-    
-    # Increment loop counter
-    loop_count += 1
-    print(f"---WEB SEARCH ATTEMPT {loop_count}---")
     
     # Enhance search query with subject context if available
     search_query = question
     if subject:
         search_query = f"{question} {subject}"
         print(f"---ENHANCED SEARCH QUERY: {search_query}---")
-    
-    tavily_results = web_search_tool.invoke({"query": search_query})["results"]
+    return search_query
+
+
+def _already_searched(state: GraphState, search_query: str) -> bool:
+    searched = state.get("searched_queries") or []
+    return web_search_cache.normalize(search_query) in searched
+
+
+def _accumulate(
+    documents: List[Document], sources: List[dict], web_docs: List[Document]
+) -> Tuple[List[Document], List[dict]]:
+    """
+    Appends the web results that aren't already in `documents` (by URL or
+    content hash) and keeps the total within GRAPH_MAX_DOCUMENTS, evicting
+    web results from earlier loops first. `sources` stays aligned with
+    `documents`; only the new documents get sources extracted.
+    """
+    seen = {document_key(doc) for doc in documents}
+    new_docs = []
+    for doc in web_docs:
+        key = document_key(doc)
+        if key not in seen:
+            seen.add(key)
+            new_docs.append(doc)
+    if len(new_docs) < len(web_docs):
+        print(f"---WEB SEARCH: SKIPPED {len(web_docs) - len(new_docs)} DUPLICATE RESULTS---")
+
+    all_documents = documents + new_docs
+    all_sources = sources + extract_sources_from_documents(new_docs, start_id=len(sources))
+
+    overflow = len(all_documents) - GRAPH_MAX_DOCUMENTS
+    if overflow <= 0:
+        return all_documents, all_sources
+
+    earlier_web = [
+        i for i, doc in enumerate(documents)
+        if (doc.metadata or {}).get("subject") == "Web Search"
+    ]
+    evicted = set(earlier_web[:overflow])
+    kept = [i for i in range(len(all_documents)) if i not in evicted][:GRAPH_MAX_DOCUMENTS]
+    print(f"---WEB SEARCH: DOCUMENT CAP {GRAPH_MAX_DOCUMENTS}, DROPPED {len(all_documents) - len(kept)}---")
+    return (
+        [all_documents[i] for i in kept],
+        [{**all_sources[i], "document_id": n + 1} for n, i in enumerate(kept)],
+    )
+
+
+def _web_search_result(
+    state: GraphState, search_query: str, tavily_results: List[dict], loop_count: int
+) -> Dict[str, Any]:
+    documents = list(state.get("documents") or [])
+    sources = list(state.get("sources") or [])
+    if len(sources) != len(documents):
+        sources = extract_sources_from_documents(documents)
     
     # Create web search documents with proper metadata
     web_docs = []
@@ -46,17 +92,52 @@ def web_search(state: GraphState) -> Dict[str, Any]:
         )
         web_docs.append(web_doc)
     
-    # Combine with existing documents
-    all_documents = documents + web_docs
+    # Combine with existing documents, without duplicates and within the cap
+    all_documents, updated_sources = _accumulate(documents, sources, web_docs)
     
-    # Update sources to include web search results
-    updated_sources = extract_sources_from_documents(all_documents)
+    searched_queries = list(state.get("searched_queries") or [])
+    normalized_query = web_search_cache.normalize(search_query)
+    if normalized_query not in searched_queries:
+        searched_queries.append(normalized_query)
     
     return {
         "documents": all_documents, 
-        "question": question, 
-        "subject": subject,
+        "question": state["question"], 
+        "subject": state.get("subject"),
         "sources": updated_sources,
         "loop_count": loop_count,
-        "is_conversational": False
-    }
\ No newline at end of file
+        "is_conversational": False,
+        "searched_queries": searched_queries
+    }
+
+
+def web_search(state: GraphState) -> Dict[str, Any]:
+    print("---WEB SEARCH---")
+    
+    # Increment loop counter
+    loop_count = state.get("loop_count", 0) + 1
+    print(f"---WEB SEARCH ATTEMPT {loop_count}---")
+    
+    search_query = _search_query(state)
+    if _already_searched(state, search_query):
+        # Same query earlier in this request: its results are already in documents
+        print("---WEB SEARCH: QUERY ALREADY SEARCHED, REUSING RESULTS---")
+        return _web_search_result(state, search_query, [], loop_count)
+    tavily_results = web_search_cache.search(web_search_tool, search_query)
+    return _web_search_result(state, search_query, tavily_results, loop_count)
+
+
+async def aweb_search(state: GraphState) -> Dict[str, Any]:
+    print("---WEB SEARCH---")
+    
+    # Increment loop counter
+    loop_count = state.get("loop_count", 0) + 1
+    print(f"---WEB SEARCH ATTEMPT {loop_count}---")
+    
+    search_query = _search_query(state)
+    if _already_searched(state, search_query):
+        # Same query earlier in this request: its results are already in documents
+        print("---WEB SEARCH: QUERY ALREADY SEARCHED, REUSING RESULTS---")
+        return _web_search_result(state, search_query, [], loop_count)
+    tavily_results = await web_search_cache.asearch(web_search_tool, search_query)
+    return _web_search_result(state, search_query, tavily_results, loop_count)
@@ -1,4 +1,4 @@
-from typing import List, TypedDict, Optional
+from typing import Dict, List, TypedDict, Optional
 
 
 class GraphState(TypedDict):
@@ -7,24 +7,54 @@ class GraphState(TypedDict):
 
     Attributes:
         question: Current user question
-        subject: Subject filter for retrieval (DataMining, Network, etc.)
+        subject: Subject filter for retrieval (DataMining, Network, etc.); detected by the router when missing
+        route: Datasource chosen by the router ("vectorstore" or "websearch")
+        routed_by: Which router decided ("centroid" or "llm")
         generation: LLM generated answer
+        generation_grade: Verdict of the generation grader ("useful", "not useful", "not supported")
         web_search: Whether to add web search
         documents: List of retrieved documents
         sources: Source information from document metadata
         loop_count: Counter to prevent infinite loops
         is_conversational: Flag for simple conversational queries (greetings, etc.)
-        conversation_history: Previous Q&A pairs for context (optional)
+        conversation_history: Most recent session messages, verbatim (optional)
+        conversation_summary: Running summary of older session messages (optional)
         answer_quality_score: Internal quality assessment of the answer
+        tier: Quality tier ("fast", "balanced", "strict") controlling grading and retry limits
+        deadline: Epoch time after which the graph stops retrying and returns its best answer
+        generation_count: Number of GENERATE runs so far
+        degradations: Shortcuts taken because a budget or retry limit was reached
+        best_generation: Highest graded generation seen so far
+        best_generation_grade: Grade of best_generation
+        grading_latency: Seconds spent per generation check in the last grading pass
+        searched_queries: Web search queries already run for this request
+        context_report: Token accounting of the last packed generation context
+        generation_context: Packed context text the last generation was given (what grounding is graded against)
+        shared_verdicts: Relevance verdicts by document key, graded once for a whole batch of questions
     """
 
     question: str
     subject: Optional[str]
+    route: Optional[str]
+    routed_by: Optional[str]
     generation: str
+    generation_grade: Optional[str]
     web_search: bool
     documents: List[str]
     sources: Optional[List[dict]]
     loop_count: int
     is_conversational: bool
     conversation_history: Optional[List[dict]]
-    answer_quality_score: Optional[str]  # "excellent", "good", "needs_improvement"
\ No newline at end of file
+    conversation_summary: Optional[str]
+    answer_quality_score: Optional[str]  # "excellent", "good", "needs_improvement"
+    tier: Optional[str]
+    deadline: Optional[float]
+    generation_count: int
+    degradations: Optional[List[str]]
+    best_generation: Optional[str]
+    best_generation_grade: Optional[str]
+    grading_latency: Optional[Dict[str, float]]
+    searched_queries: Optional[List[str]]
+    context_report: Optional[dict]
+    generation_context: Optional[str]
+    shared_verdicts: Optional[Dict[str, str]]
\ No newline at end of file
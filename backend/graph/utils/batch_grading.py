@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from config import GRADER_MAX_CONCURRENCY
+from graph.chains.shared_retrieval_grader import format_questions_for_shared_grading, shared_retrieval_grader
+from graph.nodes.grade_documents import score_thresholds
+from graph.utils.source_extractor import document_key
+
+
+def _needs_llm_grade(doc: Document, thresholds: Dict[str, float]) -> bool:
+    # Chunks outside the score band are graded by score in grade_documents anyway
+    score = (doc.metadata or {}).get("relevance_score")
+    return score is None or thresholds["reject"] <= score < thresholds["accept"]
+
+
+async def ashare_retrieval_grades(
+    questions: List[str],
+    documents: List[List[Document]],
+    subject: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """
+    Grade chunks retrieved for several questions of a batch with one
+    shared_retrieval_grader call per chunk instead of one call per
+    (question, chunk) pair.
+
+    Args:
+        questions: The batch's questions
+        documents: Retrieved documents for each question, in the same order
+        subject: Subject whose score thresholds apply
+
+    Returns:
+        For each question, {document_key: "yes" | "no"} to pass to the graph
+        as shared_verdicts. Chunks retrieved by a single question (or whose
+        shared grading failed) are left to grade_documents.
+    """
+    thresholds = score_thresholds(subject)
+    holders: Dict[str, List[int]] = {}
+    chunks: Dict[str, Document] = {}
+    for i, question_documents in enumerate(documents):
+        for doc in question_documents:
+            if not _needs_llm_grade(doc, thresholds):
+                continue
+            key = document_key(doc)
+            chunks.setdefault(key, doc)
+            if i not in holders.setdefault(key, []):
+                holders[key].append(i)
+
+    verdicts: List[Dict[str, str]] = [{} for _ in questions]
+    shared = [key for key, holder in holders.items() if len(holder) > 1]
+    if not shared:
+        return verdicts
+
+    print(f"---GRADING {len(shared)} CHUNKS SHARED BY SEVERAL QUESTIONS---")
+    results = await shared_retrieval_grader.abatch(
+        [
+            {
+                "document": chunks[key].page_content,
+                "questions": format_questions_for_shared_grading([questions[i] for i in holders[key]]),
+            }
+            for key in shared
+        ],
+        config={"max_concurrency": GRADER_MAX_CONCURRENCY},
+        return_exceptions=True,
+    )
+    for key, result in zip(shared, results):
+        if isinstance(result, Exception):
+            print(f"---SHARED GRADE FAILED, LEFT TO PER-QUESTION GRADING: {result}---")
+            continue
+        relevant = set(result.relevant_questions)
+        for number, i in enumerate(holders[key], start=1):
+            verdicts[i][key] = "yes" if number in relevant else "no"
+    return verdicts
@@ -0,0 +1,72 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from config import DEFAULT_QUALITY_TIER, QUALITY_TIERS
+from graph.state import GraphState
+
+# How good a graded generation is, used to pick the best answer so far
+GRADE_RANK = {"useful": 3, "ungraded": 2, "not useful": 1, "not supported": 0}
+
+
+def init_budget(tier: Optional[str] = None, time_budget_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Initial budget fields for a graph run.
+
+    Args:
+        tier: Quality tier name ("fast", "balanced", "strict"); defaults to DEFAULT_QUALITY_TIER
+        time_budget_seconds: Overrides the tier's time budget
+
+    Returns:
+        State fields to merge into the graph input
+    """
+    tier = tier or DEFAULT_QUALITY_TIER
+    if tier not in QUALITY_TIERS:
+        raise ValueError(f"Unknown quality tier '{tier}'. Must be one of: {list(QUALITY_TIERS)}")
+
+    budget = time_budget_seconds or QUALITY_TIERS[tier]["time_budget_seconds"]
+    return {
+        "tier": tier,
+        "deadline": time.time() + budget,
+        "generation_count": 0,
+        "degradations": [],
+    }
+
+
+def tier_settings(state: GraphState) -> Dict[str, Any]:
+    return QUALITY_TIERS[state.get("tier") or DEFAULT_QUALITY_TIER]
+
+
+def time_left(state: GraphState) -> float:
+    deadline = state.get("deadline")
+    if deadline is None:
+        return float("inf")
+    return deadline - time.time()
+
+
+def deadline_passed(state: GraphState) -> bool:
+    return time_left(state) <= 0
+
+
+def can_regenerate(state: GraphState) -> bool:
+    return (
+        state.get("generation_count", 0) < tier_settings(state)["max_generations"]
+        and not deadline_passed(state)
+    )
+
+
+def can_web_search(state: GraphState) -> bool:
+    return (
+        state.get("loop_count", 0) < tier_settings(state)["max_web_searches"]
+        and not deadline_passed(state)
+    )
+
+
+def with_degradation(state: GraphState, degradation: str) -> List[str]:
+    """
+    Return the state's degradations with `degradation` appended (once)
+    """
+    degradations = list(state.get("degradations") or [])
+    if degradation not in degradations:
+        print(f"---DEGRADED: {degradation}---")
+        degradations.append(degradation)
+    return degradations
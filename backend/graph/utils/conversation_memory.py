@@ -0,0 +1,113 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from config import MEMORY_MESSAGE_MAX_TOKENS, MEMORY_RECENT_MESSAGES, MEMORY_SUMMARY_MAX_TOKENS
+from context_packer import get_encoding
+from graph.chains.conversation_summarizer import conversation_summarizer
+
+logger = logging.getLogger(__name__)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    tokens = encoding.encode(text or "")
+    if len(tokens) <= max_tokens:
+        return text or ""
+    return encoding.decode(tokens[:max_tokens]) + " ..."
+
+
+def _line(message: Dict[str, Any]) -> str:
+    speaker = "Student" if message["role"] == "user" else "Tutor"
+    return f"{speaker}: {message['content']}"
+
+
+def _window_start(session) -> int:
+    """
+    Index of the first message kept verbatim; everything before it belongs in
+    the summary
+    """
+    return max(len(session.messages) - MEMORY_RECENT_MESSAGES, 0)
+
+
+def conversation_history(session) -> List[Dict[str, str]]:
+    """
+    The session's most recent messages as [{"role", "content"}], each cut to
+    MEMORY_MESSAGE_MAX_TOKENS
+    """
+    return [
+        {"role": message["role"], "content": _truncate(message["content"], MEMORY_MESSAGE_MAX_TOKENS)}
+        for message in session.messages[_window_start(session):]
+    ]
+
+
+def conversation_memory(session) -> Dict[str, Any]:
+    """
+    Graph input fields carrying the session's memory: the running summary of
+    older turns plus the recent turns verbatim
+    """
+    return {
+        "conversation_summary": session.summary,
+        "conversation_history": conversation_history(session),
+    }
+
+
+def format_conversation(summary: Optional[str], history: Optional[List[Dict[str, str]]]) -> str:
+    """
+    Render the memory for a prompt; empty when the conversation just started
+    """
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    if history:
+        turns = "\n".join(_line(message) for message in history)
+        parts.append(f"Recent messages:\n{turns}")
+    return "\n\n".join(parts)
+
+
+def contextualize_question(question: str, history: Optional[List[Dict[str, str]]]) -> str:
+    """
+    Anchor a follow-up ("tell me more", "what about ...") to the previous
+    question, so retrieval and grading see what it refers to
+    """
+    previous = next(
+        (message["content"] for message in reversed(history or []) if message["role"] == "user"),
+        None,
+    )
+    if not previous:
+        return question
+    return f"{question} (follow-up to: {_truncate(previous, 100)})"
+
+
+async def aupdate_summary(session) -> bool:
+    """
+    Fold messages that have left the verbatim window into session.summary.
+
+    Only messages not yet summarized are sent, together with the previous
+    summary, so each turn costs one bounded summarizer call at most.
+    session.summarized_messages records how far the summary reaches.
+    Returns True when the summary changed.
+    """
+    async with session._summary_lock:
+        end = _window_start(session)
+        if end <= session.summarized_messages:
+            return False
+
+        pending = session.messages[session.summarized_messages:end]
+        messages = "\n".join(
+            _line({"role": message["role"], "content": _truncate(message["content"], MEMORY_MESSAGE_MAX_TOKENS)})
+            for message in pending
+        )
+        logger.info(f"Summarizing {len(pending)} messages of session {session.session_id}")
+        try:
+            summary = await conversation_summarizer.ainvoke({
+                "summary": session.summary or "(none yet)",
+                "messages": messages,
+            })
+        except Exception as e:
+            # Keep the old summary; the same messages are retried next turn
+            logger.warning(f"Summarizing session {session.session_id} failed: {e}")
+            return False
+
+        session.summary = _truncate(summary.strip(), MEMORY_SUMMARY_MAX_TOKENS)
+        session.summarized_messages = end
+        return True
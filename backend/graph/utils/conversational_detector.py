@@ -1,8 +1,18 @@
-from typing import Dict
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from config import CONVERSATIONAL_MARGIN, CONVERSATIONAL_MEMO_SIZE, CONVERSATIONAL_MIN_SIMILARITY
+from graph.utils.subject_router import subject_centroids
+from metrics import chain_tag
+from retrieval import embedding
+
 
 class QueryType(BaseModel):
     """Query classification"""
@@ -18,7 +28,7 @@ class QueryType(BaseModel):
     )
 
 
-llm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
+llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", tags=[chain_tag("query_classifier")])
 structured_llm = llm.with_structured_output(QueryType)
 
 # Simplified system prompt
@@ -49,24 +59,276 @@ query_classifier_prompt = ChatPromptTemplate.from_messages([
 query_classifier = query_classifier_prompt | structured_llm
 
 
-def detect_conversational_query(query: str, subject: str = "general") -> Dict:
+# Tier 1: rules on normalized text
+CONVERSATIONAL_PHRASES = {
+    "hi", "hello", "hey", "hiya", "hi there", "hello there", "hey there",
+    "good morning", "good afternoon", "good evening", "good night",
+    "thanks", "thank you", "thank you so much", "thanks a lot", "thx", "ty",
+    "ok", "okay", "ok thanks", "okay thanks", "cool", "great", "nice", "awesome", "got it",
+    "how are you", "how are you doing", "how's it going", "what's up", "whats up",
+    "bye", "goodbye", "see you", "see you later",
+}
+CONVERSATIONAL_WORDS = {
+    "hi", "hello", "hey", "there", "thanks", "thank", "you", "so", "much", "a", "lot",
+    "ok", "okay", "cool", "great", "nice", "awesome", "bye", "goodbye", "good",
+    "morning", "afternoon", "evening", "night", "see", "later", "again",
+}
+SMALL_TALK_PREFIXES = ("how are you", "what's up", "whats up", "how's it going")
+
+# Tier 2: labelled examples for nearest-centroid matching
+LABELLED_EXAMPLES = {
+    "conversational": [
+        "hi there, how's your day going",
+        "hello! nice to meet you",
+        "thanks, that was really helpful",
+        "thank you so much for explaining",
+        "good morning tutor",
+        "how are you today?",
+        "you are awesome",
+        "bye, see you tomorrow",
+        "lol ok",
+        "i'm bored",
+        "what's your name?",
+        "who made you?",
+    ],
+    "question": [
+        "What is a decision tree?",
+        "Explain how TCP congestion control works",
+        "How does the Apriori algorithm generate candidate itemsets?",
+        "What is the difference between supervised and unsupervised learning?",
+        "Describe the layers of the OSI model",
+        "How do distributed systems reach consensus?",
+        "What are the main renewable energy sources?",
+        "Define entropy and information gain",
+        "Why do we normalize data before clustering?",
+        "How does public key encryption work?",
+    ],
+    "follow_up": [
+        "tell me more about that",
+        "can you give another example?",
+        "what about the second point you mentioned?",
+        "explain that again in simpler words",
+        "can you elaborate on your last answer?",
+        "how does it compare to the previous one?",
+        "go deeper into that",
+        "why is that the case?",
+    ],
+}
+LABEL_FLAGS = {
+    "conversational": {"is_conversational": True, "is_question": False, "requires_context": False},
+    "question": {"is_conversational": False, "is_question": True, "requires_context": False},
+    "follow_up": {"is_conversational": False, "is_question": True, "requires_context": True},
+}
+
+
+def normalize_query(query: str) -> str:
+    text = query.lower().strip()
+    text = re.sub(r"[^\w\s']", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def classify_by_rules(normalized: str) -> Optional[Dict]:
+    """
+    Classify obvious greetings, thanks and small talk without any model call.
+    Anything else may be an off-topic question or a follow-up, which the
+    rules can't tell apart, so it is left to the later tiers.
+    """
+    words = normalized.split()
+    if not words:
+        return dict(LABEL_FLAGS["conversational"])
+    if normalized in CONVERSATIONAL_PHRASES or (
+        len(words) <= 5 and all(word in CONVERSATIONAL_WORDS for word in words)
+    ):
+        return dict(LABEL_FLAGS["conversational"])
+    if normalized.startswith(SMALL_TALK_PREFIXES) and len(words) <= 6:
+        return dict(LABEL_FLAGS["conversational"])
+    return None
+
+
+class CentroidClassifier:
+    """
+    Nearest-centroid classifier over embeddings of LABELLED_EXAMPLES.
+    Centroids are embedded once, on first use.
+    """
+
+    def __init__(self, embeddings, examples, min_similarity: float, margin: float):
+        self.embeddings = embeddings
+        self.examples = examples
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self._labels = list(examples)
+        self._centroids: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+    def _build_centroids(self, vectors_by_label) -> np.ndarray:
+        return self._normalize([
+            self._normalize(vectors).mean(axis=0) for vectors in vectors_by_label
+        ])
+
+    def _centroids_sync(self) -> np.ndarray:
+        if self._centroids is None:
+            self._centroids = self._build_centroids(
+                [self.embeddings.embed_documents(self.examples[label]) for label in self._labels]
+            )
+        return self._centroids
+
+    async def _centroids_async(self) -> np.ndarray:
+        if self._centroids is None:
+            self._centroids = self._build_centroids(
+                [await self.embeddings.aembed_documents(self.examples[label]) for label in self._labels]
+            )
+        return self._centroids
+
+    def _decide(self, centroids: np.ndarray, query_vector) -> Optional[Dict]:
+        similarities = centroids @ self._normalize(query_vector)
+        order = np.argsort(similarities)[::-1]
+        best, runner_up = similarities[order[0]], similarities[order[1]]
+        if best < self.min_similarity or best - runner_up < self.margin:
+            return None
+        return dict(LABEL_FLAGS[self._labels[order[0]]])
+
+    def classify(self, query_vector) -> Optional[Dict]:
+        return self._decide(self._centroids_sync(), query_vector)
+
+    async def aclassify(self, query_vector) -> Optional[Dict]:
+        return self._decide(await self._centroids_async(), query_vector)
+
+
+def _confirmed_by_subject(result: Optional[Dict], query_vector, subject: Optional[str]) -> Optional[Dict]:
+    """
+    Keep an embedding-tier "question" only when the subject centroids place
+    the query in-distribution for `subject` (any subject when none is given),
+    so off-topic questions still reach the LLM's subject check. Follow-ups
+    and conversational verdicts pass through.
+    """
+    if result is None or not result["is_question"] or result["requires_context"]:
+        return result
+    if subject_centroids.route(query_vector, subject) is None:
+        return None
+    return result
+
+
+centroid_classifier = CentroidClassifier(
+    embedding,
+    LABELLED_EXAMPLES,
+    min_similarity=CONVERSATIONAL_MIN_SIMILARITY,
+    margin=CONVERSATIONAL_MARGIN,
+)
+
+
+class _ClassificationMemo:
+    """Bounded LRU of classification results keyed by (normalized query, subject)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._results: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.tier_counts = {"memo": 0, "rules": 0, "embedding": 0, "llm": 0}
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.tier_counts["memo"] += 1
+                return dict(result)
+            return None
+
+    def put(self, key, result: Dict) -> None:
+        with self._lock:
+            self.tier_counts[result["classified_by"]] += 1
+            self._results[key] = dict(result)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"memoized": len(self._results), "classified_by": dict(self.tier_counts)}
+
+
+classification_memo = _ClassificationMemo(CONVERSATIONAL_MEMO_SIZE)
+
+
+def _llm_result(result: QueryType) -> Dict:
+    return {
+        "is_conversational": result.is_conversational,
+        "is_question": result.is_question,
+        "requires_context": result.requires_context,
+        "classified_by": "llm",
+    }
+
+
+def detect_conversational_query(query: str, subject: Optional[str] = None, query_vector=None) -> Dict:
     """
-    Detect query type with minimal overhead
+    Detect query type with minimal overhead: rules for clear greetings and
+    thanks first, then nearest-centroid matching on cached example embeddings
+    (a question only counts once the subject centroids confirm its subject),
+    and the LLM classifier only when both are unsure. Results are memoized
+    per normalized query.
     
     Args:
         query: User input
-        subject: Subject context
+        subject: Subject context (None: any subject)
+        query_vector: The question's embedding when the caller already has it
+            (e.g. from the semantic cache); otherwise the question is embedded
+            as is, so the router finds it in the embedding cache
         
     Returns:
-        Dict with classification flags
+        Dict with classification flags and the tier that decided ("rules", "embedding", "llm")
     """
-    result = query_classifier.invoke({
-        "query": query,
-        "subject": subject or "general topics"
-    })
+    normalized = normalize_query(query)
+    key = (normalized, subject or "")
+    memoized = classification_memo.get(key)
+    if memoized is not None:
+        return memoized
     
-    return {
-        "is_conversational": result.is_conversational,
-        "is_question": result.is_question,
-        "requires_context": result.requires_context
-    }
\ No newline at end of file
+    result = classify_by_rules(normalized)
+    if result is not None:
+        result["classified_by"] = "rules"
+    else:
+        if query_vector is None:
+            query_vector = embedding.embed_query(query)
+        result = _confirmed_by_subject(centroid_classifier.classify(query_vector), query_vector, subject)
+        if result is not None:
+            result["classified_by"] = "embedding"
+        else:
+            result = _llm_result(query_classifier.invoke({
+                "query": query,
+                "subject": subject or "general topics"
+            }))
+    
+    classification_memo.put(key, result)
+    return result
+
+
+async def adetect_conversational_query(query: str, subject: Optional[str] = None, query_vector=None) -> Dict:
+    """
+    Async variant of detect_conversational_query
+    """
+    normalized = normalize_query(query)
+    key = (normalized, subject or "")
+    memoized = classification_memo.get(key)
+    if memoized is not None:
+        return memoized
+    
+    result = classify_by_rules(normalized)
+    if result is not None:
+        result["classified_by"] = "rules"
+    else:
+        if query_vector is None:
+            query_vector = await embedding.aembed_query(query)
+        result = _confirmed_by_subject(await centroid_classifier.aclassify(query_vector), query_vector, subject)
+        if result is not None:
+            result["classified_by"] = "embedding"
+        else:
+            result = _llm_result(await query_classifier.ainvoke({
+                "query": query,
+                "subject": subject or "general topics"
+            }))
+    
+    classification_memo.put(key, result)
+    return result
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+from retrieval import embedding
+
+
+@dataclass
+class _CacheEntry:
+    subject: str
+    question: str
+    vector: np.ndarray
+    generation: str
+    sources: List[Dict[str, Any]]
+    created_at: float
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by (subject, question embedding).
+
+    A lookup is a hit when a stored question for the same subject has a cosine
+    similarity of at least `threshold`. Entries are evicted least-recently-used
+    once `max_entries` is reached and expire after `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: int = 21600,
+        enabled: bool = True,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_question(self, question: str) -> np.ndarray:
+        return self._normalize(self.embeddings.embed_query(question))
+
+    async def aembed_question(self, question: str) -> np.ndarray:
+        return self._normalize(await self.embeddings.aembed_query(question))
+
+    def lookup(self, subject: Optional[str], vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached answer closest to `vector` for this subject, or None.
+        """
+        if not self.enabled:
+            return None
+
+        subject = subject or ""
+        now = time.time()
+        with self._lock:
+            best_id, best_score = None, -1.0
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created_at > self.ttl_seconds:
+                    del self._entries[entry_id]
+                    self.evictions += 1
+                    continue
+                if entry.subject != subject:
+                    continue
+                score = float(np.dot(entry.vector, vector))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return {
+                "generation": entry.generation,
+                "sources": entry.sources,
+                "similarity": best_score,
+                "cached_question": entry.question,
+            }
+
+    def store(
+        self,
+        subject: Optional[str],
+        question: str,
+        vector: np.ndarray,
+        generation: str,
+        sources: Optional[List[Dict[str, Any]]],
+    ) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[self._next_id] = _CacheEntry(
+                subject=subject or "",
+                question=question,
+                vector=vector,
+                generation=generation,
+                sources=sources or [],
+                created_at=time.time(),
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: Optional[str] = None) -> int:
+        """
+        Drop entries for a subject (plus unfiltered entries, which search every
+        subject). With no subject, clear the whole cache.
+        """
+        with self._lock:
+            if subject is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [
+                    entry_id for entry_id, entry in self._entries.items()
+                    if entry.subject in (subject, "")
+                ]
+                for entry_id in stale:
+                    del self._entries[entry_id]
+                removed = len(stale)
+            self.invalidations += removed
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
+
+
+semantic_cache = SemanticCache(
+    embedding,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    enabled=SEMANTIC_CACHE_ENABLED,
+)
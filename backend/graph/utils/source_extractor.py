@@ -1,13 +1,33 @@
+import hashlib
 from typing import List, Dict, Any
 from langchain.schema import Document
 
 
-def extract_sources_from_documents(documents: List[Document]) -> List[Dict[str, Any]]:
+def document_key(doc: Document) -> str:
+    """
+    Identity used to deduplicate documents: the URL for web results,
+    otherwise a hash of the whitespace-normalized content
+    
+    Args:
+        doc: Document object
+        
+    Returns:
+        Key string
+    """
+    source = (doc.metadata or {}).get("source", "") if hasattr(doc, 'metadata') else ""
+    if isinstance(source, str) and source.startswith(("http://", "https://")):
+        return f"url:{source}"
+    content = " ".join(doc.page_content.split())
+    return "sha1:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def extract_sources_from_documents(documents: List[Document], start_id: int = 0) -> List[Dict[str, Any]]:
     """
     Extract source information from document metadata
     
     Args:
         documents: List of Document objects
+        start_id: Number of documents that come before these (for appending to existing sources)
         
     Returns:
         List of source dictionaries with relevant metadata
@@ -16,7 +36,7 @@ def extract_sources_from_documents(documents: List[Document]) -> List[Dict[str,
     
     for i, doc in enumerate(documents):
         source_info = {
-            "document_id": i + 1,
+            "document_id": start_id + i + 1,
             "page_content_preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
         }
         
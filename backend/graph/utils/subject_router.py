@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from config import DATA_DIR, SUBJECT_ROUTER_MIN_CHUNKS, SUBJECT_ROUTER_Z
+from namespaces import iter_subject_vectors
+
+
+class SubjectCentroids:
+    """
+    Per-subject embedding centroids plus statistics of how similar each
+    subject's own chunks are to its centroid.
+
+    Updated at ingestion time and persisted as JSON, so routing and subject
+    auto-detection become a local cosine-similarity decision. The similarity
+    statistics are accumulated (Welford) against the centroid as it stood
+    when each batch was ingested, which is a close approximation once a
+    subject has a few batches.
+    """
+
+    def __init__(self, path: str, z: float = 2.0, min_chunks: int = 20):
+        self.path = path
+        self.z = z
+        self.min_chunks = min_chunks
+        self._subjects: Dict[str, Dict[str, Any]] = {}
+        self._centroids: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        with self._lock:
+            self._subjects = {
+                subject: {**stats, "vector_sum": np.asarray(stats["vector_sum"], dtype=np.float64)}
+                for subject, stats in data.items()
+            }
+            self._centroids = {
+                subject: self._normalize(stats["vector_sum"])
+                for subject, stats in self._subjects.items()
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                subject: {**stats, "vector_sum": stats["vector_sum"].tolist()}
+                for subject, stats in self._subjects.items()
+            }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def add(self, subject: str, vectors: Iterable) -> None:
+        """
+        Fold a batch of chunk embeddings for `subject` into its centroid and similarity stats
+        """
+        vectors = self._normalize(list(vectors))
+        if not len(vectors):
+            return
+
+        with self._lock:
+            stats = self._subjects.setdefault(subject, {
+                "vector_sum": np.zeros(vectors.shape[1], dtype=np.float64),
+                "count": 0,
+                "sim_mean": 0.0,
+                "sim_m2": 0.0,
+            })
+            stats["vector_sum"] = stats["vector_sum"] + vectors.sum(axis=0, dtype=np.float64)
+            stats["count"] += len(vectors)
+            centroid = self._normalize(stats["vector_sum"])
+            self._centroids[subject] = centroid
+
+            # Welford update over the batch's similarities to the new centroid
+            n = stats["count"] - len(vectors)
+            for similarity in (vectors @ centroid).tolist():
+                n += 1
+                delta = similarity - stats["sim_mean"]
+                stats["sim_mean"] += delta / n
+                stats["sim_m2"] += delta * (similarity - stats["sim_mean"])
+
+    def remove(self, subject: str) -> bool:
+        """
+        Forget `subject`'s centroid (persisted on the next save)
+        """
+        with self._lock:
+            self._centroids.pop(subject, None)
+            return self._subjects.pop(subject, None) is not None
+
+    def _lower_bound(self, stats: Dict[str, Any]) -> float:
+        std = math.sqrt(stats["sim_m2"] / (stats["count"] - 1)) if stats["count"] > 1 else 0.0
+        return stats["sim_mean"] - self.z * std
+
+    def similarities(self, question_vector) -> Dict[str, float]:
+        question_vector = self._normalize(question_vector)
+        with self._lock:
+            return {
+                subject: float(centroid @ question_vector)
+                for subject, centroid in self._centroids.items()
+                if self._subjects[subject]["count"] >= self.min_chunks
+            }
+
+    def route(self, question_vector, subject: Optional[str] = None) -> Optional[Tuple[str, str, float]]:
+        """
+        Decide locally whether the question belongs to the vectorstore.
+
+        Args:
+            question_vector: Embedding of the question
+            subject: Requested subject filter; when missing the closest subject is detected
+
+        Returns:
+            ("vectorstore", subject, similarity) when the question is in-distribution
+            for the (requested or detected) subject, None when the LLM router should decide
+        """
+        similarities = self.similarities(question_vector)
+        if not similarities:
+            return None
+
+        if subject is None:
+            subject = max(similarities, key=similarities.get)
+        elif subject not in similarities:
+            return None
+
+        similarity = similarities[subject]
+        with self._lock:
+            in_distribution = similarity >= self._lower_bound(self._subjects[subject])
+        if not in_distribution:
+            return None
+        return "vectorstore", subject, similarity
+
+    def rebuild_from_index(self, index, subjects: Iterable[str]) -> None:
+        """
+        Recompute the centroids of `subjects` from every vector already in
+        Pinecone (for data ingested before centroids were tracked), leaving
+        other subjects as they are. Vectors are paged through in batches, so
+        large subjects are covered in full.
+        """
+        for subject in subjects:
+            self.remove(subject)
+            count = 0
+            for batch in iter_subject_vectors(index, subject):
+                self.add(subject, [vector["values"] for vector in batch])
+                count += len(batch)
+            print(f"---REBUILT CENTROID FOR {subject} FROM {count} VECTORS---")
+        self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                subject: {
+                    "chunks": stats["count"],
+                    "similarity_mean": round(stats["sim_mean"], 4),
+                    "in_distribution_above": round(self._lower_bound(stats), 4),
+                }
+                for subject, stats in self._subjects.items()
+            }
+
+
+subject_centroids = SubjectCentroids(
+    os.path.join(DATA_DIR, "subject_centroids.json"),
+    z=SUBJECT_ROUTER_Z,
+    min_chunks=SUBJECT_ROUTER_MIN_CHUNKS,
+)
+
+
+if __name__ == "__main__":
+    # Rebuild centroids from the vectors already in Pinecone:
+    #   python -m graph.utils.subject_router
+    from retrieval import index
+
+    subject_centroids.rebuild_from_index(index, ["DataMining", "Network", "Distributed", "Energy"])
+    print(json.dumps(subject_centroids.stats(), indent=2))
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import (
+    DATA_DIR,
+    WEB_SEARCH_CACHE_ENABLED,
+    WEB_SEARCH_CACHE_STALE_SECONDS,
+    WEB_SEARCH_CACHE_TTL_SECONDS,
+)
+
+
+class WebSearchCache:
+    """
+    Disk-backed cache of web search results keyed by normalized query.
+
+    Results younger than `ttl_seconds` are served directly. With
+    `stale_seconds` > 0, results up to that much older than the TTL are still
+    served while one background search refreshes them (stale-while-revalidate).
+    Concurrent misses for the same query, sync or async, share a single
+    search call. The async paths run SQLite reads and writes in a thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: int = 86400,
+        stale_seconds: int = 0,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.enabled = enabled
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # One in-flight search per key, shared by search() and asearch()
+        self._inflight: Dict[str, Future] = {}
+        # Background refresh tasks; the event loop only keeps weak references
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS web_search (query TEXT PRIMARY KEY, results TEXT, stored_at REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _read(self, key: str) -> Optional[Tuple[List[dict], float]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT results, stored_at FROM web_search WHERE query = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def _write(self, key: str, results: List[dict]) -> None:
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO web_search (query, results, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results), time.time()),
+            )
+            db.commit()
+
+    def _cached(self, key: str) -> Tuple[Optional[List[dict]], bool]:
+        """
+        Returns (results, needs_refresh); results is None on a miss
+        """
+        entry = self._read(key)
+        if entry is not None:
+            results, age = entry
+            if age <= self.ttl_seconds:
+                self.hits += 1
+                return results, False
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self.stale_hits += 1
+                return results, True
+        self.misses += 1
+        return None, False
+
+    @staticmethod
+    def _results(response) -> List[dict]:
+        return response["results"] if isinstance(response, dict) else response
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        The in-flight search for `key` and whether the caller owns it (and so
+        must run the search and resolve the future)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _fetch(self, tool, query: str, key: str) -> List[dict]:
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+
+        try:
+            results = self._results(tool.invoke({"query": query}))
+            self._write(key, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def _afetch(self, tool, query: str, key: str) -> List[dict]:
+        future, owner = self._claim(key)
+        if not owner:
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            results = self._results(await tool.ainvoke({"query": query}))
+            await asyncio.to_thread(self._write, key, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            # Cancelled before resolving: release anyone waiting on it
+            future.cancel()
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _refresh_in_background(self, tool, query: str, key: str) -> None:
+        with self._lock:
+            if key in self._inflight:
+                return
+            self.refreshes += 1
+
+        def refresh():
+            try:
+                self._fetch(tool, query, key)
+            except Exception as e:
+                print(f"---WEB SEARCH CACHE REFRESH FAILED: {e}---")
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _arefresh_in_background(self, tool, query: str, key: str) -> None:
+        with self._lock:
+            if key in self._inflight:
+                return
+            self.refreshes += 1
+        task = asyncio.create_task(self._afetch(tool, query, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"---WEB SEARCH CACHE REFRESH FAILED: {task.exception()}---")
+
+    def search(self, tool, query: str) -> List[dict]:
+        """
+        tool.invoke({"query": query})["results"], served from the cache when possible
+        """
+        if not self.enabled:
+            return self._results(tool.invoke({"query": query}))
+
+        key = self.normalize(query)
+        results, needs_refresh = self._cached(key)
+        if results is None:
+            return self._fetch(tool, query, key)
+        if needs_refresh:
+            self._refresh_in_background(tool, query, key)
+        return results
+
+    async def asearch(self, tool, query: str) -> List[dict]:
+        """
+        Async variant of search
+        """
+        if not self.enabled:
+            return self._results(await tool.ainvoke({"query": query}))
+
+        key = self.normalize(query)
+        results, needs_refresh = await asyncio.to_thread(self._cached, key)
+        if results is None:
+            return await self._afetch(tool, query, key)
+        if needs_refresh:
+            self._arefresh_in_background(tool, query, key)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        entries = 0
+        if self.enabled and os.path.exists(self.path):
+            with self._lock:
+                entries = self._connection().execute("SELECT COUNT(*) FROM web_search").fetchone()[0]
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+        }
+
+
+web_search_cache = WebSearchCache(
+    os.path.join(DATA_DIR, "web_search.sqlite3"),
+    ttl_seconds=WEB_SEARCH_CACHE_TTL_SECONDS,
+    stale_seconds=WEB_SEARCH_CACHE_STALE_SECONDS,
+    enabled=WEB_SEARCH_CACHE_ENABLED,
+)
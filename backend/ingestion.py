@@ -1,17 +1,23 @@
 from dotenv import load_dotenv
 import os
+import uuid
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
 from langchain_community.document_loaders import TextLoader
 from langchain_community.document_loaders import PyPDFLoader
 
-load_dotenv()
+# Clients and retrievers live in retrieval.py; re-exported here for existing imports
+from retrieval import (
+    asimilarity_search_with_scores,
+    embedding,
+    get_retriever,
+    get_vectorstore,
+    index,
+    pc,
+    similarity_search_with_scores,
+)
 
-embedding=OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.environ["INDEX_NAME"])
+load_dotenv()
 
 # splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=700, chunk_overlap=0)
 
@@ -48,23 +54,28 @@ index = pc.Index(os.environ["INDEX_NAME"])
 
 # batch_upload(all_docs, batch_size=50)
 
-# Create retriever function that supports subject filtering
-def get_retriever(subject=None):
-    vectorstore = PineconeVectorStore(
-        index=index,
-        embedding=embedding,
-    )
-    
-    if subject:
-        # Create retriever with metadata filter
-        retriever = vectorstore.as_retriever(
-            search_kwargs={"filter": {"subject": subject}}
-        )
-    else:
-        # Create retriever without filter
-        retriever = vectorstore.as_retriever()
-    
-    return retriever
+# Write chunks whose embeddings were already computed
+def upsert_documents(documents, vectors, batch_size=100, namespace=None):
+    """
+    Upsert pre-embedded chunks in the layout PineconeVectorStore reads back
+    (chunk text under metadata["text"]), so callers that need the vectors
+    themselves (e.g. subject centroids) only embed each chunk once.
+    `namespace` is the subject's namespace (None: the default namespace).
+    """
+    records = [
+        {
+            "id": str(uuid.uuid4()),
+            "values": list(vector),
+            "metadata": {**(doc.metadata or {}), "text": doc.page_content},
+        }
+        for doc, vector in zip(documents, vectors)
+    ]
+    for i in range(0, len(records), batch_size):
+        if namespace:
+            index.upsert(vectors=records[i:i + batch_size], namespace=namespace)
+        else:
+            index.upsert(vectors=records[i:i + batch_size])
+    return len(records)
 
 # Default retriever (for backward compatibility)
 retriever = get_retriever()
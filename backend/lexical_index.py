@@ -0,0 +1,303 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config import BM25_B, BM25_K1, DATA_DIR, LEXICAL_INDEX_SAVE_DELAY_SECONDS
+from namespaces import iter_subject_vectors
+
+# Words, plus technical terms that keep their inner punctuation
+# ("csma/cd", "802.11", "tcp/ip", "k-means") as one token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./+\-][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[./+\-]")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how in is it its of on or that the this
+to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms without stopwords. Compound terms are kept whole and also
+    split into their parts, so "CSMA/CD" matches both "csma/cd" and "csma".
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _SPLIT_RE.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def content_key(text: str) -> str:
+    # Identity shared by the lexical and dense result lists for fusion
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class _SubjectIndex:
+    """
+    Inverted index over one subject's chunks: term -> {chunk id: term frequency}
+    """
+
+    def __init__(self):
+        self.chunks: List[Dict[str, Any]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.keys: set = set()
+        self.total_length = 0
+
+    def add(self, text: str, metadata: Dict[str, Any]) -> bool:
+        key = content_key(text)
+        if key in self.keys:
+            return False
+        chunk_id = len(self.chunks)
+        terms = tokenize(text)
+        self.chunks.append({"text": text, "metadata": metadata})
+        self.lengths.append(len(terms))
+        self.keys.add(key)
+        self.total_length += len(terms)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+        return True
+
+    def search(self, terms: List[str], k: int, k1: float, b: float) -> List[Tuple[float, int]]:
+        n = len(self.chunks)
+        if not n:
+            return []
+        average_length = self.total_length / n or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = k1 * (1 - b + b * self.lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, ((score, chunk_id) for chunk_id, score in scores.items()))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "chunks": list(self.chunks),
+            "lengths": list(self.lengths),
+            "postings": {
+                term: [list(postings), list(postings.values())]
+                for term, postings in self.postings.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "_SubjectIndex":
+        # Postings are stored as parallel id/frequency lists so loading doesn't re-tokenize
+        index = cls()
+        index.chunks = data["chunks"]
+        index.lengths = data["lengths"]
+        index.total_length = sum(index.lengths)
+        index.keys = {content_key(chunk["text"]) for chunk in index.chunks}
+        index.postings = {
+            term: dict(zip(chunk_ids, frequencies))
+            for term, (chunk_ids, frequencies) in data["postings"].items()
+        }
+        return index
+
+
+class LexicalIndex:
+    """
+    BM25 index per subject over the same chunks that are upserted to Pinecone.
+
+    Updated at ingestion time and persisted as one JSON file (chunks, lengths
+    and postings) per subject under `directory`; schedule_save() writes only
+    the subjects that changed, `save_delay` seconds later on a timer thread.
+    Chunks with identical (whitespace-normalized) text are indexed once.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75, save_delay: float = 5.0):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.save_delay = save_delay
+        self._subjects: Dict[str, _SubjectIndex] = {}
+        self._lock = threading.Lock()
+        self._dirty: set = set()
+        self._save_timer: Optional[threading.Timer] = None
+        self.load()
+
+    def _path(self, subject: str) -> str:
+        return os.path.join(self.directory, f"{subject}.json")
+
+    def load(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        subjects = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.directory, name)) as f:
+                subjects[name[:-len(".json")]] = _SubjectIndex.from_json(json.load(f))
+        with self._lock:
+            self._subjects = subjects
+
+    def save(self, subject: Optional[str] = None) -> None:
+        """
+        Persist `subject` (or every subject) atomically
+        """
+        with self._lock:
+            subjects = [subject] if subject else list(self._subjects)
+            data = {s: self._subjects[s].to_json() for s in subjects if s in self._subjects}
+        os.makedirs(self.directory, exist_ok=True)
+        for name, index_data in data.items():
+            tmp_path = f"{self._path(name)}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps(index_data))
+            os.replace(tmp_path, self._path(name))
+
+    def schedule_save(self, subject: str) -> None:
+        """
+        Persist `subject` in the background after `save_delay` seconds;
+        subjects changed meanwhile are written by the same run
+        """
+        with self._lock:
+            self._dirty.add(subject)
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self) -> None:
+        """
+        Write every subject with a pending schedule_save() now
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        for subject in dirty:
+            try:
+                self.save(subject)
+            except Exception as e:
+                print(f"---SAVING LEXICAL INDEX FOR {subject} FAILED: {e}---")
+
+    def add(self, subject: str, documents: Iterable[Document]) -> int:
+        """
+        Index a batch of chunks for `subject`; returns how many were new
+        """
+        with self._lock:
+            index = self._subjects.setdefault(subject, _SubjectIndex())
+            return sum(
+                index.add(doc.page_content, {**(doc.metadata or {}), "subject": subject})
+                for doc in documents
+            )
+
+    def remove(self, subject: str) -> bool:
+        """
+        Drop `subject`'s index and its file; returns whether it existed
+        """
+        with self._lock:
+            existed = self._subjects.pop(subject, None) is not None
+        if os.path.exists(self._path(subject)):
+            os.remove(self._path(subject))
+            existed = True
+        return existed
+
+    def search(self, query: str, subject: Optional[str] = None, k: int = 4) -> List[Document]:
+        """
+        Top-k chunks by BM25 score, with the score in metadata["bm25_score"].
+        Without a subject every subject's index is searched.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            indexes = (
+                [self._subjects[subject]] if subject in self._subjects
+                else [] if subject else list(self._subjects.values())
+            )
+            hits = [
+                (score, index.chunks[chunk_id])
+                for index in indexes
+                for score, chunk_id in index.search(terms, k, self.k1, self.b)
+            ]
+        hits = heapq.nlargest(k, hits, key=lambda hit: hit[0])
+        return [
+            Document(page_content=chunk["text"], metadata={**chunk["metadata"], "bm25_score": round(score, 4)})
+            for score, chunk in hits
+        ]
+
+    def rebuild_from_index(self, index, subjects: Iterable[str]) -> None:
+        """
+        Rebuild `subjects` from the chunk text already stored in Pinecone
+        (metadata["text"]), for data ingested before the lexical index existed.
+        Every stored chunk is paged through in batches; other subjects are
+        left as they are.
+        """
+        for subject in subjects:
+            with self._lock:
+                self._subjects.pop(subject, None)
+            stored = added = 0
+            for batch in iter_subject_vectors(index, subject):
+                stored += len(batch)
+                added += self.add(subject, [
+                    Document(
+                        page_content=vector["metadata"]["text"],
+                        metadata={key: value for key, value in vector["metadata"].items() if key != "text"},
+                    )
+                    for vector in batch
+                    if vector["metadata"].get("text")
+                ])
+            print(f"---REBUILT LEXICAL INDEX FOR {subject}: {added} CHUNKS INDEXED FROM {stored} STORED VECTORS---")
+            self.save(subject)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                subject: {"chunks": len(index.chunks), "terms": len(index.postings)}
+                for subject, index in self._subjects.items()
+            }
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Merge ranked lists: each document scores sum(1 / (rrf_k + rank)) over the
+    lists it appears in (matched by content). The first list's copy of a
+    document is kept, so dense results keep their relevance_score; the fused
+    score goes to metadata["rrf_score"].
+    """
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = content_key(doc.page_content)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            if key not in documents:
+                documents[key] = doc
+            elif "bm25_score" in doc.metadata:
+                documents[key].metadata["bm25_score"] = doc.metadata["bm25_score"]
+    ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+    for key in ranked:
+        documents[key].metadata["rrf_score"] = round(fused[key], 6)
+    return [documents[key] for key in ranked]
+
+
+lexical_index = LexicalIndex(
+    os.path.join(DATA_DIR, "bm25"), k1=BM25_K1, b=BM25_B, save_delay=LEXICAL_INDEX_SAVE_DELAY_SECONDS
+)
+
+
+if __name__ == "__main__":
+    # Rebuild the BM25 index from the chunks already in Pinecone:
+    #   python -m lexical_index
+    from retrieval import index
+
+    lexical_index.rebuild_from_index(index, ["DataMining", "Network", "Distributed", "Energy"])
+    print(json.dumps(lexical_index.stats(), indent=2))
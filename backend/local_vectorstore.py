@@ -0,0 +1,503 @@
+import asyncio
+import json
+import os
+import re
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ann_index import IVFIndex
+
+# Namespaces become directory names
+_NAMESPACE_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class MmapVectorIndex:
+    """
+    Append-only vector index on local disk, usable where the Pinecone Index
+    is (upsert(vectors=[...]) and query(...)).
+
+    Vectors are L2-normalized and appended to a float32 file that is read
+    through np.memmap; chunk ids and metadata go to a JSON-lines file next to
+    it. Each upsert appends one contiguous block of rows per subject, and
+    manifest.json records the committed row count and every subject's row
+    ranges. The manifest is written last, so rows from an interrupted append
+    are ignored (and truncated) on the next load. Search is an exact dot
+    product (cosine similarity) over the subject's ranges until the index
+    holds `ann_min_rows` rows; from then on the optional IVF index `ann` is
+    trained, kept up to date on every append, retrained once the row count
+    grows `ann_retrain_growth`-fold and used for search. Training runs on a
+    background thread, so upserts and searches don't wait for it; searches
+    stay exact until the IVF index covers every row.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ann: Optional[IVFIndex] = None,
+        ann_min_rows: int = 50000,
+        ann_retrain_growth: float = 4.0,
+    ):
+        self.directory = directory
+        self.ann = ann
+        self.ann_min_rows = ann_min_rows
+        self.ann_retrain_growth = ann_retrain_growth
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.chunks_path = os.path.join(directory, "chunks.jsonl")
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.dimension: Optional[int] = None
+        self.rows = 0
+        self.ranges: Dict[str, List[Tuple[int, int]]] = {}
+        self._chunks: List[Dict[str, Any]] = []
+        self._rows_by_id: Optional[Dict[str, int]] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._ann_training: Optional[threading.Thread] = None
+        # Bumped by clear(), so a training run that outlives the rows it was given is dropped
+        self._generation = 0
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        with open(self.chunks_path) as f:
+            chunks = [json.loads(line) for _, line in zip(range(manifest["rows"]), f)]
+        with self._lock:
+            self.dimension = manifest["dimension"]
+            self.rows = manifest["rows"]
+            self.ranges = {subject: [tuple(r) for r in ranges] for subject, ranges in manifest["ranges"].items()}
+            self._chunks = chunks
+            self._rows_by_id = None
+            self._truncate_uncommitted()
+            self._remap()
+            self._update_ann()
+
+    def _truncate_uncommitted(self) -> None:
+        # Drop rows written after the last manifest (an append that didn't finish)
+        if self.dimension and os.path.getsize(self.vectors_path) > self.rows * self.dimension * 4:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(self.rows * self.dimension * 4)
+        with open(self.chunks_path, "rb") as f:
+            committed = sum(len(line) for _, line in zip(range(self.rows), f))
+        if os.path.getsize(self.chunks_path) > committed:
+            with open(self.chunks_path, "r+b") as f:
+                f.truncate(committed)
+
+    def _remap(self) -> None:
+        if not self.rows:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(
+            self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dimension)
+        )
+
+    def _update_ann(self) -> None:
+        # Called with the lock held, after the matrix was remapped. Rows
+        # appended while training are added once the new index is in place.
+        if self.ann is None or self.rows < self.ann_min_rows or self._ann_training is not None:
+            return
+        if (
+            not self.ann.trained
+            or self.ann.rows > self.rows
+            or self.rows >= self.ann.trained_rows * self.ann_retrain_growth
+        ):
+            self._ann_training = threading.Thread(
+                target=self._train_ann, args=(self._matrix, self._generation), daemon=True
+            )
+            self._ann_training.start()
+        else:
+            self.ann.add(self._matrix, self.rows)
+
+    def _train_ann(self, matrix: np.ndarray, generation: int) -> None:
+        try:
+            self.ann.train(matrix)
+        finally:
+            with self._lock:
+                self._ann_training = None
+                if generation != self._generation:
+                    self.ann.clear()
+                elif self._matrix is not None:
+                    self._update_ann()
+
+    def wait_for_ann(self) -> None:
+        """
+        Block until background IVF training (including any retrain it
+        triggers for rows appended meanwhile) has finished
+        """
+        while True:
+            with self._lock:
+                training = self._ann_training
+            if training is None:
+                return
+            training.join()
+
+    def _ann_covers(self, rows: int) -> bool:
+        # The IVF index is only searched once it indexes exactly the rows mapped
+        return self.ann is not None and self.ann.trained and self.ann.rows == rows
+
+    def clear(self) -> None:
+        """
+        Delete every row (and the IVF index); the manifest goes first so a
+        crash midway leaves an empty index rather than a partial one
+        """
+        with self._lock:
+            for path in (self.manifest_path, self.vectors_path, self.chunks_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            if self.ann is not None:
+                self.ann.clear()
+            self._generation += 1
+            self.dimension = None
+            self.rows = 0
+            self.ranges = {}
+            self._chunks = []
+            self._rows_by_id = None
+            self._matrix = None
+
+    def _write_manifest(self) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dimension": self.dimension,
+                "rows": self.rows,
+                "ranges": {subject: [list(r) for r in ranges] for subject, ranges in self.ranges.items()},
+            }, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Append records shaped like Pinecone's ({"id", "values", "metadata"}).
+        Records are grouped by metadata["subject"] so each subject gets one
+        contiguous row range per call.
+        """
+        if not vectors:
+            return {"upserted_count": 0}
+        by_subject: Dict[str, List[Dict[str, Any]]] = {}
+        for record in vectors:
+            by_subject.setdefault((record.get("metadata") or {}).get("subject") or "", []).append(record)
+
+        with self._lock:
+            dimension = len(vectors[0]["values"])
+            if self.dimension is None:
+                self.dimension = dimension
+            elif dimension != self.dimension:
+                raise ValueError(f"Vector dimension {dimension} does not match index dimension {self.dimension}")
+
+            os.makedirs(self.directory, exist_ok=True)
+            start = self.rows
+            with open(self.vectors_path, "ab") as vector_file, open(self.chunks_path, "a") as chunk_file:
+                for subject, records in by_subject.items():
+                    vector_file.write(self._normalize([r["values"] for r in records]).tobytes())
+                    for record in records:
+                        chunk = {"id": record["id"], "metadata": record.get("metadata") or {}}
+                        chunk_file.write(json.dumps(chunk) + "\n")
+                        self._chunks.append(chunk)
+                        if self._rows_by_id is not None:
+                            self._rows_by_id[record["id"]] = len(self._chunks) - 1
+                    self.ranges.setdefault(subject, []).append((start, start + len(records)))
+                    start += len(records)
+            self.rows = start
+            self._write_manifest()
+            self._remap()
+            self._update_ann()
+        return {"upserted_count": len(vectors)}
+
+    def _snapshot(self, subject: Optional[str]) -> Tuple[Optional[np.ndarray], List[Tuple[int, int]]]:
+        with self._lock:
+            if self._matrix is None:
+                return None, []
+            ranges = list(self.ranges.get(subject, [])) if subject else [(0, self.rows)]
+            return self._matrix, ranges
+
+    def search(self, vector, k: int, subject: Optional[str] = None, exact: bool = False) -> List[Tuple[int, float]]:
+        """
+        Top-k (row, cosine similarity) within `subject`'s rows (all rows
+        without one); approximate once the IVF index is trained, unless `exact`
+        """
+        matrix, ranges = self._snapshot(subject)
+        if matrix is None or not ranges:
+            return []
+        query = self._normalize(vector)
+        if not exact and self._ann_covers(len(matrix)):
+            results = self.ann.search(matrix, query, k, ranges if subject else None)
+            if results is not None:
+                return results
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = np.concatenate([matrix[start:end] @ query for start, end in ranges])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def chunk(self, row: int) -> Dict[str, Any]:
+        return self._chunks[row]
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return [chunk["id"] for chunk in self._chunks]
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        {id: {"id", "values", "metadata"}} for the ids present (the latest row
+        when an id was appended more than once)
+        """
+        with self._lock:
+            if self._rows_by_id is None:
+                self._rows_by_id = {chunk["id"]: row for row, chunk in enumerate(self._chunks)}
+            rows = {id_: self._rows_by_id[id_] for id_ in ids if id_ in self._rows_by_id}
+            matrix = self._matrix
+        return {
+            id_: {"id": id_, "values": matrix[row].tolist(), "metadata": self._chunks[row]["metadata"]}
+            for id_, row in rows.items()
+        }
+
+    def query(
+        self,
+        vector,
+        top_k: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        include_values: bool = False,
+        include_metadata: bool = False,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Pinecone-style query; only {"subject": ...} filters are supported
+        """
+        subject = _subject_filter(filter)
+        matches = []
+        for row, score in self.search(vector, top_k, subject):
+            chunk = self.chunk(row)
+            match = {"id": chunk["id"], "score": score}
+            if include_values:
+                match["values"] = self._matrix[row].tolist()
+            if include_metadata:
+                match["metadata"] = chunk["metadata"]
+            matches.append(match)
+        return {"matches": matches}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.directory,
+                "ann": self.ann.stats() if self.ann is not None else None,
+                "ann_training": self._ann_training is not None,
+                "dimension": self.dimension,
+                "rows": self.rows,
+                "subjects": {
+                    subject: {"rows": sum(end - start for start, end in ranges), "ranges": len(ranges)}
+                    for subject, ranges in self.ranges.items()
+                },
+            }
+
+
+@dataclass
+class FetchResult:
+    """
+    Shape of Pinecone's fetch response that callers read: vectors by id
+    """
+
+    vectors: Dict[str, Dict[str, Any]]
+
+
+class PartitionedVectorIndex:
+    """
+    Local counterpart of a Pinecone index with namespaces: one MmapVectorIndex
+    (with its own IVF index) per namespace, so searching, counting or deleting
+    one namespace never touches the others' files.
+
+    The default namespace ("") is stored directly in `directory`, which is
+    the single-index layout used before namespaces; every other namespace
+    lives in directory/namespaces/<name>.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ann_factory: Optional[Callable[[str], Optional[IVFIndex]]] = None,
+        ann_min_rows: int = 50000,
+        ann_retrain_growth: float = 4.0,
+    ):
+        self.directory = directory
+        self.ann_factory = ann_factory
+        self.ann_min_rows = ann_min_rows
+        self.ann_retrain_growth = ann_retrain_growth
+        self._partitions: Dict[str, MmapVectorIndex] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(os.path.join(directory, "manifest.json")):
+            self.partition("", create=True)
+        namespaces_dir = os.path.join(directory, "namespaces")
+        if os.path.isdir(namespaces_dir):
+            for name in sorted(os.listdir(namespaces_dir)):
+                self.partition(name, create=True)
+
+    def _directory(self, namespace: str) -> str:
+        if not namespace:
+            return self.directory
+        if not _NAMESPACE_RE.match(namespace):
+            raise ValueError(f"Invalid namespace '{namespace}'")
+        return os.path.join(self.directory, "namespaces", namespace)
+
+    def partition(self, namespace: Optional[str] = None, create: bool = False) -> Optional[MmapVectorIndex]:
+        namespace = namespace or ""
+        with self._lock:
+            partition = self._partitions.get(namespace)
+            if partition is None and create:
+                directory = self._directory(namespace)
+                partition = self._partitions[namespace] = MmapVectorIndex(
+                    directory,
+                    ann=self.ann_factory(directory) if self.ann_factory else None,
+                    ann_min_rows=self.ann_min_rows,
+                    ann_retrain_growth=self.ann_retrain_growth,
+                )
+            return partition
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: Optional[str] = None, **kwargs) -> Dict[str, int]:
+        return self.partition(namespace, create=True).upsert(vectors)
+
+    def query(self, vector, top_k: int = 10, namespace: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        partition = self.partition(namespace)
+        if partition is None:
+            return {"matches": []}
+        return partition.query(vector, top_k=top_k, **kwargs)
+
+    def list(self, namespace: Optional[str] = None, limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        """
+        Pinecone-style id listing: yields pages of at most `limit` ids
+        """
+        partition = self.partition(namespace)
+        ids = partition.ids() if partition is not None else []
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None, **kwargs) -> FetchResult:
+        partition = self.partition(namespace)
+        return FetchResult(vectors=partition.fetch(ids) if partition is not None else {})
+
+    def delete(self, delete_all: bool = False, namespace: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Pinecone-style delete; only whole namespaces (delete_all=True) can be
+        deleted from the append-only partitions
+        """
+        if not delete_all or kwargs.get("ids") or kwargs.get("filter"):
+            raise ValueError("Local vector store only deletes whole namespaces (delete_all=True)")
+        namespace = namespace or ""
+        with self._lock:
+            partition = self._partitions.pop(namespace, None)
+        if partition is not None:
+            partition.clear()
+            if namespace:
+                shutil.rmtree(partition.directory, ignore_errors=True)
+        return {}
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            partitions = dict(self._partitions)
+        namespaces = {name: {"vector_count": p.rows} for name, p in partitions.items() if p.rows}
+        return {
+            "dimension": next((p.dimension for p in partitions.values() if p.dimension), None),
+            "namespaces": namespaces,
+            "total_vector_count": sum(summary["vector_count"] for summary in namespaces.values()),
+        }
+
+    def split_default_namespace(self, subjects: Iterable[str], batch_size: int = 5000) -> Dict[str, int]:
+        """
+        Copy each subject's rows from the default namespace into the subject's
+        own partition, then drop the default namespace once nothing else is
+        left in it. A subject's partition is cleared before copying, so an
+        interrupted split can be rerun.
+        """
+        moved: Dict[str, int] = {}
+        source = self.partition("")
+        if source is None:
+            return moved
+        for subject in subjects:
+            matrix, ranges = source._snapshot(subject)
+            if matrix is None or not ranges:
+                continue
+            self.delete(delete_all=True, namespace=subject)
+            target = self.partition(subject, create=True)
+            rows = [row for start, end in ranges for row in range(start, end)]
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                target.upsert([
+                    {"id": source.chunk(row)["id"], "values": matrix[row], "metadata": source.chunk(row)["metadata"]}
+                    for row in batch
+                ])
+            moved[subject] = len(rows)
+            print(f"---MOVED {len(rows)} {subject} VECTORS TO NAMESPACE {subject}---")
+        if set(source.ranges) <= set(moved):
+            self.delete(delete_all=True, namespace="")
+        return moved
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            partitions = dict(self._partitions)
+        return {
+            "path": self.directory,
+            "namespaces": {name or "(default)": p.stats() for name, p in partitions.items()},
+        }
+
+
+def _subject_filter(search_filter: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not search_filter:
+        return None
+    if set(search_filter) != {"subject"}:
+        raise ValueError(f"Local vector store only filters by subject, got {search_filter}")
+    subject = search_filter["subject"]
+    return subject["$eq"] if isinstance(subject, dict) else subject
+
+
+class LocalVectorStore:
+    """
+    Drop-in for the PineconeVectorStore searches retrieval.py runs, over a
+    PartitionedVectorIndex. Chunk text is read from metadata["text"], the
+    layout ingestion.upsert_documents writes.
+    """
+
+    def __init__(self, index: PartitionedVectorIndex, embedding):
+        self.index = index
+        self.embeddings = embedding
+
+    @staticmethod
+    def _documents(partition: MmapVectorIndex, results: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        documents = []
+        for row, score in results:
+            metadata = dict(partition.chunk(row)["metadata"])
+            text = metadata.pop("text", "")
+            documents.append((Document(page_content=text, metadata=metadata), score))
+        return documents
+
+    def _search(self, vector, k: int, filter: Optional[Dict[str, Any]], namespace: Optional[str]):
+        partition = self.index.partition(namespace)
+        if partition is None:
+            return []
+        return self._documents(partition, partition.search(vector, k, _subject_filter(filter)))
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None
+    ):
+        return self._search(self.embeddings.embed_query(query), k, filter, namespace)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None
+    ):
+        vector = await self.embeddings.aembed_query(query)
+        # The scan over the memmap (or IVF lists) is CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(self._search, vector, k, filter, namespace)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, namespace=namespace)]
@@ -26,6 +26,8 @@ from api.proctoring import router as proctoring_router, set_proctoring_system
 from api.ingestion import router as ingestion_router
 from api.models import *
 from api.exam import router as exam_router
+from api.metrics import router as metrics_router
+from lexical_index import lexical_index
 
 
 
@@ -59,6 +61,8 @@ async def lifespan(app: FastAPI):
     if proctoring_system and proctoring_system.video_feed_active:
         print("  Stopping proctoring system...")
         proctoring_system.stop_proctoring()
+    # Write BM25 updates still waiting on their save timer
+    lexical_index.flush()
     print("✓ Shutdown complete")
 
 # Create FastAPI app
@@ -109,6 +113,7 @@ app.include_router(flashcard_router, prefix="/api/flashcard", tags=["flashcard"]
 app.include_router(proctoring_router, prefix="/api/proctoring", tags=["Proctoring"])
 app.include_router(ingestion_router, prefix="/api/ingestion", tags=["Ingestion"])
 app.include_router(exam_router, prefix="/api/exam", tags=["exam"])
+app.include_router(metrics_router, tags=["metrics"])
 
 @app.get("/")
 async def root():
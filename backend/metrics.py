@@ -0,0 +1,196 @@
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tracers.context import register_configure_hook
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:  # prometheus_client is optional; without it metrics are not recorded
+    PROMETHEUS_AVAILABLE = False
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+if not PROMETHEUS_AVAILABLE:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+    class _NoOpMetric:
+        """
+        Stand-in for Counter, Gauge and Histogram that records nothing
+        """
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, **labels):
+            return self
+
+        def inc(self, amount: float = 1.0):
+            pass
+
+        def set(self, value: float):
+            pass
+
+        def observe(self, value: float):
+            pass
+
+    Counter = Gauge = Histogram = _NoOpMetric
+
+    def generate_latest() -> bytes:
+        return b"# prometheus_client is not installed; no metrics are recorded\n"
+
+
+NODE_LATENCY = Histogram(
+    "rag_node_latency_seconds",
+    "Time spent in each LangGraph node",
+    ["graph", "node"],
+    buckets=LATENCY_BUCKETS,
+)
+NODE_ERRORS = Counter("rag_node_errors", "LangGraph node runs that raised", ["graph", "node"])
+LLM_CALLS = Counter("rag_llm_calls", "LLM calls per chain", ["chain"])
+LLM_ERRORS = Counter("rag_llm_errors", "Failed LLM calls per chain", ["chain"])
+LLM_PROMPT_TOKENS = Counter("rag_llm_prompt_tokens", "Prompt tokens per chain", ["chain"])
+LLM_COMPLETION_TOKENS = Counter("rag_llm_completion_tokens", "Completion tokens per chain", ["chain"])
+ROUTE_DECISIONS = Counter("rag_route_decisions", "Chat routing decisions", ["route", "routed_by"])
+CACHE_HITS = Gauge("rag_cache_hits", "Cache hits since start", ["cache"])
+CACHE_MISSES = Gauge("rag_cache_misses", "Cache misses since start", ["cache"])
+CACHE_HIT_RATIO = Gauge("rag_cache_hit_ratio", "Cache hit rate since start", ["cache"])
+
+
+# Callables (graph, node, seconds) called after every traced node run, e.g. by
+# the offline benchmark to collect raw latencies for percentiles
+_node_observers: List[Callable[[str, str, float], None]] = []
+
+
+def add_node_observer(observer: Callable[[str, str, float], None]) -> None:
+    _node_observers.append(observer)
+
+
+def _observe(histogram, graph: str, node: str, seconds: float) -> None:
+    histogram.observe(seconds)
+    for observer in _node_observers:
+        observer(graph, node, seconds)
+
+
+def traced_node(graph: str, node: str, func: Callable, afunc: Optional[Callable] = None) -> RunnableLambda:
+    """
+    RunnableLambda for a graph node that records its latency (and failures)
+    under rag_node_latency_seconds{graph, node}
+    """
+    histogram = NODE_LATENCY.labels(graph=graph, node=node)
+
+    @functools.wraps(func)
+    def timed(state):
+        start = time.perf_counter()
+        try:
+            return func(state)
+        except Exception:
+            NODE_ERRORS.labels(graph=graph, node=node).inc()
+            raise
+        finally:
+            _observe(histogram, graph, node, time.perf_counter() - start)
+
+    if afunc is None:
+        return RunnableLambda(timed)
+
+    @functools.wraps(afunc)
+    async def atimed(state):
+        start = time.perf_counter()
+        try:
+            return await afunc(state)
+        except Exception:
+            NODE_ERRORS.labels(graph=graph, node=node).inc()
+            raise
+        finally:
+            _observe(histogram, graph, node, time.perf_counter() - start)
+
+    return RunnableLambda(timed, afunc=atimed)
+
+
+def chain_tag(name: str) -> str:
+    """
+    Tag for a chain's LLM (ChatOpenAI(tags=[chain_tag(name)])) so its calls are
+    counted under rag_llm_*{chain=name}
+    """
+    return f"chain:{name}"
+
+
+def record_route(route: Optional[str], routed_by: Optional[str]) -> None:
+    ROUTE_DECISIONS.labels(route=route or "unknown", routed_by=routed_by or "unknown").inc()
+
+
+def record_cache(name: str, hits: int, misses: int) -> None:
+    lookups = hits + misses
+    CACHE_HITS.labels(cache=name).set(hits)
+    CACHE_MISSES.labels(cache=name).set(misses)
+    CACHE_HIT_RATIO.labels(cache=name).set(hits / lookups if lookups else 0.0)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Counts every LLM call and its token usage, labelled by the "chain:<name>"
+    tag of the enclosing chain (or the LangGraph node when untagged)
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._chains: Dict[UUID, str] = {}
+
+    @staticmethod
+    def _chain(tags, metadata) -> str:
+        for tag in tags or []:
+            if tag.startswith("chain:"):
+                return tag[len("chain:"):]
+        return (metadata or {}).get("langgraph_node") or "other"
+
+    def _start(self, run_id: UUID, tags, metadata) -> None:
+        chain = self._chain(tags, metadata)
+        self._chains[run_id] = chain
+        LLM_CALLS.labels(chain=chain).inc()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, metadata=None, **kwargs):
+        self._start(run_id, tags, metadata)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        self._start(run_id, tags, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        chain = self._chains.pop(run_id, "other")
+        prompt_tokens, completion_tokens = self._usage(response)
+        LLM_PROMPT_TOKENS.labels(chain=chain).inc(prompt_tokens)
+        LLM_COMPLETION_TOKENS.labels(chain=chain).inc(completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        LLM_ERRORS.labels(chain=self._chains.pop(run_id, "other")).inc()
+
+    @staticmethod
+    def _usage(response: LLMResult) -> Tuple[int, int]:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+        # Streaming responses carry usage on the message instead
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage_metadata.get("input_tokens", 0)
+                completion_tokens += usage_metadata.get("output_tokens", 0)
+        return prompt_tokens, completion_tokens
+
+
+llm_metrics_handler = LLMMetricsHandler()
+
+# Attach the handler to every run in the process, so each LLM call is counted
+# without threading callbacks through the chat, quiz, flashcard and exam graphs
+_llm_metrics_var: ContextVar[Optional[LLMMetricsHandler]] = ContextVar(
+    "rag_llm_metrics", default=llm_metrics_handler
+)
+register_configure_hook(_llm_metrics_var, inheritable=True)
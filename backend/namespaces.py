@@ -0,0 +1,155 @@
+import math
+import time
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional
+
+from config import SUBJECT_NAMESPACES_ENABLED
+from local_vectorstore import PartitionedVectorIndex
+
+# Pinecone's default namespace: vectors upserted without one, including
+# everything ingested before subjects got their own namespaces
+DEFAULT_NAMESPACE = ""
+
+
+def subject_namespace(subject: Optional[str]) -> Optional[str]:
+    """
+    Namespace holding `subject`'s chunks; None when subjects share the
+    default namespace (namespaces disabled, or no subject)
+    """
+    if not SUBJECT_NAMESPACES_ENABLED or not subject:
+        return None
+    return subject
+
+
+def subject_scope(subject: Optional[str], namespaces: Optional[Collection[str]] = None) -> Dict[str, Any]:
+    """
+    Keyword arguments that scope index.query(...) or a vector store search to
+    `subject`: its namespace, or a metadata filter without namespaces. When
+    the non-empty `namespaces` of the index are given, a subject that has
+    none of its own (not migrated yet) is filtered in the default namespace.
+    """
+    namespace = subject_namespace(subject)
+    if namespace and (namespaces is None or namespace in namespaces):
+        return {"namespace": namespace}
+    return {"filter": {"subject": subject}} if subject else {}
+
+
+def list_namespaces(index) -> Dict[str, int]:
+    """
+    Vector count per namespace, from the index's describe_index_stats()
+    """
+    stats = index.describe_index_stats()
+    return {
+        name: int(summary["vector_count"])
+        for name, summary in (stats["namespaces"] or {}).items()
+    }
+
+
+def iter_subject_vectors(index, subject: str, batch_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Every vector stored for `subject`, as batches of {"id", "values",
+    "metadata"}. Ids are paged with index.list() and fetched `batch_size` at
+    a time (Pinecone caps top_k at 1000 when values or metadata are
+    returned, and a similarity query would only reach the probe's
+    neighbourhood). In the default namespace the subject's vectors are picked
+    out by metadata["subject"].
+    """
+    namespaces = {name for name, count in list_namespaces(index).items() if count}
+    namespace = subject_scope(subject, namespaces).get("namespace", DEFAULT_NAMESPACE)
+    yield from _iter_namespace_vectors(index, namespace, subject, batch_size)
+
+
+def _iter_namespace_vectors(index, namespace: str, subject: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    for page in index.list(namespace=namespace, limit=batch_size):
+        ids = list(page)
+        for start in range(0, len(ids), batch_size):
+            vectors = index.fetch(ids=ids[start:start + batch_size], namespace=namespace).vectors
+            batch = [
+                {"id": vector_id, "values": list(vector["values"]), "metadata": dict(vector["metadata"] or {})}
+                for vector_id, vector in vectors.items()
+                if namespace != DEFAULT_NAMESPACE or (vector["metadata"] or {}).get("subject") == subject
+            ]
+            if batch:
+                yield batch
+
+
+def migrate_to_namespaces(
+    index, subjects: Iterable[str], dimension: int, batch_size: int = 1000
+) -> Dict[str, Dict[str, int]]:
+    """
+    Move each subject's vectors out of the default namespace into its own.
+
+    Pinecone: count the subject's vectors in the default namespace, then
+    repeatedly query it for up to `batch_size` of them (values and metadata),
+    upsert them under the same ids into the subject's namespace and delete
+    them from the default one. Upserts are idempotent, so an interrupted run
+    can simply be rerun. The local backend splits its partition files directly.
+    Returns {"moved", "shortfall"} per subject; a non-zero shortfall (vectors
+    still left in the default namespace) means the subject needs a rerun.
+    """
+    if isinstance(index, PartitionedVectorIndex):
+        return {
+            subject: {"moved": moved, "shortfall": 0}
+            for subject, moved in index.split_default_namespace(subjects).items()
+        }
+
+    probe = [1.0 / math.sqrt(dimension)] * dimension
+    results: Dict[str, Dict[str, int]] = {}
+    for subject in subjects:
+        expected = sum(
+            len(batch) for batch in _iter_namespace_vectors(index, DEFAULT_NAMESPACE, subject, min(batch_size, 100))
+        )
+        seen = set()
+        stale_rounds = 0
+        while True:
+            matches = index.query(
+                vector=probe,
+                top_k=batch_size,
+                filter={"subject": subject},
+                namespace=DEFAULT_NAMESPACE,
+                include_values=True,
+                include_metadata=True,
+            )["matches"]
+            if not matches:
+                break
+            new = [match for match in matches if match["id"] not in seen]
+            if not new:
+                # Deletes are eventually consistent; wait for them to show
+                stale_rounds += 1
+                if stale_rounds > 10:
+                    break
+                time.sleep(1)
+                continue
+            stale_rounds = 0
+            index.upsert(
+                vectors=[
+                    {"id": match["id"], "values": match["values"], "metadata": match["metadata"]}
+                    for match in new
+                ],
+                namespace=subject,
+            )
+            index.delete(ids=[match["id"] for match in new], namespace=DEFAULT_NAMESPACE)
+            seen.update(match["id"] for match in new)
+            print(f"---MOVED {len(seen)} {subject} VECTORS TO NAMESPACE {subject}---")
+        shortfall = max(expected - len(seen), 0)
+        if shortfall:
+            print(f"---MIGRATION OF {subject} INCOMPLETE: MOVED {len(seen)}/{expected} VECTORS, RERUN TO MOVE THE REST---")
+        results[subject] = {"moved": len(seen), "shortfall": shortfall}
+    return results
+
+
+if __name__ == "__main__":
+    # Move vectors ingested before per-subject namespaces out of the default
+    # namespace (the BM25 index and subject centroids are already per subject):
+    #   python -m namespaces
+    import json
+
+    from retrieval import embedding, index
+
+    subjects = ["DataMining", "Network", "Distributed", "Energy"]
+    dimension = len(embedding.embed_query("dimension probe"))
+    results = migrate_to_namespaces(index, subjects, dimension)
+    print(json.dumps({"migrated": results}, indent=2))
+    print(json.dumps({"namespaces": list_namespaces(index)}, indent=2))
+    if any(result["shortfall"] for result in results.values()):
+        raise SystemExit("Some vectors are still in the default namespace; rerun python -m namespaces")
+    print("Set SUBJECT_NAMESPACES_ENABLED=true to search the subject namespaces")
@@ -5,12 +5,14 @@ import os
 import random
 
 # Langchain imports
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableSequence
 from pydantic import BaseModel, Field
-from pinecone import Pinecone
+
+from context_packer import pack_context
+from metrics import chain_tag, traced_node
+from retrieval import get_retriever
 
 load_dotenv()
 
@@ -28,24 +30,6 @@ class QuizState(TypedDict):
     quiz_config: Optional[dict]
     generation: str
 
-# Initialize components
-embedding = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.environ["INDEX_NAME"])
-
-# Retriever function
-def get_retriever(subject=None):
-    vectorstore = PineconeVectorStore(index=index, embedding=embedding)
-    
-    if subject:
-        retriever = vectorstore.as_retriever(
-            search_kwargs={"filter": {"subject": subject}}
-        )
-    else:
-        retriever = vectorstore.as_retriever()
-    
-    return retriever
-
 # Quiz models
 class QuizQuestion(BaseModel):
     question: str = Field(description="The quiz question")
@@ -60,7 +44,7 @@ class QuizData(BaseModel):
     total_questions: int = Field(description="Total number of questions generated")
 
 # LLMs and chains
-llm = ChatOpenAI(temperature=0.3, model="gpt-4o-mini")
+llm = ChatOpenAI(temperature=0.3, model="gpt-4o-mini", tags=[chain_tag("quiz_generator")])
 structured_llm_quiz = llm.with_structured_output(QuizData)
 
 quiz_system_prompt = """You are an expert educational content creator specializing in generating high-quality quiz questions from academic material.
@@ -151,8 +135,8 @@ def generate_quiz(state: QuizState) -> Dict[str, Any]:
         }
     
     try:
-        # Combine document content
-        doc_content = "\n\n".join([doc.page_content for doc in documents])
+        # Combine deduplicated document content within the quiz token budget
+        doc_content = pack_context(documents, "quiz").text
         
         # Generate quiz questions
         quiz_result = quiz_generator_chain.invoke({
@@ -199,8 +183,8 @@ def generate_quiz(state: QuizState) -> Dict[str, Any]:
 workflow = StateGraph(QuizState)
 
 # Add nodes
-workflow.add_node(RETRIEVE, retrieve)
-workflow.add_node(GENERATE_QUIZ, generate_quiz)
+workflow.add_node(RETRIEVE, traced_node("quiz", RETRIEVE, retrieve))
+workflow.add_node(GENERATE_QUIZ, traced_node("quiz", GENERATE_QUIZ, generate_quiz))
 
 # Build simple flow: retrieve -> generate quiz
 workflow.set_entry_point(RETRIEVE)
@@ -0,0 +1,447 @@
+from dotenv import load_dotenv
+import asyncio
+import heapq
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_openai import OpenAIEmbeddings
+from langchain_pinecone import PineconeVectorStore
+from pinecone import Pinecone
+
+from config import (
+    EMBEDDING_CACHE_DISK,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    HYBRID_RETRIEVAL_ENABLED,
+    LOCAL_ANN_ENABLED,
+    LOCAL_ANN_MIN_ROWS,
+    LOCAL_ANN_NPROBE,
+    LOCAL_ANN_QUANTIZATION,
+    LOCAL_ANN_RERANK,
+    LOCAL_ANN_RETRAIN_GROWTH,
+    LOCAL_VECTOR_STORE_PATH,
+    MMR_DUPLICATE_THRESHOLD,
+    MMR_ENABLED,
+    MMR_LAMBDA,
+    MMR_MIN_K,
+    MMR_SCORE_DROP,
+    RETRIEVAL_CACHE_ENABLED,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RRF_K,
+    SUBJECT_NAMESPACES_ENABLED,
+    VECTOR_STORE_BACKEND,
+)
+from ann_index import IVFIndex
+from diversity import diversity_stats, maximal_marginal_relevance
+from embedding_cache import CachedEmbeddings
+from lexical_index import lexical_index, reciprocal_rank_fusion
+from local_vectorstore import LocalVectorStore, PartitionedVectorIndex
+from namespaces import list_namespaces, subject_scope
+
+load_dotenv()
+
+# Shared clients for the chat, quiz, flashcard and exam systems and ingestion.
+# Every embedding goes through one process-wide cache.
+embedding = CachedEmbeddings(
+    OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY")),
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    db_path=EMBEDDING_CACHE_PATH if EMBEDDING_CACHE_DISK else None,
+)
+# `index` is the Pinecone index or, with VECTOR_STORE_BACKEND=local, a
+# PartitionedVectorIndex exposing the same upsert/query/delete calls and
+# namespaces
+if VECTOR_STORE_BACKEND == "local":
+    pc = None
+    index = PartitionedVectorIndex(
+        LOCAL_VECTOR_STORE_PATH,
+        ann_factory=lambda directory: IVFIndex(
+            os.path.join(directory, "ann"),
+            nprobe=LOCAL_ANN_NPROBE,
+            quantization=LOCAL_ANN_QUANTIZATION,
+            rerank=LOCAL_ANN_RERANK,
+        ) if LOCAL_ANN_ENABLED else None,
+        ann_min_rows=LOCAL_ANN_MIN_ROWS,
+        ann_retrain_growth=LOCAL_ANN_RETRAIN_GROWTH,
+    )
+else:
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index = pc.Index(os.environ["INDEX_NAME"])
+
+# Retriever default when a caller doesn't ask for a specific k
+DEFAULT_K = 4
+
+
+class RetrievalCache:
+    """
+    Search results keyed by (subject, normalized query, k, filter), so a hit
+    skips both the query embedding and the vector store call.
+
+    Each subject has a version counter that ingestion bumps; entries stored
+    under an older version are treated as misses. Unfiltered searches span
+    every subject, so they are tied to a global version bumped on any ingest.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: int = 3600, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple, Tuple[int, float, List[Document]]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(query: str, subject: Optional[str], k: int, search_filter: Optional[dict]) -> Tuple:
+        normalized = " ".join(query.lower().split())
+        return (subject or "", normalized, k, json.dumps(search_filter, sort_keys=True))
+
+    def _version(self, subject: Optional[str]) -> int:
+        return self._versions.get(subject or "", 0)
+
+    @staticmethod
+    def _copy(documents: List[Document]) -> List[Document]:
+        # Nodes annotate metadata and extend the list; keep the cached copy intact
+        return [
+            Document(page_content=doc.page_content, metadata=dict(doc.metadata or {}))
+            for doc in documents
+        ]
+
+    def get(self, query, subject=None, k=DEFAULT_K, search_filter=None) -> Optional[List[Document]]:
+        if not self.enabled:
+            return None
+        key = self._key(query, subject, k, search_filter)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, stored_at, documents = entry
+                if version == self._version(subject) and time.time() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._copy(documents)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def version(self, subject: Optional[str]) -> int:
+        with self._lock:
+            return self._version(subject)
+
+    def put(self, query, subject, k, search_filter, documents: List[Document], version: int) -> None:
+        """
+        Store results searched at `version` (read before the search, so results
+        racing an ingest are stored as already stale).
+        """
+        if not self.enabled:
+            return
+        key = self._key(query, subject, k, search_filter)
+        with self._lock:
+            self._entries[key] = (version, time.time(), self._copy(documents))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump_version(self, subject: Optional[str]) -> int:
+        """
+        Invalidate cached results for `subject` (and unfiltered searches).
+        Returns the subject's new version.
+        """
+        with self._lock:
+            self._versions[""] = self._versions.get("", 0) + 1
+            if subject:
+                self._versions[subject] = self._versions.get(subject, 0) + 1
+            return self._version(subject)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "versions": {subject or None: version for subject, version in self._versions.items()},
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
+
+
+retrieval_cache = RetrievalCache(
+    max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS,
+    enabled=RETRIEVAL_CACHE_ENABLED,
+)
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever over the shared vector store for one (subject, k), answered from
+    retrieval_cache when possible.
+    """
+
+    subject: Optional[str] = None
+    k: int = DEFAULT_K
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return similarity_search_with_scores(query, subject=self.subject, k=self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await asimilarity_search_with_scores(query, subject=self.subject, k=self.k)
+
+
+class RetrieverPool:
+    """
+    Builds the vector store once and one retriever per (subject, k), then hands
+    the same instances to every caller instead of constructing them per request.
+    The retrievers search through retrieval_cache.
+    """
+
+    def __init__(self, index, embeddings):
+        self.index = index
+        self.embeddings = embeddings
+        self._vectorstore: Optional[Union[PineconeVectorStore, LocalVectorStore]] = None
+        self._retrievers: Dict[Tuple[str, int], Any] = {}
+        self._namespaces: Optional[set] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_vectorstore(self) -> Union[PineconeVectorStore, LocalVectorStore]:
+        if self._vectorstore is None:
+            with self._lock:
+                if self._vectorstore is None:
+                    if isinstance(self.index, PartitionedVectorIndex):
+                        self._vectorstore = LocalVectorStore(index=self.index, embedding=self.embeddings)
+                    else:
+                        self._vectorstore = PineconeVectorStore(index=self.index, embedding=self.embeddings)
+        return self._vectorstore
+
+    def get_retriever(self, subject: Optional[str] = None, k: int = DEFAULT_K):
+        key = (subject or "", k)
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            if retriever is not None:
+                self.hits += 1
+                return retriever
+            self.misses += 1
+
+        retriever = CachedRetriever(subject=subject, k=k)
+
+        with self._lock:
+            # Another request may have built it meanwhile; keep the first one
+            return self._retrievers.setdefault(key, retriever)
+
+    def namespaces(self) -> List[str]:
+        """
+        Namespaces an unscoped search fans out to: read from the index once,
+        then kept current by ingestion (add_namespace) and deletes
+        (remove_namespace)
+        """
+        if self._namespaces is None:
+            namespaces = {name for name, count in list_namespaces(self.index).items() if count}
+            with self._lock:
+                if self._namespaces is None:
+                    self._namespaces = namespaces
+        with self._lock:
+            return sorted(self._namespaces)
+
+    def add_namespace(self, namespace: str) -> None:
+        with self._lock:
+            if self._namespaces is not None:
+                self._namespaces.add(namespace)
+
+    def remove_namespace(self, namespace: str) -> None:
+        with self._lock:
+            if self._namespaces is not None:
+                self._namespaces.discard(namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "retrievers": len(self._retrievers),
+                "namespaces": sorted(self._namespaces) if self._namespaces is not None else None,
+                "keys": [
+                    {"subject": subject or None, "k": k}
+                    for subject, k in self._retrievers
+                ],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+retriever_pool = RetrieverPool(index, embedding)
+
+
+def get_vectorstore():
+    return retriever_pool.get_vectorstore()
+
+
+# Retriever with optional subject filter, shared across requests
+def get_retriever(subject=None, k=DEFAULT_K):
+    return retriever_pool.get_retriever(subject=subject, k=k)
+
+
+def _with_relevance_scores(results):
+    documents = []
+    for doc, score in results:
+        doc.metadata = doc.metadata or {}
+        doc.metadata["relevance_score"] = float(score)
+        documents.append(doc)
+    return documents
+
+
+def _fuse_lexical(query, subject, k, documents):
+    """
+    Reciprocal-rank fusion of the dense results with the BM25 results for the
+    same query. Chunks found only by BM25 carry no relevance_score, so they
+    are graded by the LLM rather than by the similarity thresholds.
+    """
+    if not HYBRID_RETRIEVAL_ENABLED:
+        return documents
+    lexical = lexical_index.search(query, subject=subject, k=k)
+    if not lexical:
+        return documents
+    return reciprocal_rank_fusion([documents, lexical], k=k, rrf_k=RRF_K)
+
+
+def _top_k(results, k):
+    # Merge per-namespace (document, score) lists into one ranking
+    return heapq.nlargest(k, (pair for pairs in results for pair in pairs), key=lambda pair: pair[1])
+
+
+def _subject_scope(subject):
+    # A subject not (yet) in a namespace of its own is filtered in the default one
+    if subject and SUBJECT_NAMESPACES_ENABLED:
+        return subject_scope(subject, retriever_pool.namespaces())
+    return subject_scope(subject)
+
+
+def _scopes(subject):
+    if subject or not SUBJECT_NAMESPACES_ENABLED:
+        return [_subject_scope(subject)]
+    return [{"namespace": namespace} for namespace in retriever_pool.namespaces()]
+
+
+def _query_with_vectors(vector, subject, fetch_k):
+    # Raw index query: the match values are what MMR compares chunks with
+    matches = [
+        match
+        for scope in _scopes(subject)
+        for match in retriever_pool.index.query(
+            vector=vector, top_k=fetch_k, include_values=True, include_metadata=True, **scope
+        )["matches"]
+    ]
+    return heapq.nlargest(fetch_k, matches, key=lambda match: match["score"])
+
+
+def _select_diverse(vector, matches, k):
+    """
+    (document, score) pairs of the matches picked by maximal marginal relevance
+    """
+    if not matches:
+        return []
+    selection = maximal_marginal_relevance(
+        vector,
+        [match["values"] for match in matches],
+        [match["score"] for match in matches],
+        k,
+        lambda_mult=MMR_LAMBDA,
+        score_drop=MMR_SCORE_DROP,
+        duplicate_threshold=MMR_DUPLICATE_THRESHOLD,
+        min_k=MMR_MIN_K,
+    )
+    diversity_stats.record(len(matches), selection)
+    results = []
+    for i in selection["indices"]:
+        # Chunk text is stored under metadata["text"] (see ingestion.upsert_documents)
+        metadata = dict(matches[i]["metadata"] or {})
+        text = metadata.pop("text", "")
+        results.append((Document(page_content=text, metadata=metadata), float(matches[i]["score"])))
+    return results
+
+
+def _search(query, subject, k, fetch_k=None):
+    if fetch_k and MMR_ENABLED:
+        vector = retriever_pool.embeddings.embed_query(query)
+        return _select_diverse(vector, _query_with_vectors(vector, subject, fetch_k), k)
+    vectorstore = get_vectorstore()
+    if subject or not SUBJECT_NAMESPACES_ENABLED:
+        return vectorstore.similarity_search_with_score(query, k=k, **_subject_scope(subject))
+    # Without a subject, search every subject's namespace
+    return _top_k([
+        vectorstore.similarity_search_with_score(query, k=k, namespace=namespace)
+        for namespace in retriever_pool.namespaces()
+    ], k)
+
+
+async def _asearch(query, subject, k, fetch_k=None):
+    if fetch_k and MMR_ENABLED:
+        vector = await retriever_pool.embeddings.aembed_query(query)
+        matches = await asyncio.to_thread(_query_with_vectors, vector, subject, fetch_k)
+        return _select_diverse(vector, matches, k)
+    vectorstore = get_vectorstore()
+    if subject or not SUBJECT_NAMESPACES_ENABLED:
+        return await vectorstore.asimilarity_search_with_score(query, k=k, **_subject_scope(subject))
+    return _top_k(await asyncio.gather(*[
+        vectorstore.asimilarity_search_with_score(query, k=k, namespace=namespace)
+        for namespace in retriever_pool.namespaces()
+    ]), k)
+
+
+def _cache_scope(subject, fetch_k):
+    scope = _subject_scope(subject)
+    if fetch_k and MMR_ENABLED:
+        scope = {**scope, "mmr_fetch_k": fetch_k}
+    return scope
+
+
+# Similarity search that keeps the Pinecone score on each document
+def similarity_search_with_scores(query, subject=None, k=DEFAULT_K, fetch_k=None):
+    """
+    Like get_retriever(subject).invoke(query), but the similarity score of each
+    document is stored in doc.metadata["relevance_score"] and the dense
+    ranking is fused with the BM25 ranking. A subject's search only queries
+    that subject's namespace. With `fetch_k` (and MMR_ENABLED), fetch_k
+    candidates are fetched and at most k diverse, relevant ones kept; the
+    fusion then keeps that many. Results are served from retrieval_cache when
+    a fresh entry exists.
+    """
+    scope = _cache_scope(subject, fetch_k)
+    documents = retrieval_cache.get(query, subject, k, scope)
+    if documents is not None:
+        return documents
+    version = retrieval_cache.version(subject)
+    documents = _with_relevance_scores(_search(query, subject, k, fetch_k))
+    documents = _fuse_lexical(query, subject, len(documents) or k, documents)
+    retrieval_cache.put(query, subject, k, scope, documents, version)
+    return documents
+
+
+async def asimilarity_search_with_scores(query, subject=None, k=DEFAULT_K, fetch_k=None):
+    scope = _cache_scope(subject, fetch_k)
+    documents = retrieval_cache.get(query, subject, k, scope)
+    if documents is not None:
+        return documents
+    version = retrieval_cache.version(subject)
+    documents = _with_relevance_scores(await _asearch(query, subject, k, fetch_k))
+    documents = _fuse_lexical(query, subject, len(documents) or k, documents)
+    retrieval_cache.put(query, subject, k, scope, documents, version)
+    return documents